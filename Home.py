@@ -1,11 +1,13 @@
 import streamlit as st
-from utils.load_data import load_data
-from preprocess import preprocess_data
+from utils.cache import active_dataset, clear_active_dataset, load_preprocessed
+from utils.uploads import UPLOAD_TYPES, activate_upload, submit_upload
+from utils.perf import perf_panel, start_trace
 
 from utils.apply_filters import apply_global_filters 
 
 st.set_page_config(page_title="Home Credit Default Risk Dashboard", page_icon="📊", layout="wide")
 
+start_trace("home")
 st.title("🛍 Home Credit Default Risk Dashboard")
 
 st.markdown("""
@@ -21,16 +23,32 @@ Use the sidebar to navigate between different analysis modules:
 st.markdown("---")
 st.subheader("Upload / Use Default Dataset")
 
-uploaded_file = st.file_uploader("Upload your application_train CSV file", type=["csv"])
-if uploaded_file:
-    df = load_data(uploaded_file)
+uploaded_file = st.file_uploader(
+    "Upload your application_train file (CSV, gzip/zip CSV or Parquet)", type=UPLOAD_TYPES
+)
+if uploaded_file and uploaded_file.file_id != st.session_state.get("handled_upload"):
+    # Preprocessed in the background with the statistics fitted on the
+    # reference dataset; once ready, every page of the session uses it. A
+    # failure is not retried on rerun, and its error stays until the next upload.
+    st.session_state.pop("upload_error", None)
+    if activate_upload(submit_upload(uploaded_file)) is not None:
+        st.session_state["handled_upload"] = uploaded_file.file_id
+if st.session_state.get("upload_error"):
+    st.error(st.session_state["upload_error"])
+
+if st.session_state.get("active_dataset"):
+    st.caption(f"Active dataset: {st.session_state['active_dataset']['name']} (uploaded)")
+    st.button("Use default dataset", on_click=clear_active_dataset)
 else:
-    df = load_data()
+    st.caption(f"Active dataset: {active_dataset()[0]} (default)")
 
-# Preprocess + apply filters
-df = preprocess_data(df)
+df = load_preprocessed()
+
+# Apply filters
 df_filtered = apply_global_filters(df)
 
 
 # Show preview
-st.dataframe(df_filtered.head(10))
\ No newline at end of file
+st.dataframe(df_filtered.head(10))
+
+perf_panel()
@@ -0,0 +1,222 @@
+import argparse
+import glob
+import json
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+
+from preprocess import PreprocessPipeline, compact_dtypes
+from utils.backend import duckdb, preprocess_sql
+from utils.cache import CACHE_DIR
+from utils.columns import core_raw_columns
+from utils.filter_index import FilterIndex
+from utils.load_data import read_dataset
+from utils.synthetic import GENERATOR_VERSION, write_synthetic
+
+BENCH_DIR = CACHE_DIR / "bench"
+RESULTS_FILE = BENCH_DIR / "results.jsonl"
+PAGES = ["Home.py"] + sorted(glob.glob("pages/*.py"))
+
+# A stage regresses when it is slower than the previous run by more than
+# both the relative tolerance and the absolute slack (timer noise)
+REGRESSION_RATIO = 1.2
+REGRESSION_SLACK = 0.05
+
+
+# -----------------------------
+# Datasets
+# -----------------------------
+def synthetic_dataset(rows, seed=0, fmt="parquet"):
+    """Path of the synthetic benchmark dataset, generated on first use."""
+    path = BENCH_DIR / "data" / f"synthetic-{rows}-s{seed}-g{GENERATOR_VERSION}.{fmt}"
+    if not path.exists():
+        print(f"Generating {path} ...")
+        write_synthetic(path, rows, seed)
+    return path
+
+
+def filter_presets(index):
+    """Filter states exercised by the filter stage: everything, one
+    categorical value, and a narrow combination with an age range."""
+    domain = index.domain
+    everything = dict(domain)
+    lo, hi = domain["age_range"]
+    return {
+        "all": everything,
+        "one_gender": {**everything, "gender": domain["gender"][:1]},
+        "narrow": {
+            **everything,
+            "gender": domain["gender"][:1],
+            "education": domain["education"][:2],
+            "age_range": (lo + (hi - lo) // 4, hi - (hi - lo) // 4),
+        },
+    }
+
+
+# -----------------------------
+# Timing
+# -----------------------------
+def timed(fn, repeat):
+    """Best wall time of repeat calls of fn, and its last result."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+# -----------------------------
+# Stages
+# -----------------------------
+def bench_data(path, repeat):
+    results = {}
+    results["load"], raw = timed(lambda: read_dataset(path, columns=core_raw_columns()), repeat)
+    results["preprocess"], (df, _) = timed(
+        lambda: compact_dtypes(PreprocessPipeline().fit_transform(raw)), repeat
+    )
+    if duckdb is not None:
+        # Read and preprocess in one query over the file
+        results["preprocess/duckdb"], _ = timed(
+            lambda: compact_dtypes(preprocess_sql(path, core_raw_columns())[0]), repeat
+        )
+    results["filter/index"], index = timed(lambda: FilterIndex(df), repeat)
+    for name, filters in filter_presets(index).items():
+        def apply(filters=filters):
+            # Drop memoized masks, so the bitmap work is what is timed
+            index._masks.clear()
+            return df[index.mask(filters)]
+        results[f"filter/{name}"], _ = timed(apply, repeat)
+    return results
+
+
+def _run_page(at):
+    start = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(f"{at.exception[0].value}")
+    # Top-level spans of the page's trace: load, filter, kpi, charts, ...
+    blocks = defaultdict(float)
+    for record in at.session_state["perf_traces"][-1].records():
+        if record["depth"] == 0:
+            blocks[record["stage"]] += record["seconds"]
+    return {"total": elapsed, **blocks}
+
+
+def bench_page(page, path, repeat):
+    """Page timings: cold (Streamlit caches cleared, artifact on disk), warm
+    rerun, and a rerun after changing a filter; each split into the stages
+    recorded by the page's perf trace."""
+    from streamlit.testing.v1 import AppTest
+
+    runs = defaultdict(list)
+    for _ in range(repeat):
+        st.cache_data.clear()
+        st.cache_resource.clear()
+        at = AppTest.from_file(page, default_timeout=600)
+        at.session_state["active_dataset"] = {"path": str(path), "reference": None, "name": path.name}
+        runs["cold"].append(_run_page(at))
+        runs["warm"].append(_run_page(at))
+        if at.sidebar.multiselect:
+            gender = at.sidebar.multiselect[0]
+            gender.set_value(gender.value[:1])
+            runs["filtered"].append(_run_page(at))
+
+    name = Path(page).stem
+    results = {}
+    for mode, timings in runs.items():
+        for block in timings[0]:
+            results[f"page/{name}/{mode}/{block}"] = min(t.get(block, 0.0) for t in timings)
+    return results
+
+
+# -----------------------------
+# Results
+# -----------------------------
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_results(path=RESULTS_FILE):
+    if not Path(path).exists():
+        return pd.DataFrame(columns=["run", "commit", "rows", "format", "stage", "seconds"])
+    return pd.read_json(path, lines=True, dtype={"commit": str})
+
+
+def save_results(records, path=RESULTS_FILE):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def compare(current, previous, ratio=REGRESSION_RATIO, slack=REGRESSION_SLACK):
+    """Join a run's timings with the latest earlier timing of the same stage,
+    size and format, flagging regressions."""
+    keys = ["rows", "format", "stage"]
+    current = pd.DataFrame(current)
+    if previous.empty:
+        return current.assign(previous=float("nan"), change=float("nan"), regression=False)
+    last = previous.sort_values("run").groupby(keys, as_index=False).last()[keys + ["seconds", "commit"]]
+    merged = current.merge(last, on=keys, how="left", suffixes=("", "_previous"))
+    merged = merged.rename(columns={"seconds_previous": "previous"})
+    merged["change"] = merged["seconds"] / merged["previous"] - 1
+    merged["regression"] = (merged["seconds"] > merged["previous"] * ratio) & (
+        merged["seconds"] - merged["previous"] > slack
+    )
+    return merged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time load, preprocess, filter and every page on synthetic datasets and "
+                    "compare against the previous run."
+    )
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument("--repeat", type=int, default=3, help="best of this many runs per stage")
+    parser.add_argument("--pages", nargs="*", default=None, help="substrings of the pages to run (default: all)")
+    parser.add_argument("--no-pages", action="store_true", help="only time load, preprocess and filter")
+    parser.add_argument("--results", type=Path, default=RESULTS_FILE)
+    parser.add_argument("--no-save", action="store_true", help="compare without recording this run")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    pages = PAGES if args.pages is None else [p for p in PAGES if any(s in p for s in args.pages)]
+    run = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    commit = git_commit()
+
+    records = []
+    for rows in args.rows:
+        path = synthetic_dataset(rows, args.seed, args.format)
+        timings = bench_data(path, args.repeat)
+        if not args.no_pages:
+            for page in pages:
+                timings.update(bench_page(page, path, args.repeat))
+        records += [
+            {"run": run, "commit": commit, "rows": rows, "format": args.format, "stage": stage, "seconds": seconds}
+            for stage, seconds in timings.items()
+        ]
+
+    report = compare(records, load_results(args.results))
+    with pd.option_context("display.max_rows", None, "display.width", 200, "display.float_format", "{:.3f}".format):
+        print(report[["rows", "stage", "seconds", "previous", "change", "regression"]].to_string(index=False))
+    if not args.no_save:
+        save_results(records, args.results)
+    regressions = report[report["regression"]]
+    if len(regressions):
+        print(f"\n{len(regressions)} stage(s) slower than {REGRESSION_RATIO}x the previous run")
+        if args.fail_on_regression:
+            raise SystemExit(1)
@@ -1,59 +1,538 @@
+import argparse
+import json
+
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import streamlit as st
-from utils.load_data import load_data
+from utils.load_data import CHUNK_ROWS, iter_dataset, load_data
+from utils.sketch import QuantileSketch
 
+# Bump whenever PreprocessPipeline or compact_dtypes change their output so
+# that cached artifacts and saved pipeline states are rebuilt.
+PREPROCESS_VERSION = 3
 
-def preprocess_data(df: pd.DataFrame) -> pd.DataFrame:
-     # -----------------------------
-    # Feature Engineering
-    # -----------------------------
-    df["AGE_YEARS"] = (-df["DAYS_BIRTH"] / 365.25).round().astype(int)
-    df["EMPLOYMENT_YEARS"] = (-df["DAYS_EMPLOYED"] / 365.25).clip(lower=0, upper=60)
 
-    df["DTI"] = df["AMT_ANNUITY"] / df["AMT_INCOME_TOTAL"]
-    df["LTI"] = df["AMT_CREDIT"] / df["AMT_INCOME_TOTAL"]
-    df["ANNUITY_TO_CREDIT"] = df["AMT_ANNUITY"] / df["AMT_CREDIT"]
+INCOME_BRACKET_QUANTILES = [0, 0.25, 0.75, 1.0]
+INCOME_BRACKET_LABELS = ["Low", "Mid", "High"]
+
+# Streaming fit: a numeric column keeps exact value counts up to this many
+# distinct values, beyond that a QuantileSketch (1% relative accuracy)
+MAX_EXACT_VALUES = 1 << 15
+
+
+def _json_value(value):
+    # numpy scalars -> plain Python so the fitted state serializes to JSON
+    return value.item() if hasattr(value, "item") else value
+
+
+class PreprocessPipeline:
+    """Feature engineering, imputation, rare-category merging, winsorizing and
+    income brackets, split into a fit step that learns every statistic and a
+    transform step that only applies them.
+
+    The fitted state is plain JSON (to_dict/from_dict, save/load), so a
+    pipeline fitted once on the reference dataset can preprocess new batches
+    of applications consistently. All steps work column by column: a pipeline
+    fitted on a subset of columns only touches those columns, and pipelines
+    fitted on disjoint subsets can be combined with merge().
+    """
+
+    def __init__(self, engineer_features=True, missing_threshold=0.6,
+                 rare_threshold=0.01, clip_quantiles=(0.01, 0.99)):
+        self.engineer_features = engineer_features
+        self.missing_threshold = missing_threshold
+        self.rare_threshold = rare_threshold
+        self.clip_quantiles = tuple(clip_quantiles)
+        self.dropped = []
+        self.fill_values = {}
+        self.frequent_values = {}
+        self.clip_bounds = {}
+        self.income_edges = None
 
     # -----------------------------
-    # Missing Values
+    # Feature Engineering
     # -----------------------------
-    missing_ratio = df.isnull().mean()
-    cols_to_drop = missing_ratio[missing_ratio > 0.6].index
-    df.drop(columns=cols_to_drop, inplace=True)
-
-    for col in df.columns:
-        if df[col].dtype in ["int64", "float64"]:
-            df[col].fillna(df[col].median(), inplace=True)
-        else:
-            df[col].fillna(df[col].mode()[0], inplace=True)
+    @staticmethod
+    def add_features(df):
+        return df.assign(
+            AGE_YEARS=(-df["DAYS_BIRTH"] / 365.25).round().astype(int),
+            EMPLOYMENT_YEARS=(-df["DAYS_EMPLOYED"] / 365.25).clip(lower=0, upper=60),
+            DTI=df["AMT_ANNUITY"] / df["AMT_INCOME_TOTAL"],
+            LTI=df["AMT_CREDIT"] / df["AMT_INCOME_TOTAL"],
+            ANNUITY_TO_CREDIT=df["AMT_ANNUITY"] / df["AMT_CREDIT"],
+        )
 
     # -----------------------------
-    # Standardize Categories
+    # Fit
     # -----------------------------
-    def merge_rare(series, threshold=0.01):
-        freq = series.value_counts(normalize=True)
-        rare = freq[freq < threshold].index
-        return series.replace(rare, "Other")
+    def fit(self, df):
+        if self.engineer_features:
+            df = self.add_features(df)
+
+        # Missing values: one isnull pass decides which columns are dropped
+        missing_ratio = df.isnull().mean()
+        self.dropped = missing_ratio[missing_ratio > self.missing_threshold].index.tolist()
+        df = df.drop(columns=self.dropped)
+        n_rows = len(df)
+
+        numeric = df.select_dtypes(include=[np.number]).columns
+        categorical = df.columns.difference(numeric, sort=False)
+
+        # Medians of the whole numeric block in one call
+        medians = df[numeric].median()
+        self.fill_values = {col: _json_value(v) for col, v in medians.items()}
+
+        # One value_counts per categorical column gives both the mode and the
+        # post-imputation frequencies used to merge rare categories
+        self.frequent_values = {}
+        for col in categorical:
+            counts = df[col].value_counts()
+            self.fit_categories(col, counts, n_rows - counts.sum(), n_rows)
+
+        # Winsorizing bounds of the imputed numeric block in one multi-quantile call
+        filled = df[numeric].fillna(medians)
+        bounds = filled.quantile(list(self.clip_quantiles))
+        self.clip_bounds = {
+            col: [_json_value(bounds.at[self.clip_quantiles[0], col]), _json_value(bounds.at[self.clip_quantiles[1], col])]
+            for col in numeric
+        }
+
+        # Income bracket edges over the winsorized income
+        self.income_edges = None
+        if self.engineer_features:
+            lower, upper = self.clip_bounds["AMT_INCOME_TOTAL"]
+            income = filled["AMT_INCOME_TOTAL"].clip(lower, upper)
+            self.income_edges = income.quantile(INCOME_BRACKET_QUANTILES).tolist()
+        return self
 
-    for col in df.select_dtypes(include=["object"]).columns:
-        df[col] = merge_rare(df[col])
+    def fit_stats(self, stats):
+        """fit() from the ChunkStats of a dataset read in chunks.
+
+        Produces the same state as fit() on the whole frame, except that the
+        medians and quantiles of numeric columns with more than
+        MAX_EXACT_VALUES distinct values come from a quantile sketch.
+        """
+        n_rows = stats.n_rows
+        missing_ratio = pd.Series({col: s.missing / n_rows for col, s in stats.columns.items()}, dtype="float64")
+        self.dropped = missing_ratio[missing_ratio > self.missing_threshold].index.tolist()
+        kept = {col: s for col, s in stats.columns.items() if col not in self.dropped}
+        numeric = [col for col, s in kept.items() if s.numeric]
+        categorical = [col for col, s in kept.items() if not s.numeric]
+
+        self.fill_values = {col: _json_value(kept[col].median()) for col in numeric}
+
+        self.frequent_values = {}
+        for col in categorical:
+            if kept[col].counts is not None:
+                self.fit_categories(col, kept[col].counts, kept[col].missing, n_rows)
+
+        # Quantiles of the imputed columns: the missing values count at the median
+        self.clip_bounds = {
+            col: [_json_value(v) for v in kept[col].quantile(self.clip_quantiles, fill=self.fill_values[col])]
+            for col in numeric
+        }
+
+        self.income_edges = None
+        if self.engineer_features:
+            income = kept["AMT_INCOME_TOTAL"]
+            self.income_edges = income.quantile(
+                INCOME_BRACKET_QUANTILES, fill=self.fill_values["AMT_INCOME_TOTAL"],
+                clip=self.clip_bounds["AMT_INCOME_TOTAL"],
+            ).tolist()
+        return self
+
+    def fit_categories(self, col, counts, n_missing, n_rows):
+        """Mode and frequent values of a categorical column from its value
+        counts (missing values excluded)."""
+        if counts.empty:
+            return
+        # Most frequent first, as value_counts orders them
+        counts = counts.sort_values(ascending=False, kind="stable")
+        top = counts[counts == counts.max()].index
+        mode = sorted(top)[0]
+        self.fill_values[col] = _json_value(mode)
+        # Missing values are imputed with the mode before frequencies are taken
+        freq = counts.where(counts.index != mode, counts + n_missing) / n_rows
+        self.frequent_values[col] = [_json_value(v) for v in freq[freq >= self.rare_threshold].index]
+
+    def fit_chunks(self, chunks, max_exact=MAX_EXACT_VALUES):
+        """fit() over an iterable of DataFrame chunks (see fit_stats)."""
+        return self.fit_stats(ChunkStats(self.engineer_features, max_exact).update_all(chunks))
 
     # -----------------------------
-    # Outlier Handling
+    # Transform
     # -----------------------------
-    def winsorize(s):
-        return np.clip(s, s.quantile(0.01), s.quantile(0.99))
+    def transform(self, df):
+        if self.engineer_features:
+            df = self.add_features(df)
+        df = df.drop(columns=[c for c in self.dropped if c in df.columns])
+        df = df.fillna({c: v for c, v in self.fill_values.items() if c in df.columns})
+
+        # Categories unseen at fit time count as rare as well
+        for col, keep in self.frequent_values.items():
+            if col in df.columns:
+                df[col] = df[col].where(df[col].isin(keep), "Other")
+
+        clip_cols = [c for c in self.clip_bounds if c in df.columns]
+        if clip_cols:
+            lower = pd.Series({c: self.clip_bounds[c][0] for c in clip_cols})
+            upper = pd.Series({c: self.clip_bounds[c][1] for c in clip_cols})
+            df[clip_cols] = df[clip_cols].clip(lower=lower, upper=upper, axis=1)
 
-    for col in df.select_dtypes(include=[np.number]).columns:
-        df[col] = winsorize(df[col])
+        if self.income_edges is not None:
+            df["INCOME_BRACKET"] = pd.cut(
+                df["AMT_INCOME_TOTAL"],
+                bins=self.income_edges,
+                labels=INCOME_BRACKET_LABELS,
+                include_lowest=True,
+            )
+        return df
+
+    def fit_transform(self, df):
+        return self.fit(df).transform(df)
 
     # -----------------------------
-    # Income Brackets
+    # Serialization
     # -----------------------------
-    df["INCOME_BRACKET"] = pd.qcut(
-        df["AMT_INCOME_TOTAL"],
-        q=[0, 0.25, 0.75, 1.0],
-        labels=["Low", "Mid", "High"]
+    def to_dict(self):
+        return {
+            "version": PREPROCESS_VERSION,
+            "engineer_features": self.engineer_features,
+            "missing_threshold": self.missing_threshold,
+            "rare_threshold": self.rare_threshold,
+            "clip_quantiles": list(self.clip_quantiles),
+            "dropped": self.dropped,
+            "fill_values": self.fill_values,
+            "frequent_values": self.frequent_values,
+            "clip_bounds": self.clip_bounds,
+            "income_edges": self.income_edges,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        if state.get("version") != PREPROCESS_VERSION:
+            raise ValueError(
+                f"Pipeline state has version {state.get('version')}, expected {PREPROCESS_VERSION}; refit it."
+            )
+        pipeline = cls(
+            engineer_features=state["engineer_features"],
+            missing_threshold=state["missing_threshold"],
+            rare_threshold=state["rare_threshold"],
+            clip_quantiles=state["clip_quantiles"],
+        )
+        pipeline.dropped = state["dropped"]
+        pipeline.fill_values = state["fill_values"]
+        pipeline.frequent_values = state["frequent_values"]
+        pipeline.clip_bounds = state["clip_bounds"]
+        pipeline.income_edges = state["income_edges"]
+        return pipeline
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def merge(self, other):
+        """Combine with a pipeline fitted on a disjoint set of columns."""
+        merged = PreprocessPipeline.from_dict(self.to_dict())
+        merged.engineer_features = self.engineer_features or other.engineer_features
+        merged.dropped = self.dropped + [c for c in other.dropped if c not in self.dropped]
+        merged.fill_values.update(other.fill_values)
+        merged.frequent_values.update(other.frequent_values)
+        merged.clip_bounds.update(other.clip_bounds)
+        merged.income_edges = self.income_edges or other.income_edges
+        return merged
+
+
+def preprocess_data(df: pd.DataFrame, engineer_features: bool = True) -> pd.DataFrame:
+    # Fits on df itself; use a fitted PreprocessPipeline to treat new data
+    # the same way as the reference dataset.
+    from utils.backend import preprocess_sql, sql_enabled
+    if sql_enabled():
+        return preprocess_sql(df, engineer_features=engineer_features)[0]
+    return PreprocessPipeline(engineer_features=engineer_features).fit_transform(df)
+
+
+def compact_dtypes(df: pd.DataFrame, max_category_ratio: float = 0.5):
+    """Convert low-cardinality strings to category and downcast numerics.
+
+    Integers (and floats holding only whole numbers) go to the smallest signed
+    integer type that fits; other floats go to float32. Returns the compacted
+    frame and a per-column report of bytes before and after.
+    """
+    rows = []
+    for col in df.columns:
+        s = df[col]
+        before = s.memory_usage(deep=True, index=False)
+        dtype_before = str(s.dtype)
+
+        if pd.api.types.is_bool_dtype(s) or isinstance(s.dtype, pd.CategoricalDtype):
+            pass
+        elif pd.api.types.is_numeric_dtype(s):
+            whole = s.notna().all() and (
+                pd.api.types.is_integer_dtype(s) or (np.isfinite(s).all() and (s == np.floor(s)).all())
+            )
+            if whole:
+                df[col] = pd.to_numeric(s.astype("int64"), downcast="integer")
+            elif s.dtype == "float64" and s.abs().max() < np.finfo(np.float32).max:
+                df[col] = s.astype("float32")
+        elif s.nunique(dropna=True) <= max_category_ratio * len(s):
+            df[col] = s.astype("category")
+
+        rows.append({
+            "column": col,
+            "dtype_before": dtype_before,
+            "dtype_after": str(df[col].dtype),
+            "bytes_before": int(before),
+            "bytes_after": int(df[col].memory_usage(deep=True, index=False)),
+        })
+    report = pd.DataFrame(rows).set_index("column")
+    return df, report
+
+
+# -----------------------------
+# Streaming
+# -----------------------------
+def _lerp(a, b, t):
+    # Linear interpolation in the same form as numpy.quantile, so exact
+    # counts reproduce pandas' quantiles
+    diff = b - a
+    return np.where(t >= 0.5, b - diff * (1 - t), a + diff * t)
+
+
+def _weighted_quantile(values, counts, q, median=False):
+    # q-quantiles of sorted values with multiplicities, "linear" method
+    q = np.asarray(q, dtype="float64")
+    cum = np.cumsum(counts)
+    if not len(cum) or cum[-1] == 0:
+        return np.full(q.shape, np.nan)
+    rank = q * (cum[-1] - 1)
+    below, above = np.floor(rank), np.ceil(rank)
+    lo = values[np.searchsorted(cum, below, side="right")]
+    hi = values[np.searchsorted(cum, above, side="right")]
+    if median:
+        # np.median averages the two middle values
+        return (lo + hi) / 2
+    return _lerp(lo, hi, rank - below)
+
+
+class _ColumnSummary:
+    """Pass-one summary of one column: missing count, range, whether every
+    value is a whole number, and the value counts. A numeric column with more
+    than max_exact distinct values switches to a QuantileSketch."""
+
+    def __init__(self, max_exact=MAX_EXACT_VALUES):
+        self.max_exact = max_exact
+        self.missing = 0
+        self.numeric = True
+        self.whole = True
+        self.min = np.inf
+        self.max = -np.inf
+        self.counts = None
+        self.sketch = None
+
+    def update(self, s):
+        self.missing += int(s.isnull().sum())
+        values = s.dropna()
+        if values.empty:
+            return
+        if not pd.api.types.is_numeric_dtype(values):
+            self.numeric = False
+        if self.numeric:
+            array = values.to_numpy(dtype="float64")
+            self.min = min(self.min, float(array.min()))
+            self.max = max(self.max, float(array.max()))
+            self.whole = self.whole and bool(np.isfinite(array).all() and (array == np.floor(array)).all())
+            if self.sketch is not None:
+                self.sketch = self.sketch + QuantileSketch.from_values(array)
+                return
+        counts = values.value_counts()
+        self.counts = counts if self.counts is None else self.counts.add(counts, fill_value=0)
+        if self.numeric and len(self.counts) > self.max_exact:
+            self.sketch = QuantileSketch.from_counts(self.counts.index.to_numpy(dtype="float64"), self.counts.to_numpy())
+            self.counts = None
+
+    def distribution(self):
+        """Sorted values and their counts (bucket values for a sketch)."""
+        if self.sketch is not None:
+            values = self.sketch.values
+            if self.whole:
+                values = np.round(values)
+            return np.clip(values, self.min, self.max), self.sketch.counts
+        if self.counts is None:
+            return np.array([]), np.array([], dtype=np.int64)
+        counts = self.counts.sort_index()
+        return counts.index.to_numpy(dtype="float64"), counts.to_numpy(dtype=np.int64)
+
+    def median(self):
+        return float(_weighted_quantile(*self.distribution(), 0.5, median=True))
+
+    def quantile(self, q, fill=None, clip=None):
+        """Quantiles after imputing the missing values with fill and clipping
+        to the (lower, upper) bounds clip."""
+        values, counts = self.distribution()
+        if fill is not None and not pd.isna(fill) and self.missing:
+            at = np.searchsorted(values, fill)
+            values, counts = np.insert(values, at, fill), np.insert(counts, at, self.missing)
+        if clip is not None:
+            values = np.clip(values, clip[0], clip[1])
+        return _weighted_quantile(values, counts, q)
+
+
+class ChunkStats:
+    """First pass of streaming preprocessing: a _ColumnSummary per column
+    (engineered features included), accumulated chunk by chunk. Its size
+    depends on the number of distinct values, not the number of rows."""
+
+    def __init__(self, engineer_features=True, max_exact=MAX_EXACT_VALUES):
+        self.engineer_features = engineer_features
+        self.max_exact = max_exact
+        self.n_rows = 0
+        self.columns = {}
+
+    def update(self, chunk):
+        if self.engineer_features:
+            chunk = PreprocessPipeline.add_features(chunk)
+        self.n_rows += len(chunk)
+        for col in chunk.columns:
+            self.columns.setdefault(col, _ColumnSummary(self.max_exact)).update(chunk[col])
+        return self
+
+    def update_all(self, chunks):
+        for chunk in chunks:
+            self.update(chunk)
+        return self
+
+
+def _smallest_int(lo, hi):
+    for dtype in ("int8", "int16", "int32"):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return dtype
+    return "int64"
+
+
+def stream_dtypes(pipeline, stats, max_category_ratio=0.5):
+    """Output dtypes of the transformed columns, fixed up front so every chunk
+    is written with the same schema. They follow compact_dtypes' rules, decided
+    from the pass-one summaries instead of the transformed frame."""
+    dtypes = {}
+    for col, s in stats.columns.items():
+        if col in pipeline.dropped:
+            continue
+        if col in pipeline.frequent_values:
+            keep = set(pipeline.frequent_values[col])
+            observed = set(s.counts.index) | {pipeline.fill_values[col]}
+            categories = sorted({v if v in keep else "Other" for v in observed})
+            if len(categories) <= max_category_ratio * stats.n_rows:
+                dtypes[col] = pd.CategoricalDtype(categories)
+        elif s.numeric and col in pipeline.clip_bounds:
+            fill = pipeline.fill_values[col]
+            lower, upper = pipeline.clip_bounds[col]
+            if pd.isna(fill) or pd.isna(lower) or pd.isna(upper):
+                continue
+            # Fill values and clip bounds that end up in the column must be whole too
+            whole = (
+                s.whole
+                and (not s.missing or float(fill).is_integer())
+                and (lower <= s.min or float(lower).is_integer())
+                and (upper >= s.max or float(upper).is_integer())
+            )
+            lo, hi = min(max(s.min, lower), fill), max(min(s.max, upper), fill)
+            if whole:
+                dtypes[col] = _smallest_int(lo, hi)
+            elif max(abs(lo), abs(hi)) < np.finfo(np.float32).max:
+                dtypes[col] = "float32"
+    return dtypes
+
+
+def _reporting(chunks, progress, total=None):
+    # Calls progress(rows read so far, total) after each chunk
+    rows = 0
+    for chunk in chunks:
+        yield chunk
+        rows += len(chunk)
+        if progress is not None:
+            progress(rows, total)
+
+
+def preprocess_file(input_path, output_path, columns=None, engineer_features=True, chunksize=CHUNK_ROWS,
+                    pipeline=None, progress=None):
+    """Preprocess a dataset file into Parquet in two passes over chunks.
+
+    Pass one accumulates ChunkStats and fits the pipeline (skipped when a
+    fitted pipeline is given, although the output dtypes still need the
+    statistics); pass two transforms each chunk, casts it to the fixed output
+    dtypes and appends it as a row group. Peak memory is a few chunks plus
+    the per-column summaries. Returns the pipeline and a per-column report
+    like compact_dtypes' (with the missing ratio of the output).
+
+    progress, if given, is called after each chunk with the rows processed
+    so far and the total row count (None during pass one, which counts them).
+    """
+    stats = ChunkStats(engineer_features).update_all(
+        _reporting(iter_dataset(input_path, columns, chunksize), progress)
+    )
+    if stats.n_rows == 0:
+        raise ValueError(f"{input_path} has no rows")
+    if pipeline is None:
+        pipeline = PreprocessPipeline(engineer_features=engineer_features).fit_stats(stats)
+    dtypes = stream_dtypes(pipeline, stats)
+
+    report = {}
+    writer = None
+    try:
+        for chunk in _reporting(iter_dataset(input_path, columns, chunksize), progress, stats.n_rows):
+            out = pipeline.transform(chunk)
+            before = out.memory_usage(deep=True, index=False)
+            dtype_before = out.dtypes.astype(str)
+            out = out.astype({col: dtype for col, dtype in dtypes.items() if col in out.columns})
+            after = out.memory_usage(deep=True, index=False)
+            missing = out.isnull().sum()
+            for col in out.columns:
+                row = report.setdefault(col, {
+                    "dtype_before": dtype_before[col], "dtype_after": str(out[col].dtype),
+                    "numeric": bool(pd.api.types.is_numeric_dtype(out[col])),
+                    "bytes_before": 0, "bytes_after": 0, "missing": 0,
+                })
+                row["bytes_before"] += int(before[col])
+                row["bytes_after"] += int(after[col])
+                row["missing"] += int(missing[col])
+            table = pa.Table.from_pandas(out, preserve_index=False, schema=writer.schema if writer else None)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    report = pd.DataFrame.from_dict(report, orient="index")
+    report["missing_ratio"] = report.pop("missing") / stats.n_rows
+    report.index.name = "column"
+    return pipeline, report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Preprocess an application_train file chunk by chunk into Parquet, "
+                    "for datasets larger than memory."
+    )
+    parser.add_argument("input_path")
+    parser.add_argument("output_path")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--no-features", action="store_true", help="skip the engineered features")
+    parser.add_argument("--pipeline", default=None, help="also save the fitted pipeline state to this JSON file")
+    args = parser.parse_args()
+    pipeline, report = preprocess_file(
+        args.input_path, args.output_path, engineer_features=not args.no_features, chunksize=args.chunksize
     )
-    return df
\ No newline at end of file
+    if args.pipeline:
+        pipeline.save(args.pipeline)
+    print(f"Wrote {args.output_path}: {len(report)} columns, "
+          f"{report['bytes_after'].sum() / 1e6:.1f} MB in memory (from {report['bytes_before'].sum() / 1e6:.1f} MB)")
@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip("duckdb")
+
+from utils.backend import parity_check
+from utils.synthetic import write_synthetic
+
+# Enough rows for every category of the filters and groupings to appear
+ROWS = 20_000
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_duckdb_matches_pandas(tmp_path, suffix):
+    # Fitted pipeline, preprocessed frame and every page metric under the
+    # parity filter presets, as `python -m utils.backend` checks them
+    path = write_synthetic(tmp_path / f"application_train{suffix}", ROWS, seed=0)
+    assert parity_check(path) == []
@@ -0,0 +1,229 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict, defaultdict, namedtuple
+
+import pandas as pd
+import streamlit as st
+
+from utils.backend import metrics_sql, sql_enabled
+from utils.cube import DEFAULT_MEASURES, get_cube
+from utils.filter_index import dataset_id, filter_key, get_filter_index
+from utils.materialize import stored
+from utils.perf import mark_miss, span
+from utils.progressive import PASS_COST, progressive_enabled, progressive_metrics
+
+# A metric a page wants computed on the filtered data.
+#   stat: count, sum, mean, std, median, min, max, nunique,
+#         share_above (share of rows with column > threshold) or notna (share of non-missing)
+#   by:   column(s) to group by; empty for a single scalar
+Metric = namedtuple("Metric", ["name", "stat", "column", "by", "threshold"], defaults=[None, (), None])
+
+CUBE_STATS = {"count", "sum", "mean", "std"}
+# TARGET statistics the cube stores under their own names
+CUBE_TARGET_COLUMNS = {"sum": "defaults", "mean": "default_rate"}
+
+
+def _by(metric):
+    by = metric.by
+    return (by,) if isinstance(by, str) else tuple(by)
+
+
+def _identity(metric):
+    # What the value depends on besides the data; metrics that only differ in
+    # name share one cache entry
+    return (metric.stat, metric.column, _by(metric), metric.threshold)
+
+
+class AggregationEngine:
+    """Computes page metrics with as few grouped passes as possible.
+
+    Metrics are planned by grouping key: everything the pre-aggregated cube can
+    answer (counts, sums, means and standard deviations of cube measures, split
+    by cube dimensions) costs one cube query per grouping key, and everything
+    else is one pandas groupby per grouping key over the filtered frame (one
+    DuckDB query over the full frame with the filters pushed down, with the
+    DuckDB backend).
+    Results are cached per filter state and shared by every page that uses the
+    same dataset.
+    """
+
+    def __init__(self, cache_size=4096):
+        self._results = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    # -----------------------------
+    # Cache
+    # -----------------------------
+    def _get(self, key):
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return True, self._results[key]
+        return False, None
+
+    def _put(self, key, value):
+        with self._lock:
+            self._results[key] = value
+            while len(self._results) > self._cache_size:
+                self._results.popitem(last=False)
+
+    def save(self, path):
+        """Write the cached results into directory `path`."""
+        path.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(path / "results.pkl", "wb") as f:
+            pickle.dump(self._results, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        engine = cls()
+        with open(path / "results.pkl", "rb") as f:
+            engine._results.update(pickle.load(f))
+        return engine
+
+    # -----------------------------
+    # Planning
+    # -----------------------------
+    @staticmethod
+    def _cube_column(metric, cube):
+        if metric.threshold is not None or metric.stat not in CUBE_STATS:
+            return None
+        if not set(_by(metric)) <= set(cube.dimensions):
+            return None
+        if metric.stat == "count":
+            return "count"
+        if metric.column == "TARGET":
+            return CUBE_TARGET_COLUMNS.get(metric.stat)
+        if metric.column in cube.measures:
+            return f"{metric.column}_{metric.stat}"
+        return None
+
+    def plan(self, df, filters, metrics):
+        """Cached values by name, plus the passes computing the other metrics:
+        (cube, cube passes, frame passes), passes keyed by grouping key."""
+        fkey = filter_key(filters)
+        values, pending = {}, []
+        for metric in metrics:
+            hit, value = self._get((fkey, _identity(metric)))
+            if hit:
+                values[metric.name] = value
+            else:
+                pending.append(metric)
+        if not pending:
+            return values, None, {}, {}
+
+        # Numeric columns outside the default measures join the cube as extra measures
+        extra_measures = [
+            m.column for m in pending
+            if m.stat in CUBE_STATS and m.column not in [None, "TARGET"] + DEFAULT_MEASURES
+            and pd.api.types.is_numeric_dtype(df[m.column])
+        ]
+        cube = get_cube(df, measures=DEFAULT_MEASURES + extra_measures)
+
+        cube_passes, frame_passes = defaultdict(list), defaultdict(list)
+        for metric in pending:
+            column = self._cube_column(metric, cube)
+            if column is not None:
+                cube_passes[_by(metric)].append((metric, column))
+            else:
+                frame_passes[_by(metric)].append(metric)
+        return values, cube, cube_passes, frame_passes
+
+    def compute(self, df, df_filtered, filters, metrics, estimator=None):
+        """Values of `metrics` (scalars, or Series for grouped metrics) by name.
+
+        With an estimator, the frame passes are replaced by estimator(by,
+        metrics), which yields (metric, value) pairs; estimates are not cached.
+        """
+        fkey = filter_key(filters)
+        values, cube, cube_passes, frame_passes = self.plan(df, filters, metrics)
+        if not cube_passes and not frame_passes:
+            return values
+        mark_miss()
+
+        for by, planned in cube_passes.items():
+            measures = list(dict.fromkeys(m.column for m, _ in planned if m.column in cube.measures))
+            result = cube.query(filters, by=list(by), measures=measures)
+            for metric, column in planned:
+                value = result[column].rename(metric.name) if by else result[column].iloc[0]
+                values[metric.name] = value
+                self._put((fkey, _identity(metric)), value)
+
+        for by, planned in frame_passes.items():
+            if estimator is not None:
+                values.update((metric.name, value) for metric, value in estimator(by, planned))
+                continue
+            start = time.perf_counter()
+            if sql_enabled() and filters is not None:
+                passes = metrics_sql(df, filters, get_filter_index(df).domain, by, planned)
+            else:
+                passes = self._frame_pass(df_filtered, by, planned)
+            for metric, value in passes:
+                values[metric.name] = value
+                self._put((fkey, _identity(metric)), value)
+            PASS_COST.observe("exact", len(df_filtered), time.perf_counter() - start)
+        return values
+
+    # -----------------------------
+    # Grouped pass over the filtered frame
+    # -----------------------------
+    @staticmethod
+    def _frame_pass(df_filtered, by, metrics):
+        columns, spec, targets = {}, defaultdict(list), []
+        for metric in metrics:
+            if metric.stat == "count":
+                targets.append((metric, None))
+                continue
+            column, func = metric.column, metric.stat
+            if metric.stat == "share_above":
+                column, func = f"{metric.column} > {metric.threshold}", "mean"
+                columns[column] = df_filtered[metric.column] > metric.threshold
+            elif metric.stat == "notna":
+                column, func = f"{metric.column} notna", "mean"
+                columns[column] = df_filtered[metric.column].notna()
+            else:
+                columns[column] = df_filtered[column]
+            if func not in spec[column]:
+                spec[column].append(func)
+            targets.append((metric, (column, func)))
+
+        frame = pd.DataFrame(columns, index=df_filtered.index)
+        if by:
+            grouped = frame.groupby([df_filtered[b] for b in by], observed=True)
+            agg = grouped.agg(dict(spec)) if spec else None
+            size = grouped.size()
+        else:
+            agg = frame.agg(dict(spec)) if spec else None
+            size = len(frame)
+
+        out = []
+        for metric, target in targets:
+            if target is None:
+                value = size
+            elif by:
+                value = agg[target]
+            else:
+                value = agg.at[target[1], target[0]]
+            out.append((metric, value.rename(metric.name) if isinstance(value, pd.Series) else value))
+        return out
+
+
+@st.cache_resource(show_spinner=False)
+def _get_engine(dataset):
+    return stored(dataset, "metrics", AggregationEngine, AggregationEngine)
+
+
+def compute_metrics(df, df_filtered, metrics, filters=None):
+    """Compute a page's registered metrics for the current filter state.
+
+    df is the page's full frame, df_filtered the output of apply_global_filters.
+    In progressive mode (utils.progressive) the values may be estimates.
+    """
+    if filters is None:
+        filters = st.session_state.get("filters")
+    with span("kpi", rows=len(df_filtered), cached=True):
+        engine = _get_engine(dataset_id(df))
+        if progressive_enabled() and filters is not None:
+            return progressive_metrics(engine, df, df_filtered, filters, metrics)
+        return engine.compute(df, df_filtered, filters, metrics)
@@ -1,46 +1,72 @@
 import streamlit as st
 
+from utils.filter_index import get_filter_index
+from utils.perf import span
+
+# Sidebar label of each filter
+FILTER_LABELS = {
+    "gender": "Gender",
+    "education": "Education",
+    "family_status": "Family Status",
+    "housing": "Housing Type",
+    "credit_history": "Credit History",
+    "age_range": "Age Range",
+    "income_range": "Income Bracket",
+}
+
 def apply_global_filters(df):
     st.sidebar.header("🔍 Global Filters")
 
 
+    # Options, slider bounds and row bitmaps are precomputed once per dataset
+    with span("filter index", cached=True):
+        index = get_filter_index(df)
+    domain = index.domain
+
     # --- Gender ---
     gender = st.sidebar.multiselect(
-        "Gender",
-        df["CODE_GENDER"].dropna().unique().tolist(),
-        default=df["CODE_GENDER"].dropna().unique().tolist()
+        FILTER_LABELS["gender"],
+        domain["gender"],
+        default=domain["gender"]
     )
 
     # --- Education ---
     education = st.sidebar.multiselect(
-        "Education",
-        df["NAME_EDUCATION_TYPE"].dropna().unique().tolist(),
-        default=df["NAME_EDUCATION_TYPE"].dropna().unique().tolist()
+        FILTER_LABELS["education"],
+        domain["education"],
+        default=domain["education"]
     )
 
     # --- Family Status ---
     family_status = st.sidebar.multiselect(
-        "Family Status",
-        df["NAME_FAMILY_STATUS"].dropna().unique().tolist(),
-        default=df["NAME_FAMILY_STATUS"].dropna().unique().tolist()
+        FILTER_LABELS["family_status"],
+        domain["family_status"],
+        default=domain["family_status"]
     )
 
     # --- Housing Type ---
     housing = st.sidebar.multiselect(
-        "Housing Type",
-        df["NAME_HOUSING_TYPE"].dropna().unique().tolist(),
-        default=df["NAME_HOUSING_TYPE"].dropna().unique().tolist()
+        FILTER_LABELS["housing"],
+        domain["housing"],
+        default=domain["housing"]
     )
 
+    # --- Credit History (datasets with the auxiliary tables only) ---
+    optional = {}
+    if "credit_history" in domain:
+        optional["credit_history"] = st.sidebar.multiselect(
+            FILTER_LABELS["credit_history"],
+            domain["credit_history"],
+            default=domain["credit_history"]
+        )
+
     # --- Age Range (converted from DAYS_BIRTH) ---
-    min_age = int(df["DAYS_BIRTH"].apply(lambda x: -x / 365).min())
-    max_age = int(df["DAYS_BIRTH"].apply(lambda x: -x / 365).max())
-    age_range = st.sidebar.slider("Age Range", min_age, max_age, (min_age, max_age))
+    min_age, max_age = domain["age_range"]
+    age_range = st.sidebar.slider(FILTER_LABELS["age_range"], min_age, max_age, (min_age, max_age))
 
     # --- Income Range ---
-    min_income = int(df["AMT_INCOME_TOTAL"].min())
-    max_income = int(df["AMT_INCOME_TOTAL"].max())
-    income_range = st.sidebar.slider("Income Bracket", min_income, max_income, (min_income, max_income), step=10000)
+    min_income, max_income = domain["income_range"]
+    income_range = st.sidebar.slider(FILTER_LABELS["income_range"], min_income, max_income, (min_income, max_income), step=10000)
 
   # Save in session_state
     st.session_state["filters"] = {
@@ -48,17 +74,13 @@ def apply_global_filters(df):
         "education": education,
         "family_status": family_status,
         "housing": housing,
+        **optional,
         "age_range": age_range,
         "income_range": income_range,
     }
 
     # --- Apply Filters ---
-    df_filtered = df[
-        df["CODE_GENDER"].isin(gender) &
-        df["NAME_EDUCATION_TYPE"].isin(education) &
-        df["NAME_FAMILY_STATUS"].isin(family_status) &
-        df["NAME_HOUSING_TYPE"].isin(housing) &
-        df["DAYS_BIRTH"].apply(lambda x: -x / 365).between(age_range[0], age_range[1]) &
-        df["AMT_INCOME_TOTAL"].between(income_range[0], income_range[1])
-    ]
+    with span("filter", cached=True) as record:
+        df_filtered = df[index.mask(st.session_state["filters"])]
+        record["rows"] = len(df_filtered)
     return  df_filtered
@@ -0,0 +1,275 @@
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.load_data import CHUNK_ROWS, default_data_path, iter_dataset
+
+# Tables of the Home Credit dataset holding each applicant's credit history,
+# looked up next to the application file
+AUXILIARY_TABLES = ["bureau", "bureau_balance", "previous_application", "installments_payments"]
+TABLE_SUFFIXES = [".parquet", ".feather", ".csv", ".csv.gz", ".csv.zip"]
+
+# Partial aggregates accumulated over chunks are merged once they exceed
+# this many rows, so memory is bounded by the number of distinct keys
+COMPACT_ROWS = 2_000_000
+
+# Credit-history segment of an applicant (the "Credit History" filter)
+NO_HISTORY = "No history"
+ON_TIME = "On time"
+LATE = "Late payments"
+
+
+# -----------------------------
+# Grouped Reductions
+# -----------------------------
+class GroupedAccumulator:
+    """Per-key sums, maxima and minima over a table read in chunks.
+
+    Each chunk is reduced to one row per key with a grouped aggregation; the
+    partial rows are mergeable with the same reductions, and are merged
+    whenever they exceed compact_rows.
+    """
+
+    def __init__(self, key, reductions, compact_rows=COMPACT_ROWS):
+        self.key = key
+        self.reductions = reductions
+        self.compact_rows = compact_rows
+        self.parts = []
+        self.rows = 0
+
+    def update(self, values):
+        """Add a chunk: the key column plus one row-level column per reduction."""
+        partial = values.groupby(self.key, sort=False).agg(self.reductions)
+        self.parts.append(partial)
+        self.rows += len(partial)
+        if self.rows > self.compact_rows:
+            self._compact()
+
+    def _compact(self):
+        merged = pd.concat(self.parts).groupby(level=0, sort=False).agg(self.reductions)
+        self.parts = [merged]
+        self.rows = len(merged)
+
+    def result(self):
+        if not self.parts:
+            return pd.DataFrame(columns=list(self.reductions), index=pd.Index([], name=self.key), dtype="float64")
+        self._compact()
+        return self.parts[0]
+
+
+# -----------------------------
+# Tables
+# -----------------------------
+# Per table: columns read, per-key reductions of the row-level values, and
+# the function turning a chunk into those values
+def _bureau_balance_rows(chunk):
+    # STATUS is months past due ("0".."5"), or C (closed) / X (unknown)
+    dpd = pd.to_numeric(chunk["STATUS"].astype(str), errors="coerce")
+    return pd.DataFrame({
+        "SK_ID_BUREAU": chunk["SK_ID_BUREAU"],
+        "BUREAU_BALANCE_MONTHS": 1,
+        "BUREAU_BALANCE_DPD_MONTHS": (dpd > 0).astype(np.int32),
+        "BUREAU_WORST_STATUS": dpd,
+    })
+
+
+def _bureau_rows(chunk, balance):
+    rows = pd.DataFrame({
+        "SK_ID_CURR": chunk["SK_ID_CURR"],
+        "BUREAU_LOANS": 1,
+        "BUREAU_ACTIVE_LOANS": (chunk["CREDIT_ACTIVE"] == "Active").astype(np.int32),
+        "BUREAU_CREDIT_SUM": chunk["AMT_CREDIT_SUM"],
+        "BUREAU_DEBT_SUM": chunk["AMT_CREDIT_SUM_DEBT"],
+        "BUREAU_OVERDUE_SUM": chunk["AMT_CREDIT_SUM_OVERDUE"],
+        "BUREAU_MAX_OVERDUE": chunk["AMT_CREDIT_MAX_OVERDUE"],
+        "BUREAU_MAX_DAYS_OVERDUE": chunk["CREDIT_DAY_OVERDUE"],
+        "BUREAU_PROLONGATIONS": chunk["CNT_CREDIT_PROLONG"],
+        "BUREAU_LAST_CREDIT_DAYS": chunk["DAYS_CREDIT"],
+    })
+    # Monthly balances were reduced per bureau loan first; roll them up to the applicant
+    monthly = balance.reindex(chunk["SK_ID_BUREAU"].to_numpy())
+    for col in monthly.columns:
+        rows[col] = monthly[col].to_numpy()
+    return rows
+
+
+def _previous_rows(chunk):
+    status = chunk["NAME_CONTRACT_STATUS"]
+    return pd.DataFrame({
+        "SK_ID_CURR": chunk["SK_ID_CURR"],
+        "PREV_APPLICATIONS": 1,
+        "PREV_APPROVED": (status == "Approved").astype(np.int32),
+        "PREV_REFUSED": (status == "Refused").astype(np.int32),
+        "PREV_AMT_APPLICATION": chunk["AMT_APPLICATION"],
+        "PREV_AMT_CREDIT": chunk["AMT_CREDIT"],
+        "PREV_LAST_DECISION_DAYS": chunk["DAYS_DECISION"],
+    })
+
+
+def _installments_rows(chunk):
+    delay = chunk["DAYS_ENTRY_PAYMENT"] - chunk["DAYS_INSTALMENT"]
+    return pd.DataFrame({
+        "SK_ID_CURR": chunk["SK_ID_CURR"],
+        "INST_PAYMENTS": 1,
+        "INST_LATE": (delay > 0).astype(np.int32),
+        "INST_UNDERPAID": (chunk["AMT_PAYMENT"] < chunk["AMT_INSTALMENT"]).astype(np.int32),
+        "INST_MAX_DELAY": delay,
+        "INST_AMT_DUE": chunk["AMT_INSTALMENT"],
+        "INST_AMT_PAID": chunk["AMT_PAYMENT"],
+    })
+
+
+TABLES = {
+    "bureau_balance": {
+        "columns": ["SK_ID_BUREAU", "STATUS"],
+        "reductions": {"BUREAU_BALANCE_MONTHS": "sum", "BUREAU_BALANCE_DPD_MONTHS": "sum", "BUREAU_WORST_STATUS": "max"},
+        "rows": _bureau_balance_rows,
+    },
+    "bureau": {
+        "columns": [
+            "SK_ID_CURR", "SK_ID_BUREAU", "CREDIT_ACTIVE", "AMT_CREDIT_SUM", "AMT_CREDIT_SUM_DEBT",
+            "AMT_CREDIT_SUM_OVERDUE", "AMT_CREDIT_MAX_OVERDUE", "CREDIT_DAY_OVERDUE", "CNT_CREDIT_PROLONG",
+            "DAYS_CREDIT",
+        ],
+        "reductions": {
+            "BUREAU_LOANS": "sum", "BUREAU_ACTIVE_LOANS": "sum", "BUREAU_CREDIT_SUM": "sum",
+            "BUREAU_DEBT_SUM": "sum", "BUREAU_OVERDUE_SUM": "sum", "BUREAU_MAX_OVERDUE": "max",
+            "BUREAU_MAX_DAYS_OVERDUE": "max", "BUREAU_PROLONGATIONS": "sum", "BUREAU_LAST_CREDIT_DAYS": "max",
+            "BUREAU_BALANCE_MONTHS": "sum", "BUREAU_BALANCE_DPD_MONTHS": "sum", "BUREAU_WORST_STATUS": "max",
+        },
+        "rows": _bureau_rows,
+    },
+    "previous_application": {
+        "columns": [
+            "SK_ID_CURR", "NAME_CONTRACT_STATUS", "AMT_APPLICATION", "AMT_CREDIT", "DAYS_DECISION",
+        ],
+        "reductions": {
+            "PREV_APPLICATIONS": "sum", "PREV_APPROVED": "sum", "PREV_REFUSED": "sum",
+            "PREV_AMT_APPLICATION": "sum", "PREV_AMT_CREDIT": "sum", "PREV_LAST_DECISION_DAYS": "max",
+        },
+        "rows": _previous_rows,
+    },
+    "installments_payments": {
+        "columns": [
+            "SK_ID_CURR", "DAYS_INSTALMENT", "DAYS_ENTRY_PAYMENT", "AMT_INSTALMENT", "AMT_PAYMENT",
+        ],
+        "reductions": {
+            "INST_PAYMENTS": "sum", "INST_LATE": "sum", "INST_UNDERPAID": "sum", "INST_MAX_DELAY": "max",
+            "INST_AMT_DUE": "sum", "INST_AMT_PAID": "sum",
+        },
+        "rows": _installments_rows,
+    },
+}
+
+# Record counts: 0 for applicants absent from a table (other features stay missing)
+COUNT_COLUMNS = [
+    "BUREAU_LOANS", "BUREAU_ACTIVE_LOANS", "BUREAU_BALANCE_MONTHS", "BUREAU_BALANCE_DPD_MONTHS",
+    "PREV_APPLICATIONS", "PREV_APPROVED", "PREV_REFUSED", "INST_PAYMENTS", "INST_LATE", "INST_UNDERPAID",
+]
+RATIO_COLUMNS = {
+    "BUREAU_DEBT_RATIO": ("BUREAU_DEBT_SUM", "BUREAU_CREDIT_SUM"),
+    "BUREAU_BALANCE_DPD_RATIO": ("BUREAU_BALANCE_DPD_MONTHS", "BUREAU_BALANCE_MONTHS"),
+    "PREV_REFUSAL_RATIO": ("PREV_REFUSED", "PREV_APPLICATIONS"),
+    "PREV_CREDIT_TO_APPLICATION": ("PREV_AMT_CREDIT", "PREV_AMT_APPLICATION"),
+    "INST_LATE_RATIO": ("INST_LATE", "INST_PAYMENTS"),
+    "INST_UNDERPAID_RATIO": ("INST_UNDERPAID", "INST_PAYMENTS"),
+    "INST_PAYMENT_RATIO": ("INST_AMT_PAID", "INST_AMT_DUE"),
+}
+# Every column the auxiliary artifact part can hold
+FEATURE_COLUMNS = list(dict.fromkeys(
+    [c for name in ("bureau", "previous_application", "installments_payments") for c in TABLES[name]["reductions"]]
+    + list(RATIO_COLUMNS) + ["CREDIT_HISTORY"]
+))
+
+
+# -----------------------------
+# Aggregation
+# -----------------------------
+def find_auxiliary_tables(file_path=None):
+    """{table: path} of the auxiliary tables next to an application file."""
+    folder = Path(file_path or default_data_path()).parent
+    tables = {}
+    for name in AUXILIARY_TABLES:
+        for suffix in TABLE_SUFFIXES:
+            path = folder / f"{name}{suffix}"
+            if path.is_file():
+                tables[name] = path
+                break
+    return tables
+
+
+def aggregate_table(path, name, chunksize=CHUNK_ROWS, **context):
+    """Per-key aggregates of one table, streamed in chunks of chunksize rows."""
+    spec = TABLES[name]
+    acc = GroupedAccumulator(spec["columns"][0], spec["reductions"])
+    for chunk in iter_dataset(path, columns=spec["columns"], chunksize=chunksize):
+        acc.update(spec["rows"](chunk, **context))
+    return acc.result()
+
+
+def auxiliary_features(tables, chunksize=CHUNK_ROWS):
+    """Per-SK_ID_CURR features of the auxiliary tables found ({table: path}),
+    computed in one streaming pass over each table."""
+    frames = []
+    if "bureau" in tables:
+        # bureau_balance is keyed by bureau loan: reduced per loan, then rolled
+        # up per applicant while bureau streams
+        reductions = TABLES["bureau_balance"]["reductions"]
+        balance = (
+            aggregate_table(tables["bureau_balance"], "bureau_balance", chunksize)
+            if "bureau_balance" in tables
+            else pd.DataFrame(columns=list(reductions), dtype="float64")
+        )
+        frames.append(aggregate_table(tables["bureau"], "bureau", chunksize, balance=balance))
+        del balance
+    for name in ("previous_application", "installments_payments"):
+        if name in tables:
+            frames.append(aggregate_table(tables[name], name, chunksize))
+    features = pd.concat(frames, axis=1) if frames else pd.DataFrame()
+    features.index.name = "SK_ID_CURR"
+    return features
+
+
+def join_features(ids, features):
+    """Features aligned to the application rows (ids = their SK_ID_CURR),
+    with the derived ratios and the credit-history segment."""
+    df = features.reindex(ids.to_numpy()).reset_index(drop=True)
+    for col in COUNT_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].fillna(0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for col, (num, den) in RATIO_COLUMNS.items():
+            if num in df.columns and den in df.columns:
+                df[col] = (df[num] / df[den]).replace([np.inf, -np.inf], np.nan)
+
+    def column(col):
+        return df[col].fillna(0) if col in df.columns else pd.Series(0, index=df.index)
+
+    late = (
+        (column("INST_LATE") > 0) | (column("BUREAU_BALANCE_DPD_MONTHS") > 0)
+        | (column("BUREAU_OVERDUE_SUM") > 0) | (column("BUREAU_MAX_DAYS_OVERDUE") > 0)
+    )
+    history = (column("BUREAU_LOANS") > 0) | (column("PREV_APPLICATIONS") > 0) | (column("INST_PAYMENTS") > 0)
+    df["CREDIT_HISTORY"] = np.where(~history, NO_HISTORY, np.where(late, LATE, ON_TIME))
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Aggregate the auxiliary tables next to an application file into the dataset's "
+                    "auxiliary artifact part (per-applicant credit-history features)."
+    )
+    parser.add_argument("--data", default=None, help="application file (default: the app's default dataset)")
+    args = parser.parse_args()
+
+    from utils.cache import AUXILIARY_PART, dataset_key, ensure_artifact
+    file_path = str(args.data or default_data_path())
+    tables = find_auxiliary_tables(file_path)
+    if not tables:
+        raise SystemExit(f"No auxiliary tables ({', '.join(AUXILIARY_TABLES)}) next to {file_path}")
+    start = time.perf_counter()
+    path = ensure_artifact(file_path, dataset_key(file_path), AUXILIARY_PART)
+    print(f"{', '.join(tables)} -> {path} ({time.perf_counter() - start:.1f}s)")
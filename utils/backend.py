@@ -0,0 +1,451 @@
+import argparse
+import math
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:  # only the pandas backend is then available
+    duckdb = None
+
+from preprocess import INCOME_BRACKET_LABELS, PreprocessPipeline
+from utils.filter_index import CATEGORICAL_FILTERS
+from utils.load_data import data_format, dataset_columns, default_data_path
+
+# Execution backend of preprocessing and of the page metrics the cube cannot
+# answer: "pandas" (the reference implementation) or "duckdb", which
+# preprocesses with one query over the dataset file and runs the metric
+# passes as queries over the page's in-memory frame. Filtering is not pushed
+# down: df_filtered, the rows the charts draw, always comes from FilterIndex.
+BACKEND = os.environ.get("HOME_CREDIT_BACKEND", "pandas")
+# Threads DuckDB may use per query
+THREADS = int(os.environ.get("HOME_CREDIT_BACKEND_THREADS", str(os.cpu_count() or 1)))
+# Dataset formats DuckDB scans directly (others are read with pandas first)
+SQL_FORMATS = {"parquet": "read_parquet", "csv": "read_csv"}
+
+NUMERIC_TYPES = (
+    "TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "UTINYINT", "USMALLINT", "UINTEGER",
+    "UBIGINT", "FLOAT", "DOUBLE", "DECIMAL",
+)
+
+_local = threading.local()
+
+
+def sql_enabled():
+    """True when the DuckDB backend is selected and installed."""
+    return BACKEND == "duckdb" and duckdb is not None
+
+
+def connection():
+    # One connection per thread: Streamlit runs each session's script in its own thread
+    con = getattr(_local, "con", None)
+    if con is None:
+        con = _local.con = duckdb.connect(config={"threads": THREADS})
+    return con
+
+
+# -----------------------------
+# SQL Building
+# -----------------------------
+def quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def literal(value):
+    value = value.item() if hasattr(value, "item") else value
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "NULL"
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    # A bare 1.5 would be a DECIMAL, and round what it is combined with
+    return f"CAST('{value!r}' AS DOUBLE)" if isinstance(value, float) else str(value)
+
+
+def _clip(expr, lower, upper):
+    # Like Series.clip: missing values and missing bounds are left alone
+    cases = []
+    if lower is not None and not pd.isna(lower):
+        cases.append(f"WHEN {expr} < {literal(lower)} THEN {literal(lower)}")
+    if upper is not None and not pd.isna(upper):
+        cases.append(f"WHEN {expr} > {literal(upper)} THEN {literal(upper)}")
+    return f"CASE {' '.join(cases)} ELSE {expr} END" if cases else expr
+
+
+def scan(source, columns=None):
+    """FROM clause over a dataset file (only `columns` are read, in the
+    order read_dataset returns them) or a frame registered on this thread's
+    connection."""
+    if columns is not None and not isinstance(source, pd.DataFrame) and data_format(source) == "csv":
+        wanted = set(columns)
+        columns = [c for c in dataset_columns(source) if c in wanted]
+    cols = "*" if columns is None else ", ".join(quote(c) for c in columns)
+    if isinstance(source, pd.DataFrame):
+        connection().register("source_frame", source)
+        return f"(SELECT {cols} FROM source_frame)"
+    reader = SQL_FORMATS[data_format(source)]
+    return f"(SELECT {cols} FROM {reader}({literal(str(source))}))"
+
+
+# Same expressions as PreprocessPipeline.add_features
+FEATURES = {
+    "AGE_YEARS": 'CAST(round(-"DAYS_BIRTH" / 365.25) AS BIGINT)',
+    "EMPLOYMENT_YEARS": _clip('(-"DAYS_EMPLOYED" / 365.25)', 0, 60),
+    "DTI": '"AMT_ANNUITY" / "AMT_INCOME_TOTAL"',
+    "LTI": '"AMT_CREDIT" / "AMT_INCOME_TOTAL"',
+    "ANNUITY_TO_CREDIT": '"AMT_ANNUITY" / "AMT_CREDIT"',
+}
+
+
+def _with_features(relation, engineer_features):
+    if not engineer_features:
+        return relation
+    features = ", ".join(f"{expr} AS {quote(name)}" for name, expr in FEATURES.items())
+    return f"(SELECT *, {features} FROM {relation})"
+
+
+# -----------------------------
+# Preprocessing
+# -----------------------------
+def fit_sql(pipeline, relation):
+    """PreprocessPipeline.fit as aggregate queries over a relation (engineered
+    features included): one query for the missing counts, the medians, the
+    categorical value counts and the winsorizing quantiles each."""
+    con = connection()
+    schema = con.execute(f"DESCRIBE SELECT * FROM {relation}").fetchall()
+    columns = [name for name, *_ in schema]
+    numeric_cols = {name for name, dtype, *_ in schema if dtype.startswith(NUMERIC_TYPES)}
+
+    counts = con.execute(
+        f"SELECT count(*), {', '.join(f'count({quote(c)})' for c in columns)} FROM {relation}"
+    ).fetchone()
+    n_rows = counts[0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        missing_ratio = 1 - np.asarray(counts[1:], dtype="float64") / n_rows
+    pipeline.dropped = [c for c, r in zip(columns, missing_ratio) if r > pipeline.missing_threshold]
+    kept = [c for c in columns if c not in pipeline.dropped]
+    numeric = [c for c in kept if c in numeric_cols]
+    categorical = [c for c in kept if c not in numeric_cols]
+
+    pipeline.fill_values = {}
+    if numeric:
+        medians = con.execute(
+            f"SELECT {', '.join(f'quantile_cont({quote(c)}, 0.5)' for c in numeric)} FROM {relation}"
+        ).fetchone()
+        pipeline.fill_values = {c: float("nan") if v is None else float(v) for c, v in zip(numeric, medians)}
+
+    pipeline.frequent_values = {}
+    if categorical:
+        value_counts = con.execute(" UNION ALL ".join(
+            f"SELECT {literal(c)} AS col, {quote(c)} AS value, count(*) AS n FROM {relation} "
+            f"WHERE {quote(c)} IS NOT NULL GROUP BY {quote(c)}"
+            for c in categorical
+        )).df()
+        for col in categorical:
+            counts = value_counts[value_counts["col"] == col].set_index("value")["n"]
+            pipeline.fit_categories(col, counts, n_rows - counts.sum(), n_rows)
+
+    # Quantiles of the imputed columns, as fit() takes them
+    pipeline.clip_bounds = {}
+    lo, hi = pipeline.clip_quantiles
+    if numeric:
+        quantiles = [
+            f"quantile_cont(coalesce({quote(c)}, {literal(pipeline.fill_values[c])}), [{lo}, {hi}])" for c in numeric
+        ]
+        bounds = con.execute(f"SELECT {', '.join(quantiles)} FROM {relation}").fetchone()
+        pipeline.clip_bounds = {
+            c: [float("nan"), float("nan")] if b is None else [float(v) for v in b] for c, b in zip(numeric, bounds)
+        }
+
+    pipeline.income_edges = None
+    if pipeline.engineer_features:
+        income = _clip(
+            f'coalesce("AMT_INCOME_TOTAL", {literal(pipeline.fill_values["AMT_INCOME_TOTAL"])})',
+            *pipeline.clip_bounds["AMT_INCOME_TOTAL"],
+        )
+        qs = ", ".join(str(q) for q in [0, 0.25, 0.75, 1.0])
+        edges = con.execute(f"SELECT quantile_cont({income}, [{qs}]) FROM {relation}").fetchone()[0]
+        pipeline.income_edges = [float(v) for v in edges]
+    return pipeline
+
+
+def transform_sql(pipeline, columns):
+    """SELECT list applying a fitted pipeline to a relation with `columns`
+    (engineered features included), as PreprocessPipeline.transform does."""
+    exprs = {}
+    for col in columns:
+        if col in pipeline.dropped:
+            continue
+        expr = quote(col)
+        if col in pipeline.fill_values:
+            expr = f"coalesce({expr}, {literal(pipeline.fill_values[col])})"
+        if col in pipeline.frequent_values:
+            # Categories unseen at fit time count as rare as well
+            keep = pipeline.frequent_values[col]
+            expr = f"CASE WHEN {expr} IN ({', '.join(map(literal, keep))}) THEN {expr} ELSE 'Other' END" if keep else "'Other'"
+        if col in pipeline.clip_bounds:
+            expr = _clip(expr, *pipeline.clip_bounds[col])
+        exprs[col] = expr
+
+    if pipeline.income_edges is not None:
+        # pd.cut with include_lowest: [e0, e1], (e1, e2], (e2, e3]
+        income, edges = exprs["AMT_INCOME_TOTAL"], pipeline.income_edges
+        cases = [f"WHEN {income} < {literal(edges[0])} OR {income} > {literal(edges[-1])} THEN NULL"]
+        cases += [f"WHEN {income} <= {literal(e)} THEN {literal(label)}" for e, label in zip(edges[1:], INCOME_BRACKET_LABELS)]
+        exprs["INCOME_BRACKET"] = f"CASE {' '.join(cases)} END"
+    return ", ".join(f"{expr} AS {quote(col)}" for col, expr in exprs.items())
+
+
+def preprocess_sql(source, columns=None, engineer_features=True, pipeline=None):
+    """Fit (unless a fitted pipeline is given) and apply the preprocessing
+    pipeline with DuckDB over a dataset file or a DataFrame.
+
+    The whole transform is one query: only `columns` are scanned, the steps
+    are fused instead of copying the frame at each one, and the scan and
+    expressions run on THREADS threads. Returns the frame and the pipeline.
+    """
+    con = connection()
+    relation = scan(source, columns)
+    csv = not isinstance(source, pd.DataFrame) and data_format(source) == "csv"
+    if csv:
+        # Text is parsed once; the fit's aggregate passes read DuckDB's columnar copy
+        con.execute(f"CREATE OR REPLACE TEMP TABLE source_table AS SELECT * FROM {relation}")
+        relation = "source_table"
+    relation = _with_features(relation, engineer_features)
+    if pipeline is None:
+        pipeline = fit_sql(PreprocessPipeline(engineer_features=engineer_features), relation)
+    names = [name for name, *_ in con.execute(f"DESCRIBE SELECT * FROM {relation}").fetchall()]
+    df = con.execute(f"SELECT {transform_sql(pipeline, names)} FROM {relation}").to_arrow_table().to_pandas()
+    if "INCOME_BRACKET" in df.columns:
+        df["INCOME_BRACKET"] = pd.Categorical(df["INCOME_BRACKET"], categories=INCOME_BRACKET_LABELS, ordered=True)
+    if csv:
+        con.execute("DROP TABLE source_table")
+    elif isinstance(source, pd.DataFrame):
+        con.unregister("source_frame")
+    return df, pipeline
+
+
+def sql_readable(file_path):
+    return data_format(file_path) in SQL_FORMATS
+
+
+# -----------------------------
+# Filters and Metrics
+# -----------------------------
+# Age in years as the age slider computes it
+AGE_EXPR = '(-"DAYS_BIRTH" / 365)'
+
+
+def filter_where(filters, domain):
+    """WHERE clause and parameters of a filter state, selecting the rows
+    FilterIndex.mask does: a categorical filter selecting every option keeps
+    all rows (missing values included), ranges always apply."""
+    clauses, params = [], []
+    for name, col in CATEGORICAL_FILTERS.items():
+        if name not in filters or name not in domain or set(domain[name]) <= set(filters[name]):
+            continue
+        selected = list(filters[name])
+        clauses.append(f"{quote(col)} IN ({', '.join('?' * len(selected))})" if selected else "FALSE")
+        params += [str(v) for v in selected]
+    ranges = {"age_range": AGE_EXPR, "income_range": '"AMT_INCOME_TOTAL"'}
+    for name, expr in ranges.items():
+        lo, hi = filters[name]
+        clauses.append(f"{expr} BETWEEN ? AND ?")
+        params += [float(lo), float(hi)]
+    return " AND ".join(clauses) or "TRUE", params
+
+
+# pandas aggregations as SQL aggregates (x is the metric's column)
+AGGREGATES = {
+    "count": "count(*)",
+    "sum": "coalesce(sum({x}), 0)",
+    "mean": "avg({x})",
+    "std": "stddev_samp({x})",
+    "median": "quantile_cont({x}, 0.5)",
+    "min": "min({x})",
+    "max": "max({x})",
+    "nunique": "count(DISTINCT {x})",
+    "share_above": "avg(CAST(coalesce({x} > {threshold}, false) AS DOUBLE))",
+    "notna": "avg(CAST({x} IS NOT NULL AS DOUBLE))",
+}
+
+
+def metrics_query(source, filters, domain, by, metrics):
+    """SQL and parameters of one grouped metric pass over `source` (a FROM
+    clause), with the filter state as its WHERE clause."""
+    where, params = filter_where(filters, domain) if filters else ("TRUE", [])
+    selects = [
+        AGGREGATES[m.stat].format(x=quote(m.column) if m.column else "", threshold=literal(m.threshold))
+        + f" AS {quote(m.name)}"
+        for m in metrics
+    ]
+    if not by:
+        return f"SELECT {', '.join(selects)} FROM {source} WHERE {where}", params
+    # groupby(observed=True) leaves out missing keys
+    where += "".join(f" AND {quote(b)} IS NOT NULL" for b in by)
+    group = ", ".join(quote(b) for b in by)
+    return f"SELECT {group}, {', '.join(selects)} FROM {source} WHERE {where} GROUP BY {group}", params
+
+
+def metric_values(df, result, by, metrics):
+    """(metric, value) pairs of a metric query's result frame, like the
+    pandas pass: scalars, or Series indexed like groupby's."""
+    if not by:
+        row = result.iloc[0]
+        for m in metrics:
+            value = row[m.name]
+            yield m, int(value) if m.stat in ("count", "nunique") else value
+        return
+    # Group keys in the frame's dtypes and groupby's (sorted) order
+    for b in by:
+        result[b] = result[b].astype(df[b].dtype)
+    result = result.sort_values(by).set_index(by)
+    for m in metrics:
+        yield m, result[m.name].rename(m.name)
+
+
+def metrics_sql(df, filters, domain, by, metrics):
+    """AggregationEngine's grouped pass as one query over the page's full
+    frame, with the filter state pushed into the scan."""
+    by = list(by)
+    needed = list(dict.fromkeys(
+        by + [m.column for m in metrics if m.column is not None]
+        + [c for c in list(CATEGORICAL_FILTERS.values()) + ["DAYS_BIRTH", "AMT_INCOME_TOTAL"] if c in df.columns]
+    ))
+    sql, params = metrics_query(scan(df[needed]), filters, domain, by, metrics)
+    con = connection()
+    result = con.execute(sql, params).df()
+    con.unregister("source_frame")
+    yield from metric_values(df, result, by, metrics)
+
+
+# -----------------------------
+# Parity Check
+# -----------------------------
+def _same_values(a, b, rtol):
+    if isinstance(a, pd.Series) or isinstance(b, pd.Series):
+        if not isinstance(a, pd.Series) or not isinstance(b, pd.Series) or len(a) != len(b):
+            return False
+        if list(map(str, a.index)) != list(map(str, b.index)):
+            return False
+        a, b = a.to_numpy(), b.to_numpy()
+    return bool(np.allclose(np.asarray(a, dtype="float64"), np.asarray(b, dtype="float64"), rtol=rtol, equal_nan=True))
+
+
+def _frame_mismatches(expected, actual, rtol):
+    # Columns whose values differ (dtypes may: the backends type columns
+    # independently until compact_dtypes)
+    if list(expected.columns) != list(actual.columns):
+        return [f"columns: {list(expected.columns)} != {list(actual.columns)}"]
+    bad = []
+    for col in expected.columns:
+        e, a = expected[col], actual[col]
+        if pd.api.types.is_numeric_dtype(e) and pd.api.types.is_numeric_dtype(a):
+            ok = _same_values(e, a, rtol)
+        else:
+            ok = e.astype(object).where(e.notna()).equals(a.astype(object).where(a.notna()))
+        if not ok:
+            bad.append(col)
+    return bad
+
+
+def parity_check(file_path=None, rtol=1e-6):
+    """Compare the DuckDB backend with the pandas reference on a dataset:
+    the fitted pipeline, the preprocessed frame, and every page metric under
+    a few filter states. Returns a list of mismatches (empty on parity)."""
+    from preprocess import compact_dtypes
+    from utils.aggregations import AggregationEngine
+    from utils.columns import core_raw_columns
+    from utils.filter_index import FilterIndex
+    from utils.load_data import read_dataset
+
+    file_path = str(file_path or default_data_path())
+    columns = core_raw_columns()
+    mismatches = []
+
+    start = time.perf_counter()
+    raw = read_dataset(file_path, columns=columns)
+    expected_pipeline = PreprocessPipeline().fit(raw)
+    expected, _ = compact_dtypes(expected_pipeline.transform(raw))
+    pandas_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    actual, pipeline = preprocess_sql(file_path, columns) if sql_readable(file_path) else preprocess_sql(raw)
+    actual, _ = compact_dtypes(actual)
+    sql_seconds = time.perf_counter() - start
+    print(f"preprocess: pandas {pandas_seconds:.3f}s, duckdb {sql_seconds:.3f}s")
+
+    e_state, a_state = expected_pipeline.to_dict(), pipeline.to_dict()
+    if sorted(e_state["dropped"]) != sorted(a_state["dropped"]):
+        mismatches.append(f"dropped: {e_state['dropped']} != {a_state['dropped']}")
+    for col, value in e_state["fill_values"].items():
+        other = a_state["fill_values"].get(col)
+        same = value == other if isinstance(value, str) else _same_values(value, other, rtol)
+        if not same:
+            mismatches.append(f"fill value {col}: {value!r} != {other!r}")
+    for col, keep in e_state["frequent_values"].items():
+        if set(keep) != set(a_state["frequent_values"].get(col, [])):
+            mismatches.append(f"frequent values {col}")
+    for col, bounds in e_state["clip_bounds"].items():
+        if not _same_values(bounds, a_state["clip_bounds"].get(col, [np.nan, np.nan]), rtol):
+            mismatches.append(f"clip bounds {col}: {bounds} != {a_state['clip_bounds'].get(col)}")
+    if not _same_values(e_state["income_edges"], a_state["income_edges"], rtol):
+        mismatches.append(f"income edges: {e_state['income_edges']} != {a_state['income_edges']}")
+    mismatches += [f"preprocessed column {c}" for c in _frame_mismatches(expected, actual, rtol)]
+
+    # Every stat, ungrouped and grouped, unfiltered and under a few filter states
+    index = FilterIndex(expected)
+    domain = index.domain
+    for name, filters in parity_presets(domain).items():
+        df_filtered = expected if filters is None else expected[index.mask(filters)]
+        for by, planned in parity_metrics(expected).items():
+            reference = dict(AggregationEngine._frame_pass(df_filtered, by, planned))
+            for metric, value in metrics_sql(expected, filters, domain, by, planned):
+                if not _same_values(reference[metric], value, rtol):
+                    mismatches.append(f"metric {metric.name} by {by} ({name})")
+    return mismatches
+
+
+def parity_presets(domain):
+    """Filter states the parity checks aggregate under."""
+    lo, hi = domain["age_range"]
+    return {
+        "unfiltered": None,
+        "all": dict(domain),
+        "one_gender": {**domain, "gender": domain["gender"][:1]},
+        "narrow": {**domain, "education": domain["education"][:2], "age_range": (lo + 10, hi - 10),
+                   "income_range": (domain["income_range"][0], 300_000)},
+    }
+
+
+def parity_metrics(df):
+    """Every stat of a few columns, ungrouped and grouped, by grouping key."""
+    from utils.aggregations import Metric, _by
+
+    metrics = [
+        Metric(f"{stat}_{col}", stat, None if stat == "count" else col, by,
+               df[col].median() if stat == "share_above" else None)
+        for stat in AGGREGATES
+        for col in ["AMT_INCOME_TOTAL", "AGE_YEARS", "TARGET"]
+        for by in [(), ("TARGET",), ("NAME_CONTRACT_TYPE", "CODE_GENDER")]
+    ]
+    return {by: [m for m in metrics if _by(m) == by] for by in dict.fromkeys(_by(m) for m in metrics)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that the DuckDB backend preprocesses and aggregates a dataset exactly like "
+                    "the pandas reference implementation."
+    )
+    parser.add_argument("--data", default=None, help="dataset file (default: the app's default dataset)")
+    parser.add_argument("--rtol", type=float, default=1e-6, help="relative tolerance of numeric values")
+    args = parser.parse_args()
+    if duckdb is None:
+        raise SystemExit("duckdb is not installed")
+    problems = parity_check(args.data, args.rtol)
+    for problem in problems:
+        print(f"MISMATCH {problem}")
+    print("parity" if not problems else f"{len(problems)} mismatch(es)")
+    raise SystemExit(1 if problems else 0)
@@ -0,0 +1,359 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+import streamlit as st
+
+from preprocess import PREPROCESS_VERSION, PreprocessPipeline, compact_dtypes, preprocess_file
+from utils.auxiliary import FEATURE_COLUMNS, auxiliary_features, find_auxiliary_tables, join_features
+from utils.columns import AUXILIARY_FILTER_COLUMNS, core_raw_columns, manifest_hash
+from utils.load_data import dataset_columns, default_data_path, read_dataset
+from utils.perf import mark_miss, span
+
+CACHE_DIR = Path(os.environ.get("HOME_CREDIT_CACHE_DIR", ".cache"))
+FINGERPRINTS_FILE = CACHE_DIR / "fingerprints.json"
+# Upload workers and page scripts update the fingerprints file concurrently
+_FINGERPRINTS_LOCK = threading.Lock()
+
+# The preprocessed dataset is stored in two parts: "core" holds the columns
+# declared in utils/columns.py and is built eagerly, "extra" holds everything
+# else and is only built when a caller asks for one of those columns.
+PARTS = ("core", "extra")
+# Datasets with the auxiliary tables next to them (utils.auxiliary) get a
+# third part: the per-applicant features aggregated from those tables
+AUXILIARY_PART = "auxiliary"
+
+# Input files larger than this are preprocessed in two streaming passes over
+# chunks (preprocess_file) instead of in memory
+STREAMING_THRESHOLD_BYTES = int(float(os.environ.get("HOME_CREDIT_STREAMING_MB", "1024")) * (1 << 20))
+
+
+# -----------------------------
+# Fingerprints
+# -----------------------------
+def _hash_file(file_path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stamp(path):
+    stat = path.stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _known_fingerprints():
+    return json.loads(FINGERPRINTS_FILE.read_text()) if FINGERPRINTS_FILE.exists() else {}
+
+
+def remember_fingerprint(file_path, sha):
+    """Record the content hash of a file whose bytes were already hashed (an
+    upload), so file_fingerprint does not read it again."""
+    path = Path(file_path).resolve()
+    with _FINGERPRINTS_LOCK:
+        known = _known_fingerprints()
+        known[str(path)] = {"stamp": _stamp(path), "sha256": sha}
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        _atomic_write_text(FINGERPRINTS_FILE, json.dumps(known, indent=2))
+
+
+def file_fingerprint(file_path):
+    """Content hash of a file, re-hashed only when its size or mtime changes.
+    A file that is gone keeps its remembered hash: uploads are deleted once
+    their artifacts are built (utils.uploads)."""
+    path = Path(file_path).resolve()
+    with _FINGERPRINTS_LOCK:
+        entry = _known_fingerprints().get(str(path))
+    if entry and (not path.exists() or entry["stamp"] == _stamp(path)):
+        return entry["sha256"]
+    sha = _hash_file(path)
+    remember_fingerprint(path, sha)
+    return sha
+
+
+def dataset_key(file_path=None, reference=None):
+    """Key of the preprocessed artifact: input content + preprocessing version,
+    plus the reference dataset's content when the input is preprocessed with
+    the pipeline fitted on a reference dataset, and the auxiliary tables'
+    content when the input has them."""
+    file_path = file_path or default_data_path()
+    key = f"{file_fingerprint(file_path)[:16]}-p{PREPROCESS_VERSION}"
+    if reference is not None:
+        key += f"-r{file_fingerprint(reference)[:16]}"
+    tables = find_auxiliary_tables(file_path)
+    if tables:
+        digest = hashlib.sha256("".join(f"{name}:{file_fingerprint(path)}" for name, path in tables.items()).encode())
+        key += f"-a{digest.hexdigest()[:16]}"
+    return key
+
+
+def dataset_parts(file_path):
+    """Artifact parts of a dataset file, in the order columns are looked up."""
+    return ("core", AUXILIARY_PART, "extra") if find_auxiliary_tables(file_path) else PARTS
+
+
+# -----------------------------
+# Active Dataset
+# -----------------------------
+def active_dataset():
+    """(file_path, reference) of the dataset the session works on: an upload
+    registered with set_active_dataset, or the default dataset."""
+    active = st.session_state.get("active_dataset")
+    if active is None:
+        return default_data_path(), None
+    return active["path"], active["reference"]
+
+
+def set_active_dataset(file_path, reference=None, name=None):
+    """Make every page of this session load file_path (preprocessed with the
+    pipeline fitted on reference, if given) instead of the default dataset."""
+    st.session_state["active_dataset"] = {"path": str(file_path), "reference": reference, "name": name}
+
+
+def clear_active_dataset():
+    st.session_state.pop("active_dataset", None)
+
+
+# -----------------------------
+# Artifacts
+# -----------------------------
+@contextmanager
+def atomic_path(path):
+    """Temp file next to `path` for one writer, moved onto `path` when the
+    block completes and removed if it fails. Readers never see a partial
+    file, and writers building the same file at once (page runs, report
+    workers) do not clobber each other's temp files."""
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _atomic_write_text(path, text):
+    with atomic_path(path) as tmp:
+        tmp.write_text(text)
+
+
+def artifact_path(key, part="core"):
+    return CACHE_DIR / "preprocessed" / key / f"{part}-{manifest_hash()}.parquet"
+
+
+def profile_path(key, part="core"):
+    return artifact_path(key, part).with_suffix(".profile.json")
+
+
+def pipeline_path(key, part="core"):
+    return artifact_path(key, part).with_suffix(".pipeline.json")
+
+
+def column_profile(df, compaction):
+    return {
+        col: {
+            "dtype": str(df[col].dtype),
+            "numeric": bool(pd.api.types.is_numeric_dtype(df[col])),
+            "missing_ratio": float(df[col].isnull().mean()),
+            "bytes_before": int(compaction.at[col, "bytes_before"]),
+            "bytes_after": int(compaction.at[col, "bytes_after"]),
+        }
+        for col in df.columns
+    }
+
+
+def _reference_pipeline(reference, part):
+    key = dataset_key(reference)
+    ensure_artifact(reference, key, part)
+    return PreprocessPipeline.load(pipeline_path(key, part))
+
+
+def build_artifact(file_path, key, part="core", reference=None, progress=None):
+    """Preprocess one part of a dataset file into its artifact. With a
+    reference dataset, the pipeline fitted on it is applied instead of
+    fitting one on the file itself. Builds that report progress (rows done,
+    total rows; see preprocess_file) go through the chunked path."""
+    if part == AUXILIARY_PART:
+        return _build_auxiliary(file_path, key)
+    core = core_raw_columns()
+    columns = core if part == "core" else [c for c in dataset_columns(file_path) if c not in core]
+    pipeline = None if reference is None else _reference_pipeline(reference, part)
+    if progress is not None or os.path.getsize(file_path) > STREAMING_THRESHOLD_BYTES:
+        return _build_artifact_streaming(file_path, key, part, columns, pipeline, progress)
+    from utils.backend import preprocess_sql, sql_enabled, sql_readable
+    if sql_enabled() and sql_readable(file_path):
+        # One query over the file instead of a read plus a copy per step
+        with span(f"preprocess {part} (duckdb)") as record:
+            df, pipeline = preprocess_sql(file_path, columns, engineer_features=(part == "core"), pipeline=pipeline)
+            df, compaction = compact_dtypes(df)
+            record["rows"] = len(df)
+    else:
+        with span(f"read {part}") as record:
+            raw = read_dataset(file_path, columns=columns)
+            record["rows"] = len(raw)
+        with span(f"preprocess {part}", rows=len(raw)):
+            if pipeline is None:
+                pipeline = PreprocessPipeline(engineer_features=(part == "core")).fit(raw)
+            df, compaction = compact_dtypes(pipeline.transform(raw))
+        del raw
+
+    path = artifact_path(key, part)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_path(pipeline_path(key, part)) as tmp:
+        pipeline.save(tmp)
+    with atomic_path(path) as tmp:
+        df.to_parquet(tmp, index=False)
+    _atomic_write_text(profile_path(key, part), json.dumps(column_profile(df, compaction)))
+    return path
+
+
+def _build_artifact_streaming(file_path, key, part, columns, pipeline=None, progress=None):
+    path = artifact_path(key, part)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_path(path) as tmp:
+        with span(f"preprocess {part} (streaming)"):
+            pipeline, report = preprocess_file(
+                file_path, tmp, columns=columns, engineer_features=(part == "core"), pipeline=pipeline,
+                progress=progress,
+            )
+        with atomic_path(pipeline_path(key, part)) as pipeline_tmp:
+            pipeline.save(pipeline_tmp)
+    profile = {
+        col: {
+            "dtype": row["dtype_after"],
+            "numeric": bool(row["numeric"]),
+            "missing_ratio": float(row["missing_ratio"]),
+            "bytes_before": int(row["bytes_before"]),
+            "bytes_after": int(row["bytes_after"]),
+        }
+        for col, row in report.iterrows()
+    }
+    _atomic_write_text(profile_path(key, part), json.dumps(profile))
+    return path
+
+
+def _build_auxiliary(file_path, key):
+    # Features of the auxiliary tables, row-aligned with the application file.
+    # They are not run through the preprocessing pipeline: counts and ratios
+    # need no imputation, and missing means "no such record"
+    with span(f"aggregate {AUXILIARY_PART}") as record:
+        features = auxiliary_features(find_auxiliary_tables(file_path))
+        record["rows"] = len(features)
+    with span(f"join {AUXILIARY_PART}"):
+        ids = read_dataset(file_path, columns=["SK_ID_CURR"])["SK_ID_CURR"]
+        df, compaction = compact_dtypes(join_features(ids, features))
+    del features
+
+    path = artifact_path(key, AUXILIARY_PART)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_path(path) as tmp:
+        df.to_parquet(tmp, index=False)
+    _atomic_write_text(profile_path(key, AUXILIARY_PART), json.dumps(column_profile(df, compaction)))
+    return path
+
+
+def ensure_artifact(file_path, key, part="core", reference=None, progress=None):
+    path = artifact_path(key, part)
+    if not path.exists():
+        build_artifact(file_path, key, part, reference, progress)
+    return path
+
+
+@st.cache_data(show_spinner="Preparing dataset...")
+def _load_artifact(key, file_path, columns, reference=None):
+    mark_miss()
+    parts = dataset_parts(file_path)
+    core_path = ensure_artifact(file_path, key, "core", reference)
+    core_cols = pq.read_schema(core_path).names
+    if columns is None:
+        # Every frame a page filters carries the same filter columns
+        wanted = core_cols + AUXILIARY_FILTER_COLUMNS
+    elif columns == "all":
+        wanted = list(core_cols)
+        for part in parts[1:]:
+            wanted += pq.read_schema(ensure_artifact(file_path, key, part, reference)).names
+    else:
+        wanted = list(columns)
+
+    frames = [pd.read_parquet(core_path, columns=[c for c in wanted if c in core_cols], memory_map=True)]
+    lazy = [c for c in wanted if c not in core_cols]
+    if AUXILIARY_PART not in parts:
+        # Features of auxiliary tables the dataset does not have
+        lazy = [c for c in lazy if c not in FEATURE_COLUMNS]
+    # Later parts are only built if earlier ones lack a column; columns
+    # dropped by preprocessing (too many missing values) are skipped
+    for part in parts[1:]:
+        if not lazy:
+            break
+        part_path = ensure_artifact(file_path, key, part, reference)
+        part_cols = set(pq.read_schema(part_path).names)
+        found = [c for c in lazy if c in part_cols]
+        if found:
+            frames.append(pd.read_parquet(part_path, columns=found, memory_map=True))
+        lazy = [c for c in lazy if c not in part_cols]
+
+    df = pd.concat(frames, axis=1) if len(frames) > 1 else frames[0]
+    df.attrs["fingerprint"] = key
+    return df
+
+
+def load_preprocessed(file_path=None, columns=None, reference=None):
+    """Preprocessed dataset, materialized once on disk per input content and
+    preprocessing version, and held in memory across reruns and sessions.
+
+    file_path defaults to the session's active dataset. columns defaults to
+    the core manifest (plus the auxiliary filter columns); pass a list to project, or "all" to also load every
+    non-core column (built lazily on first use).
+    """
+    if file_path is None:
+        file_path, reference = active_dataset()
+    if columns is not None and not isinstance(columns, str):
+        columns = tuple(columns)
+    with span("load", cached=True) as record:
+        df = _load_artifact(dataset_key(file_path, reference), str(file_path), columns, reference)
+        record["rows"] = len(df)
+    return df
+
+
+@st.cache_data
+def _load_profile(key, file_path, reference=None):
+    mark_miss()
+    profile = {}
+    for part in dataset_parts(file_path):
+        ensure_artifact(file_path, key, part, reference)
+        profile.update(json.loads(profile_path(key, part).read_text()))
+    return pd.DataFrame.from_dict(profile, orient="index")
+
+
+def load_profile(file_path=None, reference=None):
+    """Per-column dtype, numeric flag, missing ratio and compaction bytes
+    (before/after compact_dtypes) of the full preprocessed frame, without
+    loading it. file_path defaults to the session's active dataset."""
+    if file_path is None:
+        file_path, reference = active_dataset()
+    with span("profile", cached=True):
+        return _load_profile(dataset_key(file_path, reference), str(file_path), reference)
+
+
+@st.cache_data
+def _load_pipeline(key, file_path):
+    parts = []
+    for part in PARTS:
+        ensure_artifact(file_path, key, part)
+        parts.append(PreprocessPipeline.load(pipeline_path(key, part)))
+    return parts[0].merge(parts[1])
+
+
+def load_pipeline(file_path=None):
+    """PreprocessPipeline fitted on the reference dataset (all columns), for
+    preprocessing new batches such as uploads without refitting."""
+    file_path = file_path or default_data_path()
+    return _load_pipeline(dataset_key(file_path), str(file_path))
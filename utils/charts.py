@@ -0,0 +1,271 @@
+import io
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+import matplotlib.pyplot as plt
+import streamlit as st
+from matplotlib.figure import Figure
+
+from utils.filter_index import dataset_id, filter_key
+from utils.materialize import materialized_chart
+from utils.perf import add_span, mark_miss, span
+from utils.progressive import approximate_run, sample_data
+
+try:
+    # Serializes the page-defined draw functions for the worker processes
+    import cloudpickle
+except ImportError:  # charts are then rendered in the page's own process
+    cloudpickle = None
+
+# Upper bound on the rendered images held in memory, shared by all sessions
+CHART_CACHE_BYTES = int(float(os.environ.get("HOME_CREDIT_CHART_CACHE_MB", "64")) * (1 << 20))
+CHART_DPI = 100
+# Processes rendering the charts of a chart_batch; fewer than 2 renders in-process
+CHART_WORKERS = int(os.environ.get("HOME_CREDIT_CHART_WORKERS", os.cpu_count() or 1))
+# A chart whose pickled draw function and data exceed this is rendered in-process
+CHART_TASK_MAX_BYTES = 32 << 20
+
+
+class ChartCache:
+    """Rendered chart images (PNG bytes), evicted least recently used first
+    once their total size exceeds max_bytes."""
+
+    def __init__(self, max_bytes=CHART_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            image = self._images.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._images.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def put(self, key, image):
+        with self._lock:
+            if key in self._images:
+                self.size -= len(self._images.pop(key))
+            # An image larger than the whole budget is shown but not kept
+            if len(image) > self.max_bytes:
+                return
+            self._images[key] = image
+            self.size += len(image)
+            while self.size > self.max_bytes:
+                _, evicted = self._images.popitem(last=False)
+                self.size -= len(evicted)
+
+    def items(self):
+        with self._lock:
+            return list(self._images.items())
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._images)
+
+
+@st.cache_resource(show_spinner=False)
+def get_chart_cache():
+    return ChartCache()
+
+
+def render_figure(draw, figsize=(8, 5), dpi=CHART_DPI):
+    """Run draw(ax) on a fresh figure and return it as PNG bytes.
+
+    draw may return a Figure of its own (e.g. a seaborn PairGrid's) to render
+    instead. Every figure opened while drawing is closed, even on error, so
+    nothing accumulates in pyplot's global state.
+    """
+    fig, ax = plt.subplots(figsize=figsize)
+    figures = [fig]
+    try:
+        plt.sca(ax)
+        out = draw(ax)
+        if isinstance(out, Figure):
+            figures.append(out)
+        buf = io.BytesIO()
+        figures[-1].savefig(buf, format="png", dpi=dpi, bbox_inches="tight")
+        return buf.getvalue()
+    finally:
+        for f in figures:
+            plt.close(f)
+
+
+# -----------------------------
+# Worker Pool
+# -----------------------------
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _render_task(payload):
+    draw, data, figsize, dpi = cloudpickle.loads(payload)
+    return render_figure(lambda ax: draw(ax, **data), figsize, dpi)
+
+
+_main_lock = threading.Lock()
+
+
+@contextmanager
+def _worker_main():
+    # Streamlit runs each page as the __main__ module, and spawned workers
+    # import __main__ (so they would run the page); they get this module
+    # instead while workers may be started
+    with _main_lock:
+        main = sys.modules["__main__"]
+        sys.modules["__main__"] = sys.modules[__name__]
+        try:
+            yield
+        finally:
+            sys.modules["__main__"] = main
+
+
+@st.cache_resource(show_spinner=False)
+def get_render_pool():
+    """Process pool shared by all sessions, or None when charts are rendered
+    in-process (a single core, or cloudpickle not installed)."""
+    if cloudpickle is None or CHART_WORKERS < 2:
+        return None
+    # spawn: forking the server process (with its threads) is not safe
+    return ProcessPoolExecutor(
+        CHART_WORKERS, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker
+    )
+
+
+class ChartBatch:
+    """Charts of one chart_batch block. Each chart's slot is reserved where
+    show_chart is called; on render() the charts go to the worker pool and
+    each image is placed in its slot as soon as it is ready."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.pending = []
+
+    def add(self, key, draw, data, figsize):
+        self.pending.append((key, st.empty(), draw, data, figsize))
+
+    def render(self):
+        start = time.perf_counter()
+        futures, local = {}, []
+        with _worker_main():
+            for chart in self.pending:
+                key, slot, draw, data, figsize = chart
+                try:
+                    payload = cloudpickle.dumps((draw, data, figsize, CHART_DPI))
+                except Exception:
+                    payload = None
+                if payload is None or len(payload) > CHART_TASK_MAX_BYTES:
+                    local.append(chart)
+                else:
+                    futures[self.pool.submit(_render_task, payload)] = chart
+        # Charts that cannot be shipped render here while the pool works
+        for chart in local:
+            self._place(chart, self._render_local(chart))
+        for future in as_completed(futures):
+            chart = futures[future]
+            try:
+                image = future.result()
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory): start a new pool next
+                # time and render this chart here
+                get_render_pool.clear()
+                image = self._render_local(chart)
+            self._place(chart, image)
+            # Time from submission to placement; workers render concurrently
+            add_span(f"chart {chart[0][0]} (worker)", time.perf_counter() - start)
+        self.pending = []
+
+    @staticmethod
+    def _render_local(chart):
+        key, _, draw, data, figsize = chart
+        with span(f"chart {key[0]} (local)"):
+            return render_figure(lambda ax: draw(ax, **data), figsize)
+
+    @staticmethod
+    def _place(chart, image):
+        key, slot = chart[:2]
+        get_chart_cache().put(key, image)
+        slot.image(image, width="stretch")
+
+
+_batches = threading.local()
+
+
+@contextmanager
+def chart_batch():
+    """Render the show_chart calls inside the block in parallel, so a page
+    waits for its slowest chart rather than the sum of them.
+
+    Draw functions run in worker processes: they must take their inputs as
+    arguments (show_chart's data) or from small page-level values, not from
+    st.session_state or cached page resources.
+    """
+    with span("charts"):
+        pool = get_render_pool()
+        if pool is None:
+            yield None
+            return
+        batch = ChartBatch(pool)
+        _batches.current = batch
+        try:
+            yield batch
+        finally:
+            _batches.current = None
+        batch.render()
+
+
+# -----------------------------
+# Display
+# -----------------------------
+def show_chart(chart_id, draw, df, figsize=(8, 5), params=(), data=None):
+    """Display a chart, rendering it only if this chart has not been drawn yet
+    for the dataset, the current global filters and any page-local params.
+
+    data is an optional function returning keyword arguments for draw (the
+    chart's data slice); it is only called when the chart has to be rendered.
+    Inside a chart_batch the chart is rendered by the worker pool. While the
+    page shows estimates (utils.progressive), the chart is drawn from the
+    sampled rows and cached apart from the exact one.
+    """
+    approximate = approximate_run(df)
+    if approximate is not None:
+        params = (*params, "approximate")
+    key = (chart_id, dataset_id(df), filter_key(st.session_state.get("filters")), tuple(figsize), params)
+    cache = get_chart_cache()
+    with span(f"chart {chart_id}", cached=True):
+        image = cache.get(key)
+        if image is None:
+            # Charts of the unfiltered dataset may have been materialized
+            image = materialized_chart(key)
+            if image is not None:
+                cache.put(key, image)
+        if image is None:
+            mark_miss()
+            kwargs = data() if data is not None else {}
+            if approximate is not None:
+                kwargs = sample_data(kwargs, approximate)
+            batch = getattr(_batches, "current", None)
+            if batch is not None:
+                batch.add(key, draw, kwargs, figsize)
+                return
+            image = render_figure(lambda ax: draw(ax, **kwargs), figsize)
+            cache.put(key, image)
+        st.image(image, width="stretch")
@@ -0,0 +1,76 @@
+import hashlib
+
+# -----------------------------
+# Column Manifests
+# -----------------------------
+# Columns each page reads from the preprocessed frame. Only the union of these
+# (plus the filter and feature inputs below) is loaded and preprocessed up
+# front; every other column is preprocessed lazily the first time it is asked for.
+PAGE_COLUMNS = {
+    "home": [],
+    "overview": [
+        "SK_ID_CURR", "TARGET", "AGE_YEARS", "AMT_INCOME_TOTAL", "AMT_CREDIT",
+        "CODE_GENDER", "NAME_FAMILY_STATUS", "NAME_EDUCATION_TYPE",
+    ],
+    "target": [
+        "TARGET", "CODE_GENDER", "NAME_EDUCATION_TYPE", "NAME_FAMILY_STATUS", "NAME_HOUSING_TYPE",
+        "NAME_CONTRACT_TYPE", "AMT_INCOME_TOTAL", "AMT_CREDIT", "AMT_ANNUITY",
+        "DAYS_BIRTH", "DAYS_EMPLOYED", "EMPLOYMENT_YEARS",
+    ],
+    "demographics": [
+        "TARGET", "AGE_YEARS", "CODE_GENDER", "CNT_CHILDREN", "CNT_FAM_MEMBERS", "NAME_FAMILY_STATUS",
+        "NAME_EDUCATION_TYPE", "NAME_HOUSING_TYPE", "OCCUPATION_TYPE", "EMPLOYMENT_YEARS",
+    ],
+    "financial": [
+        "TARGET", "AMT_INCOME_TOTAL", "AMT_CREDIT", "AMT_ANNUITY", "AMT_GOODS_PRICE", "DTI", "LTI",
+    ],
+    "correlations": [
+        "TARGET", "AMT_INCOME_TOTAL", "AMT_CREDIT", "AMT_ANNUITY", "AGE_YEARS", "EMPLOYMENT_YEARS",
+        "CNT_FAM_MEMBERS", "CODE_GENDER", "NAME_EDUCATION_TYPE", "NAME_FAMILY_STATUS",
+    ],
+}
+
+# Columns read by apply_global_filters on every page
+FILTER_COLUMNS = [
+    "CODE_GENDER", "NAME_EDUCATION_TYPE", "NAME_FAMILY_STATUS", "NAME_HOUSING_TYPE",
+    "DAYS_BIRTH", "AMT_INCOME_TOTAL",
+]
+
+# Columns joined from the auxiliary tables (utils.auxiliary). Pages ask for
+# them like any other column; datasets without those tables just lack them.
+AUXILIARY_PAGE_COLUMNS = {
+    "financial": ["CREDIT_HISTORY", "BUREAU_DEBT_RATIO", "INST_LATE_RATIO", "PREV_REFUSAL_RATIO"],
+}
+AUXILIARY_FILTER_COLUMNS = ["CREDIT_HISTORY"]
+
+# Engineered columns and the raw columns preprocess_data derives them from
+DERIVED_COLUMNS = {
+    "AGE_YEARS": ["DAYS_BIRTH"],
+    "EMPLOYMENT_YEARS": ["DAYS_EMPLOYED"],
+    "DTI": ["AMT_ANNUITY", "AMT_INCOME_TOTAL"],
+    "LTI": ["AMT_CREDIT", "AMT_INCOME_TOTAL"],
+    "ANNUITY_TO_CREDIT": ["AMT_ANNUITY", "AMT_CREDIT"],
+    "INCOME_BRACKET": ["AMT_INCOME_TOTAL"],
+}
+
+
+def page_columns(page):
+    """Preprocessed columns a page needs, including the global filter inputs."""
+    return list(dict.fromkeys(
+        PAGE_COLUMNS[page] + FILTER_COLUMNS + AUXILIARY_PAGE_COLUMNS.get(page, []) + AUXILIARY_FILTER_COLUMNS
+    ))
+
+
+def core_raw_columns():
+    """Raw columns that are loaded and preprocessed eagerly."""
+    cols = set(FILTER_COLUMNS)
+    for sources in DERIVED_COLUMNS.values():
+        cols.update(sources)
+    for page_cols in PAGE_COLUMNS.values():
+        cols.update(c for c in page_cols if c not in DERIVED_COLUMNS)
+    return sorted(cols)
+
+
+def manifest_hash():
+    # Part of the artifact file names, so editing a manifest rebuilds the split
+    return hashlib.sha256(",".join(core_raw_columns()).encode()).hexdigest()[:8]
@@ -0,0 +1,346 @@
+import json
+import threading
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.filter_index import age_years, categorical_filters, dataset_id
+from utils.materialize import stored
+from utils.sketch import bucket_keys, sketches_from_table
+
+# Bin widths of the range dimensions. They are multiples of the slider steps
+# and anchored at the slider minimum, so slider positions fall on bin edges.
+AGE_BIN_YEARS = 5
+INCOME_BIN_WIDTH = 20000
+
+# Range dimension -> sidebar filter it answers
+RANGE_DIMENSIONS = {"AGE_BIN": "age_range", "INCOME_BIN": "income_range"}
+BIN_WIDTHS = {"AGE_BIN": AGE_BIN_YEARS, "INCOME_BIN": INCOME_BIN_WIDTH}
+
+DEFAULT_MEASURES = [
+    "AMT_INCOME_TOTAL", "AMT_CREDIT", "AMT_ANNUITY", "AMT_GOODS_PRICE",
+    "AGE_YEARS", "EMPLOYMENT_YEARS", "CNT_CHILDREN", "CNT_FAM_MEMBERS",
+]
+
+# Per-row state of a cube: dimension codes, default flags, range values and
+# the rows of each range bin (CSR layout: bin b holds order[offsets[b]:offsets[b + 1]])
+CubeRows = namedtuple("CubeRows", ["codes", "defaults", "range_values", "bin_order", "bin_offsets"])
+
+
+def _range_values(df):
+    return {"AGE_BIN": age_years(df), "INCOME_BIN": df["AMT_INCOME_TOTAL"].to_numpy(dtype="float64")}
+
+
+def _bins(values, origin, width):
+    bins = np.floor((values - origin) / width).astype(np.int64)
+    bins[bins < 0] = 0
+    return bins
+
+
+def bin_layout(values, width):
+    """Bins of a range dimension anchored at its minimum: the origin, each
+    row's bin and the observed (min, max) of every bin (NaN if empty)."""
+    origin = int(np.nanmin(values)) if len(values) else 0
+    bins = _bins(values, origin, width)
+    n_bins = int(bins.max()) + 1 if len(values) else 0
+    stats = pd.Series(values).groupby(bins).agg(["min", "max"]).reindex(range(n_bins))
+    return origin, bins, stats.to_numpy()
+
+
+def bin_coverage(bin_bounds, bounds):
+    """Boolean arrays of the bins entirely inside a range, and of the bins
+    it only partly covers, given each bin's observed (min, max)."""
+    lo, hi = bounds
+    mins, maxs = bin_bounds[:, 0], bin_bounds[:, 1]
+    present = ~np.isnan(mins)
+    full = present & (mins >= lo) & (maxs <= hi)
+    overlap = present & (maxs >= lo) & (mins <= hi)
+    return full, overlap & ~full
+
+
+class Cube:
+    """Pre-aggregated counts over the global filter dimensions.
+
+    Dimensions are the categorical filters, binned age, binned income and
+    TARGET. Every non-empty cell stores its row count, default count and the
+    sum and sum of squares of each measure. A query rolls up the cells whose
+    range bins lie entirely inside the selected ranges; the few rows in bins
+    that a range only partly covers are aggregated directly, so results are
+    exact for any filter state.
+
+    One cube serves a dataset: measures are added as pages ask for them. Only
+    the cells, sketch tables and bins are saved (see save); the per-row state
+    is rebuilt from the attached frame the first time a query needs rows.
+    """
+
+    def __init__(self, df, measures=None):
+        measures = DEFAULT_MEASURES if measures is None else measures
+        self.measures = [m for m in measures if m in df.columns]
+        self.filters = categorical_filters(df)
+        self.dimensions = list(self.filters.values()) + list(RANGE_DIMENSIONS) + ["TARGET"]
+        self._detach()
+        self._attach(df, self.measures)
+
+        self.labels = {}
+        for col in list(self.filters.values()) + ["TARGET"]:
+            self.labels[col] = pd.factorize(df[col], sort=True)[1].tolist()
+        self.bin_bounds = {}
+        for dim, values in _range_values(df).items():
+            origin, _, self.bin_bounds[dim] = bin_layout(values, BIN_WIDTHS[dim])
+            self.labels[dim] = [origin + i * BIN_WIDTHS[dim] for i in range(len(self.bin_bounds[dim]))]
+
+        self.cells = self._aggregate(np.arange(len(df)), self.dimensions, self.measures).reset_index()
+
+    def _detach(self):
+        # Nothing row-level: no frame, measure columns, row state or sketch tables yet
+        self._frame = None
+        self._columns = {}
+        self._rows = None
+        self._sketch_tables = {}
+        self._lock = threading.RLock()
+
+    def _attach(self, df, measures):
+        if self._frame is None:
+            # Column selections, so no copy of the data under copy-on-write
+            self._frame = df[list(self.filters.values()) + ["TARGET", "DAYS_BIRTH", "AMT_INCOME_TOTAL"]]
+        for m in measures:
+            self._columns.setdefault(m, df[m])
+
+    def add_measures(self, df, measures):
+        """Make the measures df has available to queries, aggregating the
+        cells of those the cube lacks. df is any frame of the dataset; it
+        also provides the rows of the measures for partly covered bins."""
+        measures = [m for m in measures if m in df.columns]
+        if self._frame is not None and all(m in self._columns and m in self.measures for m in measures):
+            return
+        with self._lock:
+            self._attach(df, measures)
+            new = [m for m in measures if m not in self.measures]
+            if not new:
+                return
+            sums = self._aggregate(np.arange(len(self._frame)), self.dimensions, new)
+            sums = sums.drop(columns=["count", "defaults"]).reindex(pd.MultiIndex.from_frame(self.cells[self.dimensions]))
+            self.cells = pd.concat([self.cells, sums.reset_index(drop=True)], axis=1)
+            self.measures = self.measures + new
+
+    def _row_state(self):
+        # Built on first need: queries that only touch whole bins never need it
+        with self._lock:
+            if self._rows is None:
+                frame = self._frame
+                codes = {}
+                for col in list(self.filters.values()) + ["TARGET"]:
+                    codes[col] = pd.Index(self.labels[col]).get_indexer(frame[col])
+                range_values = _range_values(frame)
+                bin_order, bin_offsets = {}, {}
+                for dim, values in range_values.items():
+                    n_bins = len(self.labels[dim])
+                    bins = _bins(values, self.labels[dim][0] if n_bins else 0, BIN_WIDTHS[dim])
+                    codes[dim] = bins
+                    bin_order[dim] = np.argsort(bins, kind="stable")
+                    bin_offsets[dim] = np.concatenate([[0], np.cumsum(np.bincount(bins, minlength=n_bins))])
+                defaults = (np.asarray(self.labels["TARGET"])[codes["TARGET"]] == 1).astype(np.int64)
+                self._rows = CubeRows(pd.DataFrame(codes), defaults, range_values, bin_order, bin_offsets)
+            return self._rows
+
+    def _values(self, measure, rows):
+        return self._columns[measure].iloc[rows].to_numpy(dtype="float64")
+
+    def _aggregate(self, rows, by, measures):
+        # count, defaults, sums and sums of squares of the given rows, grouped by `by`
+        state = self._row_state()
+        values = {"count": np.ones(len(rows), dtype=np.int64), "defaults": state.defaults[rows]}
+        for m in measures:
+            x = self._values(m, rows)
+            values[f"{m}_sum"] = x
+            values[f"{m}_sumsq"] = x * x
+        values = pd.DataFrame(values)
+        if not by:
+            return values.sum().to_frame().T
+        keys = [state.codes[d].to_numpy()[rows] for d in by]
+        return values.groupby(keys, sort=True).sum().rename_axis(by)
+
+    # -----------------------------
+    # Saving
+    # -----------------------------
+    def save(self, path):
+        """Write the cells and sketch tables as Parquet, plus the labels and
+        bins, into directory `path`."""
+        path.mkdir(parents=True, exist_ok=True)
+        self.cells.to_parquet(path / "cells.parquet", index=False)
+        for measure, table in self._sketch_tables.items():
+            table.to_parquet(path / f"sketch-{measure}.parquet", index=False)
+        meta = {
+            "measures": self.measures, "filters": self.filters, "dimensions": self.dimensions,
+            "labels": self.labels,
+            # Empty bins have no bounds (NaN) -> null
+            "bin_bounds": {dim: np.where(np.isnan(b), None, b).tolist() for dim, b in self.bin_bounds.items()},
+        }
+        (path / "cube.json").write_text(json.dumps(meta))
+
+    @classmethod
+    def load(cls, path):
+        """Cube saved in directory `path`, with its tables memory-mapped.
+        Attach a frame of the dataset (add_measures) before querying."""
+        meta = json.loads((path / "cube.json").read_text())
+        cube = cls.__new__(cls)
+        cube.measures, cube.filters, cube.dimensions = meta["measures"], meta["filters"], meta["dimensions"]
+        cube.labels = meta["labels"]
+        cube.bin_bounds = {dim: np.array(b, dtype="float64").reshape(-1, 2) for dim, b in meta["bin_bounds"].items()}
+        cube._detach()
+        cube.cells = pd.read_parquet(path / "cells.parquet", memory_map=True)
+        for table in path.glob("sketch-*.parquet"):
+            cube._sketch_tables[table.stem.removeprefix("sketch-")] = pd.read_parquet(table, memory_map=True)
+        return cube
+
+    # -----------------------------
+    # Query
+    # -----------------------------
+    def _bin_status(self, dim, bounds):
+        # Bins entirely inside the range, and bins it only partly covers
+        full, partial = bin_coverage(self.bin_bounds[dim], bounds)
+        return np.flatnonzero(full), np.flatnonzero(partial)
+
+    def _select(self, table, filters):
+        """Rows of a per-cell table (one column per dimension code) that lie
+        entirely inside the filter state, plus the positions of the dataset
+        rows in partly covered range bins that pass the filters."""
+        keep = np.ones(len(table), dtype=bool)
+        partial_rows = np.array([], dtype=np.int64)
+        if not filters:
+            return keep, partial_rows
+
+        allowed = {}
+        partial = []
+        for name, col in self.filters.items():
+            if name not in filters:
+                continue
+            selected = set(filters[name])
+            allowed[col] = [i for i, label in enumerate(self.labels[col]) if label in selected]
+            keep &= table[col].isin(allowed[col]).to_numpy()
+        for dim, name in RANGE_DIMENSIONS.items():
+            full, part = self._bin_status(dim, filters[name])
+            keep &= table[dim].isin(full).to_numpy()
+            partial += [(dim, b) for b in part]
+
+        if partial:
+            state = self._row_state()
+            rows = np.unique(np.concatenate([
+                state.bin_order[dim][state.bin_offsets[dim][b]:state.bin_offsets[dim][b + 1]] for dim, b in partial
+            ]))
+            row_codes = state.codes.iloc[rows]
+            row_ok = np.ones(len(rows), dtype=bool)
+            for col, codes in allowed.items():
+                row_ok &= row_codes[col].isin(codes).to_numpy()
+            for dim, name in RANGE_DIMENSIONS.items():
+                lo, hi = filters[name]
+                values = state.range_values[dim][rows]
+                row_ok &= (values >= lo) & (values <= hi)
+            partial_rows = rows[row_ok]
+        return keep, partial_rows
+
+    def query(self, filters=None, by=(), measures=None):
+        """Aggregates for a filter state (as in st.session_state["filters"]),
+        grouped by any of the cube dimensions.
+
+        Returns one row per group with count, defaults, default_rate and, per
+        measure (default: every measure of the frames added so far), *_sum,
+        *_sumsq, *_mean and *_std.
+        """
+        by = list(by)
+        measures = [m for m in self.measures if m in self._columns] if measures is None else list(measures)
+        cells = self.cells
+        keep, partial_rows = self._select(cells, filters)
+
+        value_cols = ["count", "defaults"] + [f"{m}_{stat}" for m in measures for stat in ("sum", "sumsq")]
+        selected_cells = cells[keep]
+        if by:
+            result = selected_cells.groupby(by, sort=True)[value_cols].sum()
+        else:
+            result = selected_cells[value_cols].sum().to_frame().T
+        if len(partial_rows):
+            extra = self._aggregate(partial_rows, by, measures)
+            result = result.add(extra, fill_value=0) if len(result) else extra
+        result = result[result["count"] > 0] if by else result
+
+        # Codes -> labels
+        if by:
+            result.index = self._labelled(result.index, by)
+        return self._with_stats(result, measures)
+
+    def _labelled(self, index, by):
+        levels = [[self.labels[d][c] for c in index.get_level_values(i)] for i, d in enumerate(by)]
+        return pd.MultiIndex.from_arrays(levels, names=by) if len(by) > 1 else pd.Index(levels[0], name=by[0])
+
+    def _with_stats(self, result, measures):
+        n = result["count"].astype("float64")
+        result = result.copy()
+        result["default_rate"] = result["defaults"] / n
+        for m in measures:
+            result[f"{m}_mean"] = result[f"{m}_sum"] / n
+            var = (result[f"{m}_sumsq"] - result[f"{m}_sum"] ** 2 / n) / (n - 1)
+            result[f"{m}_std"] = np.sqrt(var.clip(lower=0))
+        return result
+
+    def total(self, filters=None):
+        """Ungrouped aggregates for a filter state, as a Series."""
+        return self.query(filters).iloc[0]
+
+    # -----------------------------
+    # Quantile sketches
+    # -----------------------------
+    def _sketch_table(self, measure):
+        # Per cell, the count of each sketch bucket of the measure. Built on
+        # first use and shared by every filter state.
+        with self._lock:
+            if measure not in self._sketch_tables:
+                state = self._row_state()
+                values = self._values(measure, np.arange(len(self._frame)))
+                keys = bucket_keys(values)
+                ok = ~np.isnan(values)
+                rows = pd.concat([state.codes[ok].reset_index(drop=True), pd.Series(keys[ok], name="key")], axis=1)
+                self._sketch_tables[measure] = rows.groupby(self.dimensions + ["key"]).size().rename("count").reset_index()
+            return self._sketch_tables[measure]
+
+    def sketches(self, measure, filters=None, by=()):
+        """QuantileSketch of a measure for a filter state, per group of the
+        `by` dimensions (labels as keys), or a single sketch when by is empty.
+
+        The sketches of the cells inside the filter state are merged, and the
+        rows of partly covered range bins are added individually, as in query.
+        """
+        by = list(by)
+        table = self._sketch_table(measure)
+        keep, partial_rows = self._select(table, filters)
+        parts = [table[keep]]
+        if len(partial_rows):
+            values = self._values(measure, partial_rows)
+            ok = ~np.isnan(values)
+            extra = self._row_state().codes.iloc[partial_rows[ok]].reset_index(drop=True)
+            extra["key"] = bucket_keys(values[ok])
+            extra["count"] = 1
+            parts.append(extra)
+        selected = pd.concat(parts, ignore_index=True)
+        if not by:
+            return sketches_from_table(selected)
+        sketches = sketches_from_table(selected, by)
+        labels = self._labelled(pd.MultiIndex.from_tuples(
+            [k if isinstance(k, tuple) else (k,) for k in sketches], names=by), by) if sketches else []
+        return dict(zip(labels, sketches.values()))
+
+
+@st.cache_resource(show_spinner=False)
+def _build_cube(dataset, _df):
+    return stored(dataset, "cube", Cube, lambda: Cube(_df))
+
+
+def get_cube(df, measures=None):
+    """Shared Cube of a dataset, built on first use, with `measures` (those
+    df has) added."""
+    cube = _build_cube(dataset_id(df), df)
+    # Pages load different column subsets: each adds the measures it has
+    cube.add_measures(df, DEFAULT_MEASURES if measures is None else measures)
+    return cube
+
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+import seaborn as sns
+import streamlit as st
+
+from utils.filter_index import dataset_id, filter_key
+from utils.scatter import bin_index
+
+# Resolution of the shared grid. Display histograms merge adjacent grid bins,
+# the KDE is computed on the grid itself.
+FINE_BINS = 2048
+
+
+# -----------------------------
+# Binned counts
+# -----------------------------
+def binned_counts(df, column, edges, hue=None, classes=(None,)):
+    """Counts of df[column] on a fixed grid, one row per hue class."""
+    values = df[column].to_numpy(dtype="float64")
+    ok = np.isfinite(values)
+    n_bins = len(edges) - 1
+    cell = bin_index(values[ok], edges)
+    if hue is not None:
+        codes = pd.Categorical(df[hue], categories=list(classes)).codes.astype(np.int64)[ok]
+        cell, codes = cell[codes >= 0], codes[codes >= 0]
+        cell = codes * n_bins + cell
+    counts = np.bincount(cell, minlength=len(classes) * n_bins).reshape(len(classes), n_bins)
+    return {"column": column, "hue": hue, "classes": list(classes), "edges": edges, "counts": counts}
+
+
+@st.cache_data(show_spinner=False)
+def _grid(dataset, column, hue, _df):
+    values = _df[column].to_numpy(dtype="float64")
+    values = values[np.isfinite(values)]
+    lo, hi = (float(values.min()), float(values.max())) if len(values) else (0.0, 1.0)
+    edges = np.linspace(lo, hi if hi > lo else lo + 1.0, FINE_BINS + 1)
+    classes = [None] if hue is None else sorted(_df[hue].dropna().unique().tolist())
+    return edges, classes
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _binned(dataset, fkey, column, hue, _df, _df_filtered):
+    edges, classes = _grid(dataset, column, hue, _df)
+    return binned_counts(_df_filtered, column, edges, hue, classes)
+
+
+def get_binned_counts(df, df_filtered, column, hue=None, filters=None):
+    """binned_counts of the filtered frame on the dataset's grid, cached per
+    dataset and filter state (the session's, unless given)."""
+    if filters is None:
+        filters = st.session_state.get("filters")
+    fkey = filter_key(filters)
+    return _binned(dataset_id(df), fkey, column, hue, df, df_filtered)
+
+
+# -----------------------------
+# KDE
+# -----------------------------
+def _fft_convolve(signal, kernel):
+    # Linear convolution via zero-padded FFTs, trimmed to len(signal) ("same")
+    n = len(signal) + len(kernel) - 1
+    size = 1 << (n - 1).bit_length()
+    full = np.fft.irfft(np.fft.rfft(signal, size) * np.fft.rfft(kernel, size), size)[:n]
+    start = (len(kernel) - 1) // 2
+    return full[start:start + len(signal)]
+
+
+def binned_kde(counts, edges, bw_adjust=1.0):
+    """Gaussian KDE of binned data, evaluated at the bin centres.
+
+    The bandwidth follows Scott's rule on the binned mean and variance (as
+    seaborn does on the raw data). The density is the counts convolved with
+    the Gaussian kernel sampled on the grid, so the cost is
+    O(bins log bins) whatever the number of rows.
+    """
+    counts = np.asarray(counts, dtype="float64")
+    n = counts.sum()
+    delta = edges[1] - edges[0]
+    if n == 0:
+        return np.zeros_like(counts)
+    centers = (edges[:-1] + edges[1:]) / 2
+    mean = (counts * centers).sum() / n
+    std = np.sqrt((counts * (centers - mean) ** 2).sum() / max(n - 1, 1))
+    bandwidth = bw_adjust * std * n ** (-1 / 5)
+    sigma = max(bandwidth / delta, 1e-3)
+
+    half = int(np.ceil(4 * sigma))
+    offsets = np.arange(-half, half + 1)
+    kernel = np.exp(-0.5 * (offsets / sigma) ** 2)
+    kernel /= kernel.sum()
+    density = np.clip(_fft_convolve(counts, kernel), 0, None)
+    return density / (n * delta)
+
+
+# -----------------------------
+# Drawing
+# -----------------------------
+def hist_kde(ax, binned, bins=30, kde=True, alpha=None):
+    """Histogram with a KDE overlay from binned_counts, like
+    sns.histplot(..., bins=bins, kde=kde): one layer per hue class, bars over
+    the occupied range of the data and the KDE scaled to counts."""
+    counts, edges = binned["counts"], binned["edges"]
+    occupied = np.flatnonzero(counts.sum(axis=0))
+    if not len(occupied):
+        return
+    lo, hi = occupied[0], occupied[-1] + 1
+    step = max(1, int(np.ceil((hi - lo) / bins)))
+    starts = np.arange(lo, hi, step)
+    bar_edges = np.append(edges[starts], edges[min(starts[-1] + step, len(edges) - 1)])
+    centers = (edges[:-1] + edges[1:]) / 2
+
+    hue = binned["hue"]
+    palette = sns.color_palette()
+    if alpha is None:
+        alpha = 0.75 if hue is None else 0.5
+    for i, label in enumerate(binned["classes"]):
+        c = counts[i]
+        if not c.sum():
+            continue
+        color = palette[i % len(palette)]
+        ax.stairs(np.add.reduceat(c, starts), bar_edges, fill=True, alpha=alpha, color=color,
+                  label=None if hue is None else str(label))
+        if kde:
+            # Scaled like seaborn: density times the number of rows times the bar width
+            scale = c.sum() * (edges[1] - edges[0]) * step
+            ax.plot(centers[lo:hi], binned_kde(c, edges)[lo:hi] * scale, color=color)
+    ax.set_xlabel(binned["column"])
+    ax.set_ylabel("Count")
+    if hue is not None:
+        ax.legend(title=hue)
@@ -0,0 +1,164 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.perf import mark_miss
+
+# Sidebar filter -> column it selects on
+CATEGORICAL_FILTERS = {
+    "gender": "CODE_GENDER",
+    "education": "NAME_EDUCATION_TYPE",
+    "family_status": "NAME_FAMILY_STATUS",
+    "housing": "NAME_HOUSING_TYPE",
+    "credit_history": "CREDIT_HISTORY",
+}
+# Filters on features of the auxiliary tables (utils.auxiliary): only
+# datasets that have those tables show them
+OPTIONAL_FILTERS = ["credit_history"]
+RANGE_FILTERS = ["age_range", "income_range"]
+
+
+def categorical_filters(df):
+    """CATEGORICAL_FILTERS the frame has the columns for."""
+    return {
+        name: col for name, col in CATEGORICAL_FILTERS.items()
+        if name not in OPTIONAL_FILTERS or col in df.columns
+    }
+
+
+def age_years(df):
+    # Same conversion the age slider has always used
+    return -df["DAYS_BIRTH"].to_numpy(dtype="float64") / 365
+
+
+def filter_key(filters):
+    """Hashable, order-insensitive key of a filter state (None = unfiltered)."""
+    if filters is None:
+        return None
+    return tuple(
+        (name, tuple(sorted(map(str, filters[name]))) if name in CATEGORICAL_FILTERS else tuple(filters[name]))
+        for name in list(CATEGORICAL_FILTERS) + RANGE_FILTERS
+        if name in filters
+    )
+
+
+class FilterIndex:
+    """Row index over the global filter columns, built once per dataset.
+
+    Each categorical value gets a packed bitmap of its rows; age and income are
+    kept sorted together with their row positions so a range is two binary
+    searches. A filter state resolves to a boolean row mask by OR-ing the
+    selected values' bitmaps within a filter and AND-ing across filters, and
+    the most recent masks are memoized.
+    """
+
+    def __init__(self, df, cache_size=64):
+        self.n_rows = len(df)
+        self.bitmaps = {}
+        self.options = {}
+        for key, col in categorical_filters(df).items():
+            codes, uniques = pd.factorize(df[col], sort=False)
+            self.options[key] = uniques.tolist()
+            self.bitmaps[key] = {
+                value: np.packbits(codes == i) for i, value in enumerate(self.options[key])
+            }
+
+        self.sorted_values = {}
+        self.sorted_rows = {}
+        for key, values in (("age_range", age_years(df)), ("income_range", df["AMT_INCOME_TOTAL"].to_numpy(dtype="float64"))):
+            order = np.argsort(values, kind="stable")
+            self.sorted_rows[key] = order
+            self.sorted_values[key] = values[order]
+
+        self._masks = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    @property
+    def domain(self):
+        """Options and slider bounds for the sidebar widgets."""
+        ages = self.sorted_values["age_range"]
+        incomes = self.sorted_values["income_range"]
+        return {
+            **{key: list(values) for key, values in self.options.items()},
+            "age_range": (int(np.nanmin(ages)), int(np.nanmax(ages))),
+            "income_range": (int(np.nanmin(incomes)), int(np.nanmax(incomes))),
+        }
+
+    def _categorical_bits(self, key, selected):
+        if set(self.options[key]) <= set(selected):
+            return None
+        bits = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+        for value in selected:
+            if value in self.bitmaps[key]:
+                bits |= self.bitmaps[key][value]
+        return bits
+
+    def _range_span(self, key, bounds):
+        # Positions in the sorted values covered by the range
+        values = self.sorted_values[key]
+        return np.searchsorted(values, bounds[0], side="left"), np.searchsorted(values, bounds[1], side="right")
+
+    def range_keeps_all(self, key, bounds):
+        """True if a range filter keeps every row."""
+        lo, hi = self._range_span(key, bounds)
+        return lo == 0 and hi == self.n_rows
+
+    def _range_bits(self, key, bounds):
+        lo, hi = self._range_span(key, bounds)
+        if lo == 0 and hi == self.n_rows:
+            return None
+        rows = np.zeros(self.n_rows, dtype=bool)
+        rows[self.sorted_rows[key][lo:hi]] = True
+        return np.packbits(rows)
+
+    def mask(self, filters):
+        """Boolean row mask for a filter state as stored in st.session_state["filters"]."""
+        key = filter_key(filters)
+        with self._lock:
+            if key in self._masks:
+                self._masks.move_to_end(key)
+                return self._masks[key]
+
+        mark_miss()
+        bits = None
+        parts = [self._categorical_bits(name, filters[name]) for name in self.options if name in filters]
+        parts += [self._range_bits(name, filters[name]) for name in RANGE_FILTERS]
+        for part in parts:
+            if part is not None:
+                bits = part if bits is None else bits & part
+
+        if bits is None:
+            mask = np.ones(self.n_rows, dtype=bool)
+        else:
+            mask = np.unpackbits(bits, count=self.n_rows).astype(bool)
+        mask.setflags(write=False)
+
+        with self._lock:
+            self._masks[key] = mask
+            if len(self._masks) > self._cache_size:
+                self._masks.popitem(last=False)
+        return mask
+
+
+def dataset_id(df):
+    # Preprocessed artifacts carry their cache key; anything else (e.g. an
+    # upload) is identified by a hash of its filter columns
+    if "fingerprint" in df.attrs:
+        return df.attrs["fingerprint"], len(df)
+    cols = list(categorical_filters(df).values()) + ["DAYS_BIRTH", "AMT_INCOME_TOTAL"]
+    return str(pd.util.hash_pandas_object(df[cols], index=False).sum()), len(df)
+
+
+@st.cache_resource(show_spinner=False)
+def _build_filter_index(dataset, _df):
+    mark_miss()
+    return FilterIndex(_df)
+
+
+def get_filter_index(df):
+    """Shared FilterIndex for a dataset, built on first use."""
+    return _build_filter_index(dataset_id(df), df)
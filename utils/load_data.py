@@ -1,7 +1,133 @@
+import argparse
+from pathlib import Path
+
 import pandas as pd
+import pyarrow.feather as pa_feather
+import pyarrow.parquet as pq
 import streamlit as st
 
+DEFAULT_DATA_PATH = "application_train.csv"
+COLUMNAR_FORMATS = {".parquet": "parquet", ".feather": "feather", ".arrow": "feather"}
+# Rows per chunk when a dataset is read in chunks (iter_dataset)
+CHUNK_ROWS = 100_000
+
+# -----------------------------
+# Storage Schema
+# -----------------------------
+# Explicit dtypes for the integer-valued columns of application_train. Anything
+# not listed keeps the type inferred from the CSV (float64 / strings).
+COLUMN_DTYPES = {
+    "SK_ID_CURR": "int32",
+    "TARGET": "int8",
+    "CNT_CHILDREN": "int16",
+    "DAYS_BIRTH": "int32",
+    "DAYS_EMPLOYED": "int32",
+    "DAYS_ID_PUBLISH": "int32",
+    "HOUR_APPR_PROCESS_START": "int8",
+    "REGION_RATING_CLIENT": "int8",
+    "REGION_RATING_CLIENT_W_CITY": "int8",
+}
+INT8_PREFIXES = ("FLAG_DOCUMENT_", "REG_", "LIVE_")
+INT8_FLAGS = ["FLAG_MOBIL", "FLAG_EMP_PHONE", "FLAG_WORK_PHONE", "FLAG_CONT_MOBILE", "FLAG_PHONE", "FLAG_EMAIL"]
+
+
+def storage_dtype(col):
+    if col in COLUMN_DTYPES:
+        return COLUMN_DTYPES[col]
+    if col in INT8_FLAGS or col.startswith(INT8_PREFIXES):
+        return "int8"
+    return None
+
+
+def apply_schema(df):
+    # Integer types cannot hold NaN, so columns with gaps keep their inferred type
+    for col in df.columns:
+        dtype = storage_dtype(col)
+        if dtype and pd.api.types.is_integer_dtype(df[col]):
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+# -----------------------------
+# Readers
+# -----------------------------
+def default_data_path():
+    # Prefer the columnar copy written by `python -m utils.load_data`
+    for suffix in COLUMNAR_FORMATS:
+        candidate = Path(DEFAULT_DATA_PATH).with_suffix(suffix)
+        if candidate.exists():
+            return str(candidate)
+    return DEFAULT_DATA_PATH
+
+
+def data_format(file_path):
+    name = getattr(file_path, "name", str(file_path))
+    return COLUMNAR_FORMATS.get(Path(name).suffix.lower(), "csv")
+
+
+def dataset_columns(file_path=None):
+    """Column names of a dataset file, read from its header or schema only."""
+    file_path = file_path or default_data_path()
+    fmt = data_format(file_path)
+    if fmt == "parquet":
+        return pq.read_schema(file_path).names
+    if fmt == "feather":
+        return pa_feather.read_table(file_path, memory_map=True).column_names
+    return pd.read_csv(file_path, nrows=0).columns.tolist()
+
+
+def read_dataset(file_path=None, columns=None):
+    file_path = file_path or default_data_path()
+    fmt = data_format(file_path)
+    if fmt == "parquet":
+        return pd.read_parquet(file_path, columns=columns)
+    if fmt == "feather":
+        return pd.read_feather(file_path, columns=columns)
+    return apply_schema(pd.read_csv(file_path, usecols=columns))
+
+
+def iter_dataset(file_path=None, columns=None, chunksize=CHUNK_ROWS):
+    """Read a dataset as DataFrames of at most chunksize rows, so that memory
+    use is bounded by the chunk size rather than the file size."""
+    file_path = file_path or default_data_path()
+    fmt = data_format(file_path)
+    if fmt == "parquet":
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    elif fmt == "feather":
+        # Memory-mapped, so only the slice being converted is resident
+        table = pa_feather.read_table(file_path, columns=columns, memory_map=True)
+        for start in range(0, table.num_rows, chunksize):
+            yield table.slice(start, chunksize).to_pandas()
+    else:
+        for chunk in pd.read_csv(file_path, usecols=columns, chunksize=chunksize):
+            yield apply_schema(chunk)
+
+
 @st.cache_data
-def load_data(file_path="application_train.csv"):
-    df = pd.read_csv(file_path)
-    return df
\ No newline at end of file
+def load_data(file_path=None, columns=None):
+    df = read_dataset(file_path, columns)
+    return df
+
+
+# -----------------------------
+# CSV -> Columnar Conversion
+# -----------------------------
+def convert_to_columnar(csv_path=DEFAULT_DATA_PATH, output_path=None, fmt="parquet"):
+    suffix = ".parquet" if fmt == "parquet" else ".feather"
+    output_path = Path(output_path or Path(csv_path).with_suffix(suffix))
+    df = apply_schema(pd.read_csv(csv_path))
+    if fmt == "parquet":
+        df.to_parquet(output_path, index=False)
+    else:
+        df.to_feather(output_path)
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert an application_train CSV to Parquet or Feather.")
+    parser.add_argument("csv_path", nargs="?", default=DEFAULT_DATA_PATH)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--format", choices=["parquet", "feather"], default="parquet")
+    args = parser.parse_args()
+    print(f"Wrote {convert_to_columnar(args.csv_path, args.output, args.format)}")
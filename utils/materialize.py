@@ -0,0 +1,189 @@
+import argparse
+import hashlib
+import json
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import streamlit as st
+
+from utils.cache import CACHE_DIR, dataset_key, dataset_parts, ensure_artifact
+from utils.load_data import default_data_path
+
+ROOT = Path(__file__).resolve().parent.parent
+# Seconds a page may take to run headless
+PAGE_TIMEOUT = 1800
+
+
+def _code_version():
+    # Aggregates and chart images are only reused by the code that produced
+    # them: any change to the app's source gives a new directory
+    digest = hashlib.sha256()
+    for path in sorted([ROOT / "Home.py", ROOT / "preprocess.py", *(ROOT / "utils").glob("*.py"), *(ROOT / "pages").glob("*.py")]):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:12]
+
+
+CODE_VERSION = _code_version()
+
+# (fingerprint, name) -> object, while materialize() runs pages to record them
+_recording = None
+_recording_lock = threading.Lock()
+
+
+def aggregates_dir(key):
+    """Materialized aggregates of a preprocessed artifact, for this code version."""
+    return CACHE_DIR / "preprocessed" / key / f"aggregates-{CODE_VERSION}"
+
+
+def object_name(kind, *params):
+    return f"{kind}-{hashlib.sha1(repr(params).encode()).hexdigest()[:12]}"
+
+
+def _artifact_key(dataset):
+    # Only preprocessed artifacts (dataset_id = (artifact key, rows)) have a
+    # directory to materialize into
+    key = dataset[0]
+    return key if (CACHE_DIR / "preprocessed" / key).is_dir() else None
+
+
+def _load(load, path):
+    # None when missing, unreadable or written by other code
+    try:
+        return load(path)
+    except (OSError, ValueError, KeyError, EOFError, pickle.UnpicklingError, AttributeError):
+        return None
+
+
+def _load_pickle(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+# -----------------------------
+# Reading
+# -----------------------------
+def stored(dataset, name, cls, build):
+    """Shared object `name` of a dataset (the cube, a correlation index, the
+    metric engine), an instance of `cls`: loaded with cls.load from the
+    dataset's materialized aggregates when present, built otherwise.
+    Materializing writes it with its save method."""
+    key = _artifact_key(dataset)
+    if key is None:
+        return build()
+    obj = None if _recording is not None else _load(cls.load, aggregates_dir(key) / name)
+    if obj is None:
+        obj = build()
+    if _recording is not None:
+        with _recording_lock:
+            _recording[(key, name)] = obj
+    return obj
+
+
+@st.cache_resource(show_spinner=False)
+def _chart_images(key):
+    return _load(_load_pickle, aggregates_dir(key) / "charts.pkl") or {}
+
+
+def materialized_chart(chart_key):
+    """Image materialized for a show_chart cache key, or None."""
+    key = _artifact_key(chart_key[1])
+    return None if key is None or _recording is not None else _chart_images(key).get(chart_key)
+
+
+# -----------------------------
+# Building
+# -----------------------------
+def _run_page(page, file_path, reference=None):
+    """Run a page script on the unfiltered dataset with Streamlit's headless
+    script runner, exactly as the app runs it."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(page), default_timeout=PAGE_TIMEOUT)
+    at.session_state["active_dataset"] = {
+        "path": str(file_path), "reference": reference, "name": Path(file_path).name,
+    }
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"{Path(page).name}: {at.exception[0].value}")
+
+
+def materialize(file_path=None, reference=None, force=False):
+    """Precompute everything the pages use for a dataset and write it to the
+    dataset's aggregates directory.
+
+    Builds every artifact part, then runs every page headless on the unfiltered dataset, recording the shared
+    objects they build: the cube with every page's measures and sketch
+    tables, the correlation indexes' accumulators and the metric engine's
+    unfiltered results, plus every chart image. Only aggregates are written,
+    no rows. The app loads these instead of building them, so the first
+    visit after a restart computes nothing that was materialized.
+    """
+    global _recording
+    from utils.charts import get_chart_cache
+
+    file_path = str(file_path or default_data_path())
+    key = dataset_key(file_path, reference)
+    out = aggregates_dir(key)
+    if out.exists() and not force:
+        return out
+
+    start = time.perf_counter()
+    for part in dataset_parts(file_path):
+        ensure_artifact(file_path, key, part, reference)
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    _recording = {}
+    try:
+        for page in [ROOT / "Home.py", *sorted((ROOT / "pages").glob("*.py"))]:
+            _run_page(page, file_path, reference)
+        objects = {name: obj for (k, name), obj in _recording.items() if k == key}
+    finally:
+        _recording = None
+    charts = {k: image for k, image in get_chart_cache().items() if k[1][0] == key}
+
+    # A directory of this run's own, so concurrent runs do not mix files
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=f"{out.name}.", suffix=".tmp", dir=out.parent))
+    sizes = {}
+    for name, obj in objects.items():
+        obj.save(tmp / name)
+        sizes[name] = sum(f.stat().st_size for f in (tmp / name).iterdir())
+    with open(tmp / "charts.pkl", "wb") as f:
+        pickle.dump(charts, f, protocol=pickle.HIGHEST_PROTOCOL)
+    sizes["charts"] = (tmp / "charts.pkl").stat().st_size
+    manifest = {
+        "dataset": key,
+        "code_version": CODE_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "seconds": round(time.perf_counter() - start, 3),
+        "charts": len(charts),
+        "bytes": sizes,
+    }
+    (tmp / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    shutil.rmtree(out, ignore_errors=True)
+    tmp.replace(out)
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Precompute the preprocessed data, aggregates, sketches, correlations and charts "
+                    "the dashboard pages read, once per dataset and code version."
+    )
+    parser.add_argument("--data", default=None, help="dataset file (default: the app's default dataset)")
+    parser.add_argument("--reference", default=None, help="preprocess --data with the pipeline fitted on this dataset")
+    parser.add_argument("--force", action="store_true", help="rebuild even if already materialized")
+    args = parser.parse_args()
+    # The imported module's materialize: the pages' builders record into
+    # utils.materialize, not into this __main__ copy
+    from utils.materialize import materialize
+    out = materialize(args.data, args.reference, args.force)
+    manifest = json.loads((out / "manifest.json").read_text())
+    print(f"Materialized {out}: {len(manifest['bytes'])} objects, {manifest['charts']} charts, "
+          f"{sum(manifest['bytes'].values()) / 1e6:.1f} MB in {manifest['seconds']}s")
@@ -0,0 +1,330 @@
+import json
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.cube import BIN_WIDTHS, RANGE_DIMENSIONS, _bins, _range_values, bin_coverage, bin_layout
+from utils.filter_index import RANGE_FILTERS, categorical_filters, dataset_id, filter_key, get_filter_index
+from utils.materialize import object_name, stored
+
+
+class Moments:
+    """Sufficient statistics for the Pearson correlations of a set of columns:
+    pairwise counts, sums, sums of squares and the cross-product matrix.
+
+    Accumulators of disjoint row sets merge by addition. Values are shifted by
+    a fixed per-column offset before accumulating, which keeps the variance
+    computation stable for columns with a large mean; every accumulator that
+    is merged must use the same shift.
+
+    For complete data the counts, sums and sums of squares are stored as a
+    scalar and column vectors and broadcast against the (k, k) matrices.
+    """
+
+    def __init__(self, columns, n, sums, sumsq, cross, shift):
+        self.columns = list(columns)
+        self.n = n
+        self.sums = sums
+        self.sumsq = sumsq
+        self.cross = cross
+        self.shift = shift
+
+    @classmethod
+    def from_array(cls, values, columns, shift):
+        x = np.asarray(values, dtype="float64") - shift
+        present = ~np.isnan(x)
+        if present.all():
+            n = np.array([[len(x)]], dtype="float64")
+            sums = x.sum(axis=0)[:, None]
+            sumsq = (x * x).sum(axis=0)[:, None]
+            cross = x.T @ x
+        else:
+            # Pairwise-complete statistics, as DataFrame.corr uses
+            m = present.astype("float64")
+            x = np.where(present, x, 0.0)
+            n = m.T @ m
+            sums = x.T @ m
+            sumsq = (x * x).T @ m
+            cross = x.T @ x
+        return cls(columns, n, sums, sumsq, cross, shift)
+
+    @classmethod
+    def empty(cls, columns, shift):
+        k = len(columns)
+        return cls(columns, np.zeros((1, 1)), np.zeros((k, 1)), np.zeros((k, 1)), np.zeros((k, k)), shift)
+
+    def merge(self, other):
+        return Moments(
+            self.columns, self.n + other.n, self.sums + other.sums, self.sumsq + other.sumsq,
+            self.cross + other.cross, self.shift,
+        )
+
+    __add__ = merge
+
+    def __sub__(self, other):
+        # Moments of a row set without a subset of its rows
+        return Moments(
+            self.columns, self.n - other.n, self.sums - other.sums, self.sumsq - other.sumsq,
+            self.cross - other.cross, self.shift,
+        )
+
+    def corr(self, columns=None):
+        """Correlation matrix of columns (default: all) as a DataFrame."""
+        idx = np.arange(len(self.columns)) if columns is None else [self.columns.index(c) for c in columns]
+        k = len(self.columns)
+
+        def square(a):
+            return np.broadcast_to(a, (k, k))[np.ix_(idx, idx)]
+
+        n, s, q, p = square(self.n), square(self.sums), square(self.sumsq), self.cross[np.ix_(idx, idx)]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cov = p - s * s.T / n
+            var = q - s * s / n
+            corr = cov / np.sqrt(var * var.T)
+        # Constant columns: the variance is zero up to rounding in q - s^2/n
+        constant = ~(var > 1e-10 * q)
+        corr[(n < 2) | constant | constant.T] = np.nan
+        corr = np.clip(corr, -1, 1)
+        np.fill_diagonal(corr, np.where(np.isnan(np.diag(corr)), np.nan, 1.0))
+        labels = [self.columns[i] for i in idx]
+        return pd.DataFrame(corr, index=labels, columns=labels)
+
+
+# Per-row state of a correlation index: each row's segment and range bins
+# (a missing value gets the code one past the last segment or bin)
+CorrelationRows = namedtuple("CorrelationRows", ["segments", "bins"])
+
+
+def _stack(moments):
+    # Accumulators stacked per statistic; complete and pairwise ones stack in
+    # the pairwise shape
+    out = {}
+    for name in ("n", "sums", "sumsq", "cross"):
+        arrays = [getattr(m, name) for m in moments]
+        shape = np.broadcast_shapes((1, 1), *(a.shape for a in arrays))
+        out[name] = np.array([np.broadcast_to(a, shape) for a in arrays], dtype="float64").reshape(len(arrays), *shape)
+    return out
+
+
+class CorrelationIndex:
+    """Moments of a dataset's numeric columns, built with one matrix product
+    per accumulator, in two families: one accumulator per combination of the
+    categorical filter values (segment), and one per cell of the cube's age
+    and income bins.
+
+    A filter state is answered from whichever takes the fewest rows to scan:
+    the selected segments minus their rows the age and income ranges drop,
+    the cells of bins entirely inside the ranges minus their rows the
+    categorical filters drop, plus the passing rows of partly covered edge
+    bins, or a pass over the filtered rows. A filter state that only narrows
+    the categorical filters scans nothing.
+
+    Results are memoized per filter state. Only the accumulators and bins
+    are saved (see save); the rows come from the page's columns, loaded the
+    first time a filter state needs them.
+    """
+
+    def __init__(self, df, data, columns, cache_size=64):
+        self.columns = list(columns)
+        self.data = data[self.columns]
+        values = self.data.to_numpy(dtype="float64")
+        with np.errstate(all="ignore"):
+            self.shift = np.nan_to_num(np.nanmean(values, axis=0)) if len(values) else np.zeros(len(self.columns))
+
+        filters = categorical_filters(df)
+        keys = pd.MultiIndex.from_frame(df[list(filters.values())].astype(object))
+        codes, segments = pd.factorize(keys, sort=False)
+        self.segments = pd.DataFrame(list(segments), columns=list(filters))
+        # Rows with a missing filter value never pass a filter
+        self.moments = self._accumulate(values, codes, len(segments))
+
+        self.bin_origins, self.bin_bounds, bins = {}, {}, {}
+        binned = np.ones(len(df), dtype=bool)
+        for dim, dim_values in _range_values(df).items():
+            self.bin_origins[dim], bins[dim], self.bin_bounds[dim] = bin_layout(dim_values, BIN_WIDTHS[dim])
+            binned &= ~np.isnan(dim_values)
+        # Rows without an age or income are in no cell
+        cell_keys = pd.MultiIndex.from_arrays([bins[dim][binned] for dim in RANGE_DIMENSIONS])
+        cell_codes = np.full(len(df), -1, dtype=np.int64)
+        cell_codes[binned], cells = pd.factorize(cell_keys, sort=True)
+        self.cells = pd.DataFrame(list(cells), columns=list(RANGE_DIMENSIONS), dtype="int64")
+        self.cell_moments = self._accumulate(values, cell_codes, len(cells))
+        self._loader = None
+        self._reset(cache_size)
+
+    def _accumulate(self, values, codes, n_groups):
+        # One accumulator per group code, over the rows grouped by code
+        rows = np.flatnonzero(codes >= 0)
+        rows = rows[np.argsort(codes[rows], kind="stable")]
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(codes[rows], minlength=n_groups))])
+        return [
+            Moments.from_array(values[rows[offsets[i]:offsets[i + 1]]], self.columns, self.shift)
+            for i in range(n_groups)
+        ]
+
+    def _reset(self, cache_size=64):
+        self._rows = None
+        self._results = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.RLock()
+
+    # -----------------------------
+    # Saving
+    # -----------------------------
+    def save(self, path):
+        """Write the segments and cells (Parquet), the bins (JSON) and the
+        accumulators of each family, stacked per statistic into one .npy
+        file each, into directory `path`."""
+        path.mkdir(parents=True, exist_ok=True)
+        (path / "columns.json").write_text(json.dumps(self.columns))
+        self.segments.to_parquet(path / "segments.parquet", index=False)
+        self.cells.to_parquet(path / "cells.parquet", index=False)
+        bins = {
+            dim: {"origin": self.bin_origins[dim], "bounds": np.where(np.isnan(b), None, b).tolist()}
+            for dim, b in self.bin_bounds.items()
+        }
+        (path / "bins.json").write_text(json.dumps(bins))
+        np.save(path / "shift.npy", self.shift)
+        for prefix, moments in (("", self.moments), ("cell-", self.cell_moments)):
+            for name, stacked in _stack(moments).items():
+                np.save(path / f"{prefix}{name}.npy", stacked)
+
+    @classmethod
+    def load(cls, path):
+        """Index saved in directory `path`, its accumulators memory-mapped.
+        Set its loader (see _build_correlation_index) before filtering by
+        age or income."""
+        index = cls.__new__(cls)
+        index.columns = json.loads((path / "columns.json").read_text())
+        index.segments = pd.read_parquet(path / "segments.parquet")
+        index.cells = pd.read_parquet(path / "cells.parquet")
+        bins = json.loads((path / "bins.json").read_text())
+        index.bin_origins = {dim: b["origin"] for dim, b in bins.items()}
+        index.bin_bounds = {dim: np.array(b["bounds"], dtype="float64").reshape(-1, 2) for dim, b in bins.items()}
+        index.shift = np.load(path / "shift.npy")
+
+        def moments(prefix):
+            stats = [np.load(path / f"{prefix}{name}.npy", mmap_mode="r") for name in ("n", "sums", "sumsq", "cross")]
+            return [Moments(index.columns, *parts, index.shift) for parts in zip(*stats)]
+
+        index.moments = moments("")
+        index.cell_moments = moments("cell-")
+        index.data = None
+        index._loader = None
+        index._reset()
+        return index
+
+    # -----------------------------
+    # Query
+    # -----------------------------
+    def _frame(self):
+        # The page's columns, loaded the first time a filter state needs rows
+        with self._lock:
+            if self.data is None:
+                self.data = self._loader()[self.columns]
+            return self.data
+
+    def _row_state(self, df):
+        # Built on first need: filter states answered from segments alone never need it
+        with self._lock:
+            if self._rows is None:
+                keys = pd.MultiIndex.from_frame(df[list(categorical_filters(df).values())].astype(object))
+                segments = pd.MultiIndex.from_frame(self.segments.astype(object)).get_indexer(keys)
+                segments[segments < 0] = len(self.segments)
+                bins = {}
+                for dim, values in _range_values(df).items():
+                    n_bins = len(self.bin_bounds[dim])
+                    bins[dim] = np.minimum(_bins(values, self.bin_origins[dim], BIN_WIDTHS[dim]), n_bins - 1)
+                    bins[dim][np.isnan(values)] = n_bins
+                self._rows = CorrelationRows(segments, bins)
+            return self._rows
+
+    def _scan(self, rows):
+        return Moments.from_array(self._frame()[rows].to_numpy(dtype="float64"), self.columns, self.shift)
+
+    def _merged(self, moments, selected):
+        total = Moments.empty(self.columns, self.shift)
+        for i in np.flatnonzero(selected):
+            total = total + moments[i]
+        return total
+
+    def _selected_segments(self, filters):
+        selected = np.ones(len(self.segments), dtype=bool)
+        for name in self.segments.columns:
+            if name in filters:
+                selected &= self.segments[name].isin(filters[name]).to_numpy()
+        return selected
+
+    def moments_for(self, df, filters):
+        """Merged Moments of the rows selected by a filter state."""
+        if filters is None:
+            return self._merged(self.moments, np.ones(len(self.moments), dtype=bool))
+        index = get_filter_index(df)
+        selected = self._selected_segments(filters)
+        if all(index.range_keeps_all(name, filters[name]) for name in RANGE_FILTERS):
+            return self._merged(self.moments, selected)
+
+        mask = index.mask(filters)
+        state = self._row_state(df)
+        # Segments: their rows outside the ranges are subtracted
+        dropped = np.append(selected, False)[state.segments] & ~mask
+        # Cells: rows of fully covered cells that fail the categorical filters
+        # are subtracted, the passing rows of partly covered cells added
+        full, overlap = {}, {}
+        for dim, name in RANGE_DIMENSIONS.items():
+            inside, partial = bin_coverage(self.bin_bounds[dim], filters[name])
+            full[dim], overlap[dim] = np.append(inside, False), np.append(inside | partial, False)
+        row_full = full["AGE_BIN"][state.bins["AGE_BIN"]] & full["INCOME_BIN"][state.bins["INCOME_BIN"]]
+        row_overlap = overlap["AGE_BIN"][state.bins["AGE_BIN"]] & overlap["INCOME_BIN"][state.bins["INCOME_BIN"]]
+        cell_dropped = row_full & ~mask
+        cell_added = row_overlap & ~row_full & mask
+
+        costs = [dropped.sum(), cell_dropped.sum() + cell_added.sum(), mask.sum()]
+        best = int(np.argmin(costs))
+        if best == 0:
+            return self._merged(self.moments, selected) - self._scan(dropped)
+        if best == 1:
+            cells = full["AGE_BIN"][self.cells["AGE_BIN"]] & full["INCOME_BIN"][self.cells["INCOME_BIN"]]
+            return self._merged(self.cell_moments, cells) - self._scan(cell_dropped) + self._scan(cell_added)
+        return self._scan(mask)
+
+    def corr(self, df, filters, columns=None):
+        key = (filter_key(filters), None if columns is None else tuple(columns))
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+        result = self.moments_for(df, filters).corr(columns)
+        with self._lock:
+            self._results[key] = result
+            if len(self._results) > self._cache_size:
+                self._results.popitem(last=False)
+        return result
+
+@st.cache_resource(show_spinner=False)
+def _build_correlation_index(dataset, columns, _df, _data):
+    load = _data if callable(_data) else lambda: _data
+    index = stored(
+        dataset, object_name("correlations", columns), CorrelationIndex,
+        lambda: CorrelationIndex(_df, load(), columns),
+    )
+    # A loaded index gets its rows when a filter state first needs them
+    index._loader = load
+    return index
+
+
+def correlation_matrix(df, columns, data=None, filters=None):
+    """Correlation matrix of `columns` for the current filter state.
+
+    df is the page's full frame (it carries the filter columns); data holds
+    the columns when they are not in df, row-aligned with it, or is a
+    function returning them, called only if the rows are needed.
+    """
+    data = df if data is None else data
+    if filters is None:
+        filters = st.session_state.get("filters")
+    columns = tuple(columns)
+    return _build_correlation_index(dataset_id(df), columns, df, data).corr(df, filters)
@@ -0,0 +1,175 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pandas as pd
+import streamlit as st
+
+# Finished page runs kept per session for the panel and its export
+MAX_TRACES = 50
+# When set, every finished page run is also appended to this file as JSON lines
+PERF_LOG = os.environ.get("HOME_CREDIT_PERF_LOG")
+
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+class Trace:
+    """Timing spans of one page run. Spans nest; each records its stage,
+    start offset and duration, and optionally a row count and whether a
+    cache answered it."""
+
+    def __init__(self, page):
+        self.run = uuid.uuid4().hex[:12]
+        self.page = page
+        self.timestamp = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+        self.t0 = time.perf_counter()
+        # When the last span ended: the end of a run that never finished
+        self.last = self.t0
+        self.seconds = None
+        self.spans = []
+        self.open = []
+
+    def records(self):
+        """Spans in start order, as flat dicts (one JSON line each)."""
+        return [
+            {"run": self.run, "page": self.page, "timestamp": self.timestamp, **span}
+            for span in sorted(self.spans, key=lambda s: s["start"])
+        ]
+
+
+# -----------------------------
+# Recording
+# -----------------------------
+def current_trace():
+    return getattr(_local, "trace", None)
+
+
+def start_trace(page):
+    """Begin the trace of a page run in this script thread. The session's
+    previous run, if st.stop or an exception ended it before it finished its
+    trace (each run has a thread of its own), is finished first, as of its
+    last span."""
+    stopped = st.session_state.pop("perf_trace", None)
+    if stopped is not None:
+        _finish(stopped, stopped.last)
+    _local.trace = st.session_state["perf_trace"] = Trace(page)
+
+
+def finish_trace():
+    """End the current trace; it is kept in the session and logged."""
+    trace = current_trace()
+    if trace is None:
+        return None
+    _local.trace = None
+    st.session_state.pop("perf_trace", None)
+    return _finish(trace, time.perf_counter())
+
+
+def _finish(trace, end):
+    trace.seconds = end - trace.t0
+    traces = st.session_state.setdefault("perf_traces", [])
+    traces.append(trace)
+    del traces[:-MAX_TRACES]
+    if PERF_LOG:
+        with _log_lock, open(PERF_LOG, "a") as f:
+            for record in trace.records():
+                f.write(json.dumps(record) + "\n")
+    return trace
+
+
+@contextmanager
+def span(stage, rows=None, cached=False):
+    """Time a stage of the current page run. Yields the span's record, so the
+    caller can fill in rows once known. A cached stage counts as a hit unless
+    mark_miss is called inside it. Outside a page run (e.g. in a background
+    thread) nothing is recorded."""
+    trace = current_trace()
+    record = {"stage": stage, "rows": rows, "cache": "hit" if cached else None}
+    if trace is None:
+        yield record
+        return
+    record["depth"] = len(trace.open)
+    trace.open.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["start"] = round(start - trace.t0, 6)
+        trace.last = time.perf_counter()
+        record["seconds"] = round(trace.last - start, 6)
+        trace.open.remove(record)
+        trace.spans.append(record)
+
+
+def mark_miss():
+    """Record that the innermost cached span had to compute its result.
+    Called from the body of cached functions, which only runs on a miss."""
+    trace = current_trace()
+    for record in reversed(trace.open if trace is not None else []):
+        if record["cache"] is not None:
+            record["cache"] = "miss"
+            return
+
+
+def add_span(stage, seconds, rows=None, cache=None):
+    """Record a span measured elsewhere (e.g. a chart rendered by a worker
+    process), ending now."""
+    trace = current_trace()
+    if trace is None:
+        return
+    trace.last = time.perf_counter()
+    end = trace.last - trace.t0
+    trace.spans.append({
+        "stage": stage, "rows": rows, "cache": cache, "depth": len(trace.open),
+        "start": round(end - seconds, 6), "seconds": round(seconds, 6),
+    })
+
+
+# -----------------------------
+# Panel
+# -----------------------------
+def traces_jsonl(traces):
+    return "".join(json.dumps(record) + "\n" for trace in traces for record in trace.records())
+
+
+def perf_panel():
+    """Finish the page's trace and, when enabled in the sidebar, show its
+    spans, per-stage timings over the session and a JSON lines export."""
+    trace = finish_trace()
+    if not st.sidebar.toggle("⏱ Performance panel", key="perf_panel") or trace is None:
+        return
+    traces = st.session_state["perf_traces"]
+    with st.sidebar.container(border=True):
+        st.markdown(f"**This run: {trace.seconds * 1000:.0f} ms**")
+        spans = pd.DataFrame(trace.records())
+        spans["stage"] = ["  " * depth + stage for depth, stage in zip(spans["depth"], spans["stage"])]
+        spans["ms"] = spans["seconds"] * 1000
+        st.dataframe(
+            spans[["stage", "ms", "rows", "cache"]], hide_index=True,
+            column_config={"ms": st.column_config.NumberColumn(format="%.1f")},
+        )
+
+        st.markdown(f"**Session: {len(traces)} runs**")
+        history = pd.DataFrame([r for t in traces for r in t.records()])
+        summary = history.groupby(["page", "stage"]).agg(
+            runs=("seconds", "size"),
+            median_ms=("seconds", lambda s: s.median() * 1000),
+            max_ms=("seconds", lambda s: s.max() * 1000),
+            hit_rate=("cache", lambda s: (s == "hit").sum() / s.notna().sum() if s.notna().any() else None),
+        ).reset_index()
+        st.dataframe(
+            summary.sort_values("median_ms", ascending=False), hide_index=True,
+            column_config={
+                "median_ms": st.column_config.NumberColumn(format="%.1f"),
+                "max_ms": st.column_config.NumberColumn(format="%.1f"),
+                "hit_rate": st.column_config.NumberColumn(format="percent"),
+            },
+        )
+        st.download_button(
+            "Export JSON lines", traces_jsonl(traces), file_name="perf_traces.jsonl", mime="application/jsonl"
+        )
@@ -0,0 +1,397 @@
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.filter_index import categorical_filters, dataset_id, filter_key, get_filter_index
+from utils.perf import span
+
+# "1" shows metrics the cube cannot answer, and the charts drawn from rows,
+# estimated on a stratified sample first while the exact values are computed
+# in the background
+PROGRESSIVE = os.environ.get("HOME_CREDIT_PROGRESSIVE", "") == "1"
+# Seconds a page's metric passes may take before sampling kicks in; the
+# sample size is chosen to meet it
+LATENCY_BUDGET = float(os.environ.get("HOME_CREDIT_LATENCY_BUDGET_MS", "300")) / 1000
+MIN_SAMPLE_ROWS = 2_000
+# Rows drawn from every stratum however small its share (all of them if fewer)
+MIN_STRATUM_ROWS = 10
+# 95% normal confidence intervals
+Z = 1.96
+# Seconds between checks for finished exact values
+REFRESH_SECONDS = 0.5
+
+# Statistics with a design-based confidence interval; median and std are
+# weighted sample statistics with an approximate one, and min, max and
+# nunique the sample's own, which bound the exact value on one side
+LINEAR_STATS = {"count", "sum", "mean", "share_above", "notna"}
+# The sample's min is at least the exact min, its max and distinct count at
+# most the exact ones: (bounded below, bounded above)
+BOUND_STATS = {"min": (False, True), "max": (True, False), "nunique": (True, False)}
+
+
+def progressive_enabled():
+    return PROGRESSIVE
+
+
+# -----------------------------
+# Latency Model
+# -----------------------------
+class PassCost:
+    """Seconds per row of a metric pass, exact (per filtered row) and on a
+    sample (per sampled row), learned from the passes the app runs."""
+
+    def __init__(self, exact=2e-7, sample=2e-6, smoothing=0.3):
+        self.rates = {"exact": exact, "sample": sample}
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+
+    def observe(self, kind, rows, seconds):
+        if rows < 1000:
+            return
+        with self._lock:
+            self.rates[kind] += self.smoothing * (seconds / rows - self.rates[kind])
+
+    def seconds(self, kind, rows):
+        return self.rates[kind] * rows
+
+
+PASS_COST = PassCost()
+
+
+def sample_size(n_passes, n_rows, budget=LATENCY_BUDGET):
+    """Sample rows whose passes fit the budget, rounded up to a power of two
+    so nearby sizes share one sample."""
+    size = budget / max(n_passes * PASS_COST.rates["sample"], 1e-12)
+    size = 2 ** math.ceil(math.log2(max(size, MIN_SAMPLE_ROWS)))
+    return min(size, n_rows)
+
+
+# -----------------------------
+# Stratified Sample
+# -----------------------------
+SampleRows = namedtuple("SampleRows", ["positions", "strata", "allocation", "sizes"])
+
+
+class StratifiedSample:
+    """Random sample of a dataset stratified by TARGET and the categorical
+    filters, at any size.
+
+    Every row gets a random rank within its stratum once; the sample of a
+    given size holds the lowest-ranked rows of each stratum, allocated in
+    proportion to the stratum's size (at least MIN_STRATUM_ROWS), so larger
+    samples contain smaller ones.
+    """
+
+    def __init__(self, df, seed=0):
+        columns = [c for c in ["TARGET", *categorical_filters(df).values()] if c in df.columns]
+        self.n_rows = len(df)
+        self.strata = df.groupby(columns, observed=True, dropna=False, sort=False).ngroup().to_numpy()
+        self.sizes = np.bincount(self.strata)
+        order = np.lexsort((np.random.default_rng(seed).random(self.n_rows), self.strata))
+        starts = np.concatenate([[0], np.cumsum(self.sizes)[:-1]])
+        self.ranks = np.empty(self.n_rows, dtype=np.int64)
+        self.ranks[order] = np.arange(self.n_rows) - starts[self.strata[order]]
+
+    def rows(self, size):
+        """SampleRows of the sample of about `size` rows."""
+        allocation = np.minimum(
+            self.sizes, np.maximum(MIN_STRATUM_ROWS, np.round(self.sizes * size / self.n_rows))
+        ).astype(np.int64)
+        positions = np.flatnonzero(self.ranks < allocation[self.strata])
+        return SampleRows(positions, self.strata[positions], allocation, self.sizes)
+
+
+@st.cache_resource(show_spinner=False)
+def _build_sample(dataset, _df):
+    return StratifiedSample(_df)
+
+
+def get_sample(df):
+    """Shared StratifiedSample of a dataset, built on first use."""
+    return _build_sample(dataset_id(df), df)
+
+
+# -----------------------------
+# Estimates
+# -----------------------------
+def _variables(rows, metric):
+    # Numerator and denominator per row: a total estimates the numerator's
+    # sum, a ratio the numerator's over the denominator's
+    ones = pd.Series(1.0, index=rows.index)
+    if metric.stat == "count":
+        return ones, None
+    x = rows[metric.column]
+    if metric.stat == "sum":
+        return x.astype("float64").fillna(0), None
+    if metric.stat == "mean":
+        valid = x.notna()
+        return x.astype("float64").where(valid, 0), valid.astype("float64")
+    if metric.stat == "share_above":
+        return (x > metric.threshold).astype("float64"), ones
+    return x.notna().astype("float64"), ones
+
+
+def _stratified(rows, sample, keep, by, metric):
+    """Estimate and 95% half-width of a linear statistic over the filtered
+    sample rows, per group: stratified (ratio) estimators of the totals,
+    with the filter and group as estimation domains."""
+    y, x = _variables(rows, metric)
+    x = pd.Series(0.0, index=rows.index) if x is None else x
+    parts = pd.DataFrame({"y": y, "x": x, "yy": y * y, "xx": x * x, "xy": x * y})
+    keys = [rows[b] for b in by] + [pd.Series(sample.strata[keep], index=rows.index, name="_stratum")]
+    sums = parts.groupby(keys, observed=True).sum()
+
+    stratum = sums.index.get_level_values("_stratum").to_numpy()
+    n = sample.allocation[stratum].astype("float64")
+    N = sample.sizes[stratum].astype("float64")
+
+    def total(values):
+        values = pd.Series(values, index=sums.index)
+        return values.groupby(level=list(range(len(by)))).sum() if by else values.sum()
+
+    ty = total(sums["y"].to_numpy() * N / n)
+    if metric.stat in ("count", "sum"):
+        estimate, r, scale = ty, 0.0, 1.0
+    else:
+        tx = total(sums["x"].to_numpy() * N / n)
+        estimate = ty / tx
+        r = estimate.reindex(sums.index.droplevel("_stratum")).to_numpy() if by else estimate
+        scale = tx ** 2
+    # Linearized variable z = y - r x per row, its within-stratum variance
+    # over all the stratum's sampled rows (zero outside the domain)
+    sz = sums["y"].to_numpy() - r * sums["x"].to_numpy()
+    szz = sums["yy"].to_numpy() - 2 * r * sums["xy"].to_numpy() + r * r * sums["xx"].to_numpy()
+    s2 = np.where(n > 1, (szz - sz * sz / n) / np.maximum(n - 1, 1), 0.0)
+    variance = total(N * N * (1 - n / N) * np.maximum(s2, 0) / n) / scale
+    half = Z * np.sqrt(variance)
+    if metric.stat == "count":
+        estimate = estimate.round().astype("int64") if by else int(round(estimate))
+    if by:
+        return estimate.rename(metric.name), half.rename(metric.name)
+    return estimate, float(half)
+
+
+def _weighted_median(x, w):
+    # Sample median weighted by the rows' design weights, and the weighted
+    # quantiles at -+ Z / (2 sqrt(n)) around it (distribution-free interval),
+    # n the effective sample size of the weights
+    order = np.argsort(x, kind="stable")
+    x, w = x[order], w[order]
+    share = np.cumsum(w) / w.sum()
+    d = Z * 0.5 * math.sqrt((w * w).sum()) / w.sum()
+
+    def quantile(q):
+        return x[min(np.searchsorted(share, q), len(x) - 1)]
+
+    return quantile(0.5), quantile(max(0.0, 0.5 - d)), quantile(min(1.0, 0.5 + d))
+
+
+def _weighted_std(x, w):
+    # Delta method: Var(s^2) ~ (m4 - s^4) / n, so se(s) ~ sqrt(Var(s^2)) / 2s
+    n = w.sum() ** 2 / (w * w).sum()
+    if n < 2:
+        return np.nan, np.nan, np.nan
+    mean = np.average(x, weights=w)
+    m2 = np.average((x - mean) ** 2, weights=w)
+    m4 = np.average((x - mean) ** 4, weights=w)
+    s = math.sqrt(m2 * n / (n - 1))
+    half = Z * math.sqrt(max(m4 - m2 * m2, 0.0) / n) / (2 * s) if s > 0 else 0.0
+    return s, s - half, s + half
+
+
+def _weighted_pass(rows, weights, by, metric):
+    """Estimate and 95% (low, high) of a median or standard deviation, from
+    the sample rows weighted by stratum size over stratum sample size."""
+    stat = _weighted_median if metric.stat == "median" else _weighted_std
+
+    def triple(x, w):
+        valid = x.notna().to_numpy()
+        if not valid.any():
+            return np.nan, np.nan, np.nan
+        return stat(x.to_numpy(dtype="float64")[valid], w[valid])
+
+    x = rows[metric.column]
+    if not by:
+        return triple(x, weights)
+    positions = x.groupby([rows[b] for b in by], observed=True).indices
+    index = pd.MultiIndex.from_tuples(positions) if len(by) > 1 else pd.Index(list(positions), name=by[0])
+    if len(by) > 1:
+        index.names = by
+    values = [triple(x.iloc[p], weights[p]) for p in positions.values()]
+    out = pd.DataFrame(values, index=index, columns=["value", "low", "high"]).sort_index()
+    return out["value"].rename(metric.name), out["low"], out["high"]
+
+
+def _bounds(metric, value):
+    # The sample's min/max/distinct count bounds the exact one on one side
+    below, above = BOUND_STATS[metric.stat]
+    return (value if below else None), (value if above else None)
+
+
+def estimate_pass(df, sample, mask, by, metrics):
+    """(metric, estimate, low, high) of a grouped pass over the sample's
+    filtered rows, with a 95% interval per statistic; low or high is None
+    where the sample only bounds the exact value."""
+    from utils.aggregations import AggregationEngine
+
+    by = list(by)
+    keep = mask[sample.positions]
+    columns = list(dict.fromkeys(by + [m.column for m in metrics if m.column is not None]))
+    rows = df.iloc[sample.positions[keep]][columns]
+    strata = sample.strata[keep]
+    weights = sample.sizes[strata] / sample.allocation[strata]
+    out = []
+    for m in metrics:
+        if m.stat in LINEAR_STATS:
+            value, half = _stratified(rows, sample, keep, by, m)
+            out.append((m, value, value - half, value + half))
+        elif m.stat not in BOUND_STATS:
+            out.append((m, *_weighted_pass(rows, weights, by, m)))
+    bounded = [m for m in metrics if m.stat in BOUND_STATS]
+    if bounded:
+        out += [(m, value, *_bounds(m, value)) for m, value in AggregationEngine._frame_pass(rows, by, bounded)]
+    return out
+
+
+# -----------------------------
+# Background Refinement
+# -----------------------------
+@st.cache_resource(show_spinner=False)
+def _refine_worker():
+    # One exact computation at a time, so refinements do not compete with
+    # the page runs for cores
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="refine")
+
+
+@st.cache_resource(show_spinner=False)
+def _refine_jobs():
+    return {}, threading.Lock()
+
+
+def submit_exact(engine, df, df_filtered, filters, metrics):
+    """Background job computing metrics exactly into the engine's cache.
+    Sessions waiting for the same values share one job; the session's
+    previous job is cancelled if it has not started."""
+    key = (dataset_id(df), filter_key(filters), tuple(sorted(m.name for m in metrics)))
+    jobs, lock = _refine_jobs()
+    with lock:
+        for done in [k for k, j in jobs.items() if j.done()]:
+            del jobs[done]
+        job = jobs.get(key)
+        if job is None or job.cancelled():
+            job = jobs[key] = _refine_worker().submit(engine.compute, df, df_filtered, filters, metrics)
+    previous = st.session_state.get("refine_job")
+    if previous is not None and previous is not job:
+        previous.cancel()
+    st.session_state["refine_job"] = job
+    return job
+
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def _await_exact(job):
+    # Reruns the page once the exact values are in the engine's cache
+    if job.done():
+        st.rerun()
+    st.caption("⏳ Computing exact values...")
+
+
+def _show_estimates(intervals, n_sample, n_rows):
+    st.caption(
+        f"≈ Estimated from a stratified sample of {n_sample:,} of {n_rows:,} filtered rows; "
+        "exact values replace the estimates when ready."
+    )
+    if intervals:
+        with st.expander("95% confidence intervals"):
+            st.caption(
+                "Every value is an estimate. A min, max or distinct count only has one side: "
+                "the exact min is at most the estimate, the exact max and distinct count at least."
+            )
+            st.dataframe(pd.DataFrame(intervals), hide_index=True)
+
+
+def _interval_rows(metric, value, low, high, by):
+    if by:
+        low = pd.Series(None, index=value.index, dtype="float64") if low is None else low
+        high = pd.Series(None, index=value.index, dtype="float64") if high is None else high
+        triples = zip(value.index, value, low.reindex(value.index), high.reindex(value.index))
+    else:
+        triples = [(None, value, low, high)]
+    return [
+        {"metric": metric.name, "group": None if group is None else str(group), "estimate": float(v),
+         "95% low": None if lo is None else float(lo), "95% high": None if hi is None else float(hi)}
+        for group, v, lo, hi in triples
+    ]
+
+
+# -----------------------------
+# Progressive Metrics
+# -----------------------------
+def progressive_metrics(engine, df, df_filtered, filters, metrics):
+    """compute_metrics in progressive mode: exact when cached or when the
+    exact passes fit the latency budget, estimated otherwise (with the exact
+    values computed in the background and the page rerun once they are)."""
+    st.session_state["approximate"] = None
+    values, _, _, frame_passes = engine.plan(df, filters, metrics)
+    n_passes = len(frame_passes)
+    job = st.session_state.get("refine_job")
+    failed = job is not None and job.done() and not job.cancelled() and job.exception() is not None
+    if not n_passes or failed or PASS_COST.seconds("exact", n_passes * len(df_filtered)) <= LATENCY_BUDGET:
+        return engine.compute(df, df_filtered, filters, metrics)
+
+    # The passes run over the sample's filtered rows: draw enough rows from
+    # the whole frame for that many of them to pass the filters
+    size = sample_size(n_passes, len(df_filtered))
+    if size >= len(df_filtered):
+        return engine.compute(df, df_filtered, filters, metrics)
+    sample = get_sample(df).rows(size * len(df) / len(df_filtered))
+    mask = get_filter_index(df).mask(filters)
+    n_kept = int(mask[sample.positions].sum())
+    intervals = []
+
+    def estimator(by, planned):
+        for metric, value, low, high in estimate_pass(df, sample, mask, by, planned):
+            intervals.extend(_interval_rows(metric, value, low, high, by))
+            yield metric, value
+
+    with span("kpi (sample)", rows=n_kept):
+        start = time.perf_counter()
+        values = engine.compute(df, df_filtered, filters, metrics, estimator=estimator)
+        PASS_COST.observe("sample", n_passes * n_kept, time.perf_counter() - start)
+
+    st.session_state["approximate"] = {
+        "dataset": dataset_id(df), "filters": filter_key(filters),
+        "rows": df.index[sample.positions], "n_filtered": len(df_filtered),
+    }
+    _show_estimates(intervals, n_kept, len(df_filtered))
+    _await_exact(submit_exact(engine, df, df_filtered, filters, metrics))
+    return values
+
+
+def approximate_run(df):
+    """The sample this run's metrics were estimated on, when they were (for
+    the frame and current filters), else None."""
+    approximate = st.session_state.get("approximate")
+    if (
+        approximate is None or approximate["dataset"] != dataset_id(df)
+        or approximate["filters"] != filter_key(st.session_state.get("filters"))
+    ):
+        return None
+    return approximate
+
+
+def sample_data(kwargs, approximate):
+    """A chart's data with the row-level frames (one row per filtered row)
+    cut down to the sampled rows."""
+    out = {}
+    for name, value in kwargs.items():
+        if isinstance(value, (pd.Series, pd.DataFrame)) and len(value) == approximate["n_filtered"]:
+            value = value[value.index.isin(approximate["rows"])]
+        out[name] = value
+    return out
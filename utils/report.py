@@ -0,0 +1,255 @@
+import argparse
+import html
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+
+from utils.aggregations import compute_metrics
+from utils.cache import dataset_key, dataset_parts, ensure_artifact, load_preprocessed, load_profile
+from utils.charts import render_figure
+from utils.columns import page_columns
+from utils.filter_index import CATEGORICAL_FILTERS, get_filter_index
+from utils.load_data import default_data_path
+from utils.views import VIEWS, PageData
+
+STYLE = """
+body { font-family: sans-serif; margin: 2rem auto; max-width: 1200px; color: #262730; }
+.kpis { display: grid; grid-template-columns: repeat(3, 1fr); gap: 0 1rem; }
+.charts { display: grid; grid-template-columns: repeat(2, 1fr); gap: 1rem; }
+.metric { padding: .5rem 0; }
+.metric .label { font-size: .9rem; color: #555; }
+.metric .value { font-size: 1.8rem; }
+.alert { padding: .75rem 1rem; background: #fff8e1; border-radius: .5rem; }
+img { max-width: 100%; }
+"""
+
+
+# -----------------------------
+# Rendering a page
+# -----------------------------
+def preset_filters(domain, preset):
+    """Filter state of a preset; filters the preset leaves out select
+    everything, as the sidebar widgets do by default."""
+    return {
+        name: (list if name in CATEGORICAL_FILTERS else tuple)(preset.get(name, values))
+        for name, values in domain.items()
+    }
+
+
+def render_page(key, data_path, reference=None, presets=None):
+    """Compute a page's KPIs and render its charts once per filter preset and
+    return (key, {preset: content}).
+
+    The KPIs and charts come from the page's own definitions (utils.views),
+    computed on the same on-disk artifacts and shared aggregates, so the
+    report cannot drift from what the dashboard shows. Content holds the
+    title, the KPIs, the chart sections and a PNG per chart id.
+    """
+    view = VIEWS[key]
+    presets = presets or {"all": {}}
+    df = load_preprocessed(data_path, page_columns(key), reference)
+    if view.prepare is not None:
+        view.prepare(df)
+    index = get_filter_index(df)
+    profile = load_profile(data_path, reference)
+    load = partial(load_preprocessed, data_path, reference=reference)
+    results = {}
+    for name, preset in presets.items():
+        start = time.perf_counter()
+        filters = preset_filters(index.domain, preset)
+        df_filtered = df[index.mask(filters)]
+        content = {"title": view.title, "insights": view.insights, "kpis": [], "sections": [], "images": {},
+                   "empty": df_filtered.empty}
+        if not df_filtered.empty:
+            metrics = compute_metrics(df, df_filtered, view.metrics, filters)
+            page = PageData(df, df_filtered, filters, metrics, profile, load)
+            content["kpis"] = [kpi._asdict() for kpi in view.kpis(page)]
+            for section in view.sections:
+                charts = section.charts(page)
+                if charts:
+                    content["sections"].append((section.subheader, [chart.chart_id for chart in charts]))
+                for chart in charts:
+                    data = chart.data() if chart.data is not None else {}
+                    content["images"][chart.chart_id] = render_figure(lambda ax: chart.draw(ax, **data), chart.figsize)
+        content["seconds"] = time.perf_counter() - start
+        results[name] = content
+    return key, results
+
+
+# -----------------------------
+# HTML
+# -----------------------------
+def _inline(text):
+    text = html.escape(text.strip())
+    return re.sub(r"\*\*(.+?)\*\*|\*(.+?)\*", lambda m: f"<strong>{m.group(1) or m.group(2)}</strong>", text)
+
+
+def _markdown(text):
+    # The pages only use paragraphs, bold text, rules and "- " / "* " bullet
+    # lists, nested by indentation
+    out, paragraph, indents = [], [], []
+
+    def end_paragraph():
+        if paragraph:
+            out.append(f"<p>{'<br>'.join(paragraph)}</p>")
+            paragraph.clear()
+
+    def end_lists(indent=-1):
+        # Close the lists nested deeper than indent
+        while indents and indents[-1] > indent:
+            out.append("</li></ul>")
+            indents.pop()
+
+    for line in text.splitlines():
+        item = re.match(r"(\s*)[-*] (.*)", line)
+        if item:
+            end_paragraph()
+            indent = len(item.group(1))
+            end_lists(indent)
+            if indents and indents[-1] == indent:
+                out.append("</li><li>")
+            else:
+                out.append("<ul><li>")
+                indents.append(indent)
+            out.append(_inline(item.group(2)))
+        elif not line.strip() or line.strip() == "---":
+            end_paragraph()
+            end_lists()
+            if line.strip():
+                out.append("<hr>")
+        elif indents:
+            # Continuation of the list item
+            out.append(" " + _inline(line))
+        else:
+            paragraph.append(_inline(line))
+    end_paragraph()
+    end_lists()
+    return "".join(out)
+
+
+def page_html(content):
+    """HTML body of a rendered page; chart images are at <chart id>.png
+    relative to the preset's directory."""
+    out = [f"<h1>{html.escape(content['title'])}</h1>"]
+    if content["empty"]:
+        out.append('<div class="alert">No applicants match the selected filters.</div>')
+    out.append('<div class="kpis">' + "".join(
+        f'<div class="metric"><div class="label">{html.escape(kpi["label"])}</div>'
+        f'<div class="value">{html.escape(kpi["value"])}</div></div>'
+        for kpi in content["kpis"]
+    ) + "</div>")
+    for subheader, chart_ids in content["sections"]:
+        out.append(f"<h3>{html.escape(subheader)}</h3>")
+        out.append('<div class="charts">' + "".join(
+            f'<img src="{html.escape(chart_id)}.png" alt="{html.escape(chart_id)}">' for chart_id in chart_ids
+        ) + "</div>")
+    out.append("<h3>Insights</h3>" + _markdown(content["insights"]))
+    return "\n".join(out)
+
+
+def _document(title, body):
+    return (
+        f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title>"
+        f"<style>{STYLE}</style></head><body>\n{body}\n</body></html>\n"
+    )
+
+
+def write_page(out_dir, preset, key, content):
+    preset_dir = Path(out_dir) / preset
+    # Each image is named by its chart id (e.g. overview/target_pie.png)
+    for chart_id, image in content["images"].items():
+        path = preset_dir / f"{chart_id}.png"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(image)
+    preset_dir.mkdir(parents=True, exist_ok=True)
+    (preset_dir / f"{key}.html").write_text(_document(content["title"], page_html(content)), encoding="utf-8")
+
+
+def write_index(out_dir, data_path, presets, pages, contents):
+    rows = []
+    for preset, filters in presets.items():
+        links = " · ".join(
+            f'<a href="{html.escape(preset)}/{key}.html">{html.escape(contents[key][preset]["title"])}</a>'
+            for key in pages
+        )
+        rows.append(f"<h2>{html.escape(preset)}</h2><p><code>{html.escape(json.dumps(filters))}</code></p><p>{links}</p>")
+    body = (
+        f"<h1>Home Credit Default Risk Report</h1><p>Dataset: <code>{html.escape(str(data_path))}</code> · "
+        f"generated {datetime.now().isoformat(timespec='seconds')}</p>" + "".join(rows)
+    )
+    Path(out_dir, "index.html").write_text(_document("Home Credit Default Risk Report", body), encoding="utf-8")
+    kpis = {
+        preset: {
+            key: {
+                "title": contents[key][preset]["title"], "seconds": contents[key][preset]["seconds"],
+                "metrics": contents[key][preset]["kpis"],
+                "charts": [c for _, chart_ids in contents[key][preset]["sections"] for c in chart_ids],
+            }
+            for key in pages
+        }
+        for preset in presets
+    }
+    Path(out_dir, "kpis.json").write_text(json.dumps(kpis, indent=2), encoding="utf-8")
+
+
+# -----------------------------
+# Report
+# -----------------------------
+def build_report(out_dir, data_path=None, reference=None, presets=None, pages=None, workers=None):
+    """Render every page (keys of utils.views.VIEWS) for each filter preset
+    into out_dir as static HTML and PNG, plus index.html and kpis.json.
+    Pages render in parallel worker processes, or here with one worker."""
+    data_path = data_path or default_data_path()
+    presets = presets or {"all": {}}
+    pages = pages or list(VIEWS)
+    workers = min(workers or os.cpu_count() or 1, len(pages))
+
+    # Build the artifacts here once, rather than in every worker at once
+    for part in dataset_parts(data_path):
+        ensure_artifact(data_path, dataset_key(data_path, reference), part, reference)
+
+    contents = {}
+    if workers < 2:
+        for key in pages:
+            contents[key] = render_page(key, data_path, reference, presets)[1]
+    else:
+        # spawn: the workers must not inherit this process's Streamlit state
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(render_page, key, data_path, reference, presets) for key in pages]
+            for future in as_completed(futures):
+                key, result = future.result()
+                contents[key] = result
+
+    for key in pages:
+        for preset, content in contents[key].items():
+            write_page(out_dir, preset, key, content)
+    write_index(out_dir, data_path, presets, pages, contents)
+    return Path(out_dir, "index.html")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render every dashboard page into a static HTML/PNG report.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--data", default=None, help="dataset file (default: the app's default dataset)")
+    parser.add_argument("--reference", default=None,
+                        help="preprocess --data with the pipeline fitted on this dataset, as uploads are")
+    parser.add_argument("--presets", default=None,
+                        help='JSON file of filter presets, e.g. {"all": {}, "women_30_50": '
+                             '{"gender": ["F"], "age_range": [30, 50]}}')
+    parser.add_argument("--pages", nargs="*", default=None,
+                        help=f"pages to render, any of {', '.join(VIEWS)} (default: all)")
+    parser.add_argument("--workers", type=int, default=None, help="pages rendered in parallel (default: cpu count)")
+    args = parser.parse_args()
+
+    presets = json.loads(Path(args.presets).read_text()) if args.presets else None
+    # The imported module's build_report, so the worker tasks pickle as
+    # utils.report.render_page rather than __main__.render_page
+    from utils.report import build_report
+    pages = None if args.pages is None else [key for key in VIEWS if key in args.pages]
+    print(f"Wrote {build_report(args.out_dir, args.data, args.reference, presets, pages, args.workers)}")
@@ -0,0 +1,251 @@
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+import streamlit as st
+from matplotlib.colors import LogNorm
+
+from utils.filter_index import dataset_id, filter_key
+
+# Above this many points a scatter is drawn as a binned density grid, or
+# sampled down to it when raw points are asked for
+MAX_POINTS = 20000
+GRID_BINS = 120
+PAIR_BINS = 60
+HUE_CMAPS = ["Blues", "Reds", "Greens", "Purples", "Oranges"]
+
+
+# -----------------------------
+# Binning
+# -----------------------------
+def bin_edges(values, bins=GRID_BINS):
+    """Bin edges over the finite range of values. Small integer domains (flags,
+    counts, TARGET) get one bin per value instead."""
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return np.array([0.0, 1.0])
+    lo, hi = float(values.min()), float(values.max())
+    if np.all(values == np.round(values)) and hi - lo < bins:
+        return np.arange(lo - 0.5, hi + 1.5)
+    if hi == lo:
+        hi = lo + 1.0
+    return np.linspace(lo, hi, bins + 1)
+
+
+def clipped_edges(values, bins, clip_quantile=0.999):
+    # Equal-width edges up to a high quantile, so a handful of extreme values
+    # do not squeeze everything into the first bin; the tail is counted in the
+    # last bin
+    values = values[np.isfinite(values)]
+    if len(values) and clip_quantile < 1:
+        values = values[values <= np.quantile(values, clip_quantile)]
+    return bin_edges(values, bins)
+
+
+def bin_index(values, edges):
+    # Equal-width bins, so the index is arithmetic rather than a search
+    n = len(edges) - 1
+    idx = np.floor((values - edges[0]) / (edges[-1] - edges[0]) * n).astype(np.int64)
+    return np.clip(idx, 0, n - 1)
+
+
+def grid_counts(x, y, x_edges, y_edges, groups=None, n_groups=1):
+    """2D counts of (x, y) on the given edges, one grid per group code.
+
+    Returns an array of shape (n_groups, len(x_edges) - 1, len(y_edges) - 1).
+    Rows with a missing coordinate or a negative (missing) group code are
+    skipped.
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    ok = np.isfinite(x) & np.isfinite(y)
+    if groups is not None:
+        groups = np.asarray(groups)
+        ok &= groups >= 0
+    nx, ny = len(x_edges) - 1, len(y_edges) - 1
+    cell = bin_index(x[ok], x_edges) * ny + bin_index(y[ok], y_edges)
+    if groups is not None:
+        cell = groups[ok].astype(np.int64) * (nx * ny) + cell
+    counts = np.bincount(cell, minlength=n_groups * nx * ny)
+    return counts.reshape(n_groups, nx, ny)
+
+
+# -----------------------------
+# Sampling
+# -----------------------------
+def stratified_sample(df, n, by=None, random_state=0):
+    """At most n rows of df, sampled within each `by` group in proportion to
+    its size. Every group keeps at least one row, so rare classes stay visible."""
+    if len(df) <= n:
+        return df
+    if by is None:
+        return df.sample(n, random_state=random_state)
+    codes, classes = pd.factorize(df[by], sort=True)
+    sizes = np.bincount(codes[codes >= 0], minlength=len(classes))
+    quota = np.maximum(1, np.round(sizes * n / len(df))).astype(np.int64)
+    # Rank rows within their group in random order and keep each group's quota
+    order = np.random.default_rng(random_state).permutation(len(df))
+    order = order[codes[order] >= 0]
+    rank = pd.Series(codes[order]).groupby(codes[order]).cumcount().to_numpy()
+    keep = np.sort(order[rank < quota[codes[order]]])
+    return df.iloc[keep]
+
+
+# -----------------------------
+# Drawing
+# -----------------------------
+def density_scatter(ax, df, x, y, hue=None, bins=GRID_BINS):
+    """Draw x against y as a grid of binned counts on a log colour scale, with
+    one semi-transparent layer per hue class. Colour bars are only drawn for
+    up to two layers, beyond that they crowd the plot."""
+    xv = df[x].to_numpy(dtype="float64")
+    yv = df[y].to_numpy(dtype="float64")
+    x_edges, y_edges = bin_edges(xv, bins), bin_edges(yv, bins)
+
+    if hue is None:
+        classes, codes = [None], None
+    else:
+        codes, classes = pd.factorize(df[hue], sort=True)
+    counts = grid_counts(xv, yv, x_edges, y_edges, codes, len(classes))
+
+    _draw_layers(ax, x_edges, y_edges, counts, classes, hue, colorbar=len(classes) <= 2)
+    ax.set_xlabel(x)
+    ax.set_ylabel(y)
+
+
+def _draw_layers(ax, x_edges, y_edges, counts, classes, hue, colorbar=True):
+    for i, label in enumerate(classes):
+        grid = np.ma.masked_equal(counts[i].T, 0)
+        if grid.count() == 0:
+            continue
+        mesh = ax.pcolormesh(
+            x_edges, y_edges, grid,
+            cmap=HUE_CMAPS[i % len(HUE_CMAPS)] if hue is not None else "viridis",
+            norm=LogNorm(vmin=1, vmax=max(grid.max(), 1)),
+            alpha=0.6 if hue is not None else 1.0,
+            shading="flat",
+        )
+        if colorbar:
+            cbar = ax.figure.colorbar(mesh, ax=ax, pad=0.02)
+            cbar.set_label("Count" if label is None else f"Count ({hue}={label})")
+
+
+def scatter(ax, df, x, y, hue=None, mode="density", max_points=MAX_POINTS, **kwargs):
+    """Scatter plot that stays fast at any size.
+
+    mode "density" draws the binned grid. mode "points" draws raw points,
+    stratified-sampled down to max_points (by hue) when there are more.
+    mode "auto" picks points for small frames and the grid otherwise.
+    Extra keyword arguments go to sns.scatterplot in points mode.
+    """
+    if mode == "auto":
+        mode = "points" if len(df) <= max_points else "density"
+    if mode == "density":
+        return density_scatter(ax, df, x, y, hue=hue)
+
+    sample = stratified_sample(df[[x, y] + ([hue] if hue else [])], max_points, by=hue)
+    sns.scatterplot(x=x, y=y, hue=hue, data=sample, ax=ax, **kwargs)
+    if len(sample) < len(df):
+        ax.annotate(
+            f"{len(sample):,} of {len(df):,} points (stratified sample)",
+            xy=(0.01, 0.99), xycoords="axes fraction", va="top", fontsize=8, color="gray",
+        )
+
+
+# -----------------------------
+# Scatter matrix
+# -----------------------------
+def pair_counts(df, columns, edges, hue=None, classes=(None,)):
+    """Binned marginals for a scatter matrix: per hue class, a 1D histogram of
+    every column and 2D counts of every column pair, on fixed edges.
+
+    Each column is binned once; the pair grids are then one bincount each.
+    """
+    if hue is None:
+        codes = np.zeros(len(df), dtype=np.int64)
+    else:
+        codes = pd.Categorical(df[hue], categories=list(classes)).codes.astype(np.int64)
+    n_groups = len(classes)
+    rows = codes >= 0
+    codes = codes[rows]
+
+    binned, valid = {}, {}
+    for col in columns:
+        values = df[col].to_numpy(dtype="float64")[rows]
+        valid[col] = np.isfinite(values)
+        binned[col] = bin_index(np.where(valid[col], values, edges[col][0]), edges[col])
+
+    hist, grid = {}, {}
+    for i, a in enumerate(columns):
+        na = len(edges[a]) - 1
+        cell = codes[valid[a]] * na + binned[a][valid[a]]
+        hist[a] = np.bincount(cell, minlength=n_groups * na).reshape(n_groups, na)
+        for b in columns[i + 1:]:
+            nb = len(edges[b]) - 1
+            ok = valid[a] & valid[b]
+            cell = (codes[ok] * na + binned[a][ok]) * nb + binned[b][ok]
+            grid[a, b] = np.bincount(cell, minlength=n_groups * na * nb).reshape(n_groups, na, nb)
+    return {"columns": list(columns), "hue": hue, "classes": list(classes), "edges": edges, "hist": hist, "grid": grid}
+
+
+@st.cache_data(show_spinner=False)
+def _pair_edges(dataset, columns, hue, bins, _df):
+    edges = {col: clipped_edges(_df[col].to_numpy(dtype="float64"), bins) for col in columns}
+    classes = [None] if hue is None else sorted(_df[hue].dropna().unique().tolist())
+    return edges, classes
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _pair_counts(dataset, fkey, columns, hue, bins, _df, _df_filtered):
+    edges, classes = _pair_edges(dataset, columns, hue, bins, _df)
+    return pair_counts(_df_filtered, list(columns), edges, hue, classes)
+
+
+def get_pair_counts(df, df_filtered, columns, hue=None, bins=PAIR_BINS, filters=None):
+    """pair_counts of the filtered frame, cached per dataset and filter state
+    (the session's, unless given).
+
+    Edges and hue classes come from the full frame, so they stay the same
+    across filter states and the grids of different states line up.
+    """
+    if filters is None:
+        filters = st.session_state.get("filters")
+    fkey = filter_key(filters)
+    return _pair_counts(dataset_id(df), fkey, tuple(columns), hue, bins, df, df_filtered)
+
+
+def scatter_matrix(counts, height=2.5):
+    """Render pair_counts as a scatter-matrix figure: per-class density
+    histograms on the diagonal and binned count grids off it."""
+    columns, classes, hue = counts["columns"], counts["classes"], counts["hue"]
+    edges = counts["edges"]
+    k = len(columns)
+    fig, axes = plt.subplots(k, k, figsize=(height * k, height * k), squeeze=False)
+    colors = [plt.get_cmap(HUE_CMAPS[i % len(HUE_CMAPS)])(0.7) for i in range(len(classes))]
+
+    for i, row in enumerate(columns):
+        for j, col in enumerate(columns):
+            ax = axes[i, j]
+            if i == j:
+                widths = np.diff(edges[col])
+                for c, label in enumerate(classes):
+                    h = counts["hist"][col][c]
+                    if h.sum():
+                        ax.stairs(h / h.sum() / widths, edges[col], color=colors[c], fill=True, alpha=0.4,
+                                  label=label)
+                ax.set_yticks([])
+            else:
+                grid = counts["grid"][col, row] if j < i else counts["grid"][row, col].transpose(0, 2, 1)
+                _draw_layers(ax, edges[col], edges[row], grid, classes, hue, colorbar=False)
+            ax.set_xlabel(col if i == k - 1 else "")
+            ax.set_ylabel(row if j == 0 else "")
+            if i < k - 1:
+                ax.set_xticklabels([])
+            if j > 0 and i != j:
+                ax.set_yticklabels([])
+
+    if hue is not None:
+        handles = [plt.Rectangle((0, 0), 1, 1, color=colors[c]) for c in range(len(classes))]
+        fig.legend(handles, [str(c) for c in classes], title=hue, loc="center left", bbox_to_anchor=(1.0, 0.5))
+    fig.tight_layout()
+    return fig
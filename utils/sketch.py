@@ -0,0 +1,155 @@
+import numpy as np
+
+# Relative accuracy of sketch quantiles: a reported quantile is within 1% of
+# a value at that rank
+REL_ACCURACY = 0.01
+GAMMA = (1 + REL_ACCURACY) / (1 - REL_ACCURACY)
+# Magnitudes below this are counted as zero
+MIN_MAGNITUDE = 1e-9
+ZERO_KEY = -1
+_BIAS = 1 << 20
+
+
+# -----------------------------
+# Buckets
+# -----------------------------
+def bucket_keys(values):
+    """Sketch bucket of each value.
+
+    Buckets are logarithmic (DDSketch style): bucket i holds magnitudes in
+    (GAMMA**(i-1), GAMMA**i]. Positive values get even keys, negative values
+    odd keys and zero ZERO_KEY. NaN values get ZERO_KEY as well and should be
+    dropped by the caller.
+    """
+    values = np.asarray(values, dtype="float64")
+    magnitude = np.abs(values)
+    big = magnitude > MIN_MAGNITUDE
+    index = np.zeros(len(values), dtype=np.int64)
+    index[big] = np.ceil(np.log(magnitude[big]) / np.log(GAMMA)).astype(np.int64) + _BIAS
+    keys = np.where(values < 0, 2 * index + 1, 2 * index)
+    return np.where(big, keys, ZERO_KEY)
+
+
+def bucket_values(keys):
+    """Representative value of each bucket key (within REL_ACCURACY of every
+    value in the bucket)."""
+    keys = np.asarray(keys, dtype=np.int64)
+    index = (keys >> 1) - _BIAS
+    magnitude = 2 * GAMMA ** index / (GAMMA + 1)
+    values = np.where(keys & 1, -magnitude, magnitude)
+    return np.where(keys == ZERO_KEY, 0.0, values)
+
+
+# -----------------------------
+# Sketch
+# -----------------------------
+class QuantileSketch:
+    """Mergeable quantile sketch: counts per logarithmic bucket.
+
+    Sketches of disjoint segments merge by adding their bucket counts, so a
+    segment's quantiles come from summing precomputed sketches instead of
+    sorting its rows.
+    """
+
+    def __init__(self, keys=(), counts=()):
+        keys = np.asarray(keys, dtype=np.int64)
+        counts = np.asarray(counts, dtype=np.int64)
+        values = bucket_values(keys)
+        order = np.argsort(values, kind="stable")
+        self.values = values[order]
+        self.counts = counts[order]
+        self.keys = keys[order]
+
+    @classmethod
+    def from_values(cls, values):
+        values = np.asarray(values, dtype="float64")
+        keys, counts = np.unique(bucket_keys(values[~np.isnan(values)]), return_counts=True)
+        return cls(keys, counts)
+
+    @classmethod
+    def from_counts(cls, values, counts):
+        """Sketch of values given with their multiplicities (e.g. value_counts)."""
+        keys, inverse = np.unique(bucket_keys(values), return_inverse=True)
+        return cls(keys, np.bincount(inverse, weights=counts).astype(np.int64))
+
+    def merge(self, other):
+        keys = np.concatenate([self.keys, other.keys])
+        counts = np.concatenate([self.counts, other.counts])
+        keys, inverse = np.unique(keys, return_inverse=True)
+        return QuantileSketch(keys, np.bincount(inverse, weights=counts).astype(np.int64))
+
+    __add__ = merge
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def quantile(self, q):
+        """Approximate q-quantile(s) of the sketched values."""
+        if not self.count:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        rank = np.asarray(q, dtype="float64") * (self.count - 1)
+        position = np.searchsorted(np.cumsum(self.counts), rank, side="right")
+        return self.values[np.minimum(position, len(self.values) - 1)]
+
+    def box_stats(self, label=None, whis=1.5):
+        """Boxplot statistics in the format of matplotlib's Axes.bxp. Whiskers
+        end at the furthest bucket within whis * IQR of the box; buckets beyond
+        them are the fliers, one marker per bucket."""
+        q1, med, q3 = self.quantile([0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        inside = (self.values >= q1 - whis * iqr) & (self.values <= q3 + whis * iqr)
+        whislo = self.values[inside].min() if inside.any() else q1
+        whishi = self.values[inside].max() if inside.any() else q3
+        return {
+            "label": label, "med": med, "q1": q1, "q3": q3,
+            "whislo": whislo, "whishi": whishi, "fliers": self.values[~inside],
+        }
+
+
+def sketches_from_table(table, by=()):
+    """QuantileSketch per group of a (by..., key, count) table; a single
+    sketch when by is empty."""
+    by = list(by)
+    if not by:
+        summed = table.groupby("key")["count"].sum()
+        return QuantileSketch(summed.index.to_numpy(), summed.to_numpy())
+    summed = table.groupby(by + ["key"])["count"].sum().reset_index()
+    return {
+        group if len(by) > 1 else group[0]: QuantileSketch(rows["key"].to_numpy(), rows["count"].to_numpy())
+        for group, rows in summed.groupby(by, sort=True)
+    }
+
+
+# -----------------------------
+# Drawing
+# -----------------------------
+def sketch_boxplot(ax, sketches, orient="v", color=None, xlabel=None, ylabel=None):
+    """Draw boxplots from a QuantileSketch or a {label: QuantileSketch} dict,
+    styled like sns.boxplot."""
+    if isinstance(sketches, QuantileSketch):
+        sketches = {None: sketches}
+    stats = [s.box_stats(label) for label, s in sketches.items() if s.count]
+    if not stats:
+        return
+    color = color or "C0"
+    ax.bxp(
+        stats,
+        orientation="vertical" if orient == "v" else "horizontal",
+        patch_artist=True,
+        widths=0.8,
+        boxprops={"facecolor": color, "edgecolor": "0.25"},
+        medianprops={"color": "0.25"},
+        whiskerprops={"color": "0.25"},
+        capprops={"color": "0.25"},
+        flierprops={"marker": "d", "markersize": 4, "markerfacecolor": "0.25", "markeredgecolor": "0.25"},
+    )
+    labels = [str(s["label"]) if s["label"] is not None else "" for s in stats]
+    if orient == "v":
+        ax.set_xticks(range(1, len(stats) + 1), labels)
+    else:
+        ax.set_yticks(range(1, len(stats) + 1), labels)
+    if xlabel is not None:
+        ax.set_xlabel(xlabel)
+    if ylabel is not None:
+        ax.set_ylabel(ylabel)
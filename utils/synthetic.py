@@ -0,0 +1,345 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.load_data import apply_schema
+
+# Rows are generated in blocks of this size, each from its own seed, so the
+# output for a given seed does not depend on how it is written or chunked
+BLOCK_ROWS = 100_000
+# Bump when the generated data changes, so benchmark datasets are regenerated
+GENERATOR_VERSION = 1
+
+# -----------------------------
+# Category Frequencies
+# -----------------------------
+# Approximate shares in the public application_train.csv
+CATEGORIES = {
+    "NAME_CONTRACT_TYPE": {"Cash loans": 0.905, "Revolving loans": 0.095},
+    "CODE_GENDER": {"F": 0.658, "M": 0.342, "XNA": 0.00001},
+    "FLAG_OWN_CAR": {"N": 0.66, "Y": 0.34},
+    "FLAG_OWN_REALTY": {"Y": 0.694, "N": 0.306},
+    "NAME_TYPE_SUITE": {
+        "Unaccompanied": 0.812, "Family": 0.131, "Spouse, partner": 0.037, "Children": 0.011,
+        "Other_B": 0.0058, "Other_A": 0.0028, "Group of people": 0.0009,
+    },
+    "NAME_INCOME_TYPE": {
+        "Working": 0.516, "Commercial associate": 0.233, "Pensioner": 0.18, "State servant": 0.0706,
+        "Unemployed": 0.00007, "Student": 0.00006, "Businessman": 0.00003, "Maternity leave": 0.00002,
+    },
+    "NAME_EDUCATION_TYPE": {
+        "Secondary / secondary special": 0.710, "Higher education": 0.243, "Incomplete higher": 0.033,
+        "Lower secondary": 0.012, "Academic degree": 0.0005,
+    },
+    "NAME_FAMILY_STATUS": {
+        "Married": 0.639, "Single / not married": 0.148, "Civil marriage": 0.097, "Separated": 0.064,
+        "Widow": 0.052, "Unknown": 0.00001,
+    },
+    "NAME_HOUSING_TYPE": {
+        "House / apartment": 0.887, "With parents": 0.048, "Municipal apartment": 0.036,
+        "Rented apartment": 0.016, "Office apartment": 0.0085, "Co-op apartment": 0.0036,
+    },
+    "OCCUPATION_TYPE": {
+        "Laborers": 55186, "Sales staff": 32102, "Core staff": 27570, "Managers": 21371, "Drivers": 18603,
+        "High skill tech staff": 11380, "Accountants": 9813, "Medicine staff": 8537, "Security staff": 6721,
+        "Cooking staff": 5946, "Cleaning staff": 4653, "Private service staff": 2652,
+        "Low-skill Laborers": 2093, "Waiters/barmen staff": 1348, "Secretaries": 1305, "Realty agents": 751,
+        "HR staff": 563, "IT staff": 526,
+    },
+    "WEEKDAY_APPR_PROCESS_START": {
+        "TUESDAY": 0.175, "WEDNESDAY": 0.169, "MONDAY": 0.165, "THURSDAY": 0.164, "FRIDAY": 0.164,
+        "SATURDAY": 0.11, "SUNDAY": 0.053,
+    },
+    "ORGANIZATION_TYPE": {
+        "Business Entity Type 3": 0.221, "XNA": 0.18, "Self-employed": 0.125, "Other": 0.054,
+        "Medicine": 0.036, "Business Entity Type 2": 0.034, "Government": 0.034, "School": 0.029,
+        "Trade: type 7": 0.025, "Kindergarten": 0.022, "Construction": 0.022, "Business Entity Type 1": 0.019,
+        "Transport: type 4": 0.018, "Trade: type 3": 0.011, "Industry: type 9": 0.011,
+        "Industry: type 3": 0.011, "Security": 0.011, "Housing": 0.0096, "Industry: type 11": 0.0088,
+        "Military": 0.0086, "Bank": 0.0081, "Agriculture": 0.008, "Police": 0.0076,
+        "Transport: type 2": 0.0072, "Postal": 0.007, "Security Ministries": 0.0064, "Trade: type 2": 0.0062,
+        "Restaurant": 0.0059, "Services": 0.0051, "University": 0.0043, "Industry: type 7": 0.0043,
+        "Transport: type 3": 0.0039, "Industry: type 1": 0.0034, "Hotel": 0.0031, "Electricity": 0.0031,
+        "Industry: type 4": 0.0029, "Trade: type 6": 0.0021, "Industry: type 5": 0.0019, "Insurance": 0.0019,
+        "Telecom": 0.0019, "Emergency": 0.0018, "Industry: type 2": 0.0015, "Advertising": 0.0014,
+        "Realtor": 0.0013, "Culture": 0.0012, "Industry: type 12": 0.0012, "Trade: type 1": 0.0011,
+        "Mobile": 0.001, "Legal Services": 0.001, "Cleaning": 0.00085, "Transport: type 1": 0.00065,
+        "Industry: type 6": 0.00036, "Industry: type 10": 0.00035, "Religion": 0.00028,
+        "Industry: type 13": 0.00022, "Trade: type 4": 0.0002, "Trade: type 5": 0.00016,
+        "Industry: type 8": 0.00008,
+    },
+    "FONDKAPREMONT_MODE": {
+        "reg oper account": 0.76, "reg oper spec account": 0.124, "not specified": 0.058,
+        "org spec account": 0.058,
+    },
+    "HOUSETYPE_MODE": {"block of flats": 0.983, "specific housing": 0.0096, "terraced house": 0.0079},
+    "WALLSMATERIAL_MODE": {
+        "Panel": 0.436, "Stone, brick": 0.426, "Block": 0.061, "Wooden": 0.035, "Mixed": 0.015,
+        "Monolithic": 0.012, "Others": 0.011,
+    },
+    "EMERGENCYSTATE_MODE": {"No": 0.985, "Yes": 0.015},
+}
+
+# Building statistics: stored as _AVG, _MODE and _MEDI variants, with the
+# share of applications where each is missing
+BUILDING_FEATURES = {
+    "APARTMENTS": 0.507, "BASEMENTAREA": 0.585, "YEARS_BEGINEXPLUATATION": 0.488, "YEARS_BUILD": 0.665,
+    "COMMONAREA": 0.699, "ELEVATORS": 0.533, "ENTRANCES": 0.503, "FLOORSMAX": 0.498, "FLOORSMIN": 0.678,
+    "LANDAREA": 0.594, "LIVINGAPARTMENTS": 0.684, "LIVINGAREA": 0.502, "NONLIVINGAPARTMENTS": 0.694,
+    "NONLIVINGAREA": 0.552,
+}
+BUILDING_MODE_MISSING = {
+    "FONDKAPREMONT_MODE": 0.684, "HOUSETYPE_MODE": 0.502, "TOTALAREA_MODE": 0.483,
+    "WALLSMATERIAL_MODE": 0.508, "EMERGENCYSTATE_MODE": 0.474,
+}
+# Share of applications with a building record at all; a feature missing
+# more often than this is also missing within some records
+BUILDING_RECORD_SHARE = 0.53
+
+DOCUMENT_FLAG_RATES = {
+    2: 0.00004, 3: 0.71, 4: 0.0001, 5: 0.015, 6: 0.088, 7: 0.0002, 8: 0.081, 9: 0.0039, 10: 0.00002,
+    11: 0.0039, 12: 0.00001, 13: 0.0035, 14: 0.0029, 15: 0.0012, 16: 0.0099, 17: 0.0003, 18: 0.0081,
+    19: 0.0006, 20: 0.0005, 21: 0.0003,
+}
+REGION_FLAG_RATES = {
+    "REG_REGION_NOT_LIVE_REGION": 0.015, "REG_REGION_NOT_WORK_REGION": 0.051,
+    "LIVE_REGION_NOT_WORK_REGION": 0.041, "REG_CITY_NOT_LIVE_CITY": 0.078,
+    "REG_CITY_NOT_WORK_CITY": 0.23, "LIVE_CITY_NOT_WORK_CITY": 0.18,
+}
+# Intercept of the TARGET model, calibrated to the source's 8.07% default rate
+_TARGET_INTERCEPT = -2.88
+
+
+# -----------------------------
+# Column Order
+# -----------------------------
+def synthetic_columns():
+    """Column names in the order of application_train.csv."""
+    columns = [
+        "SK_ID_CURR", "TARGET", "NAME_CONTRACT_TYPE", "CODE_GENDER", "FLAG_OWN_CAR", "FLAG_OWN_REALTY",
+        "CNT_CHILDREN", "AMT_INCOME_TOTAL", "AMT_CREDIT", "AMT_ANNUITY", "AMT_GOODS_PRICE", "NAME_TYPE_SUITE",
+        "NAME_INCOME_TYPE", "NAME_EDUCATION_TYPE", "NAME_FAMILY_STATUS", "NAME_HOUSING_TYPE",
+        "REGION_POPULATION_RELATIVE", "DAYS_BIRTH", "DAYS_EMPLOYED", "DAYS_REGISTRATION", "DAYS_ID_PUBLISH",
+        "OWN_CAR_AGE", "FLAG_MOBIL", "FLAG_EMP_PHONE", "FLAG_WORK_PHONE", "FLAG_CONT_MOBILE", "FLAG_PHONE",
+        "FLAG_EMAIL", "OCCUPATION_TYPE", "CNT_FAM_MEMBERS", "REGION_RATING_CLIENT",
+        "REGION_RATING_CLIENT_W_CITY", "WEEKDAY_APPR_PROCESS_START", "HOUR_APPR_PROCESS_START",
+        *REGION_FLAG_RATES, "ORGANIZATION_TYPE", "EXT_SOURCE_1", "EXT_SOURCE_2", "EXT_SOURCE_3",
+    ]
+    for suffix in ("AVG", "MODE", "MEDI"):
+        columns += [f"{name}_{suffix}" for name in BUILDING_FEATURES]
+    columns += list(BUILDING_MODE_MISSING)
+    columns += [
+        "OBS_30_CNT_SOCIAL_CIRCLE", "DEF_30_CNT_SOCIAL_CIRCLE", "OBS_60_CNT_SOCIAL_CIRCLE",
+        "DEF_60_CNT_SOCIAL_CIRCLE", "DAYS_LAST_PHONE_CHANGE",
+    ]
+    columns += [f"FLAG_DOCUMENT_{i}" for i in DOCUMENT_FLAG_RATES]
+    columns += [f"AMT_REQ_CREDIT_BUREAU_{p}" for p in ("HOUR", "DAY", "WEEK", "MON", "QRT", "YEAR")]
+    return columns
+
+
+# -----------------------------
+# Generator
+# -----------------------------
+def _choice(rng, name, n):
+    freq = CATEGORIES[name]
+    p = np.array(list(freq.values()), dtype="float64")
+    return rng.choice(np.array(list(freq), dtype=object), size=n, p=p / p.sum())
+
+
+def _with_missing(rng, values, rate):
+    values = np.asarray(values)
+    if values.dtype.kind in "iub":
+        values = values.astype("float64")
+    mask = rng.random(len(values)) < rate
+    values = values.copy()
+    values[mask] = None if values.dtype == object else np.nan
+    return values
+
+
+def _block(rng, start, n):
+    d = {"SK_ID_CURR": np.arange(100002 + start, 100002 + start + n, dtype=np.int64)}
+
+    contract = _choice(rng, "NAME_CONTRACT_TYPE", n)
+    d["NAME_CONTRACT_TYPE"] = contract
+    d["CODE_GENDER"] = _choice(rng, "CODE_GENDER", n)
+    own_car = _choice(rng, "FLAG_OWN_CAR", n)
+    d["FLAG_OWN_CAR"] = own_car
+    d["FLAG_OWN_REALTY"] = _choice(rng, "FLAG_OWN_REALTY", n)
+    children = rng.choice([0, 1, 2, 3, 4, 5], size=n, p=[0.7004, 0.199, 0.087, 0.0121, 0.0014, 0.0001])
+    d["CNT_CHILDREN"] = children
+
+    # Amounts: lognormal, rounded like the source data; the annuity follows
+    # from the credit and a term of 10 to 60 months
+    income = np.round(np.clip(rng.lognormal(np.log(147_150), 0.5, n), 25_650, 1.2e8) / 450) * 450
+    credit = np.round(np.clip(rng.lognormal(np.log(513_531), 0.6, n), 45_000, 4.05e6) / 4500) * 4500
+    term = rng.uniform(10, 60, n)
+    annuity = np.round(credit / term * rng.uniform(0.9, 1.4, n), 1)
+    goods = np.where(contract == "Revolving loans", credit, np.round(credit * rng.uniform(0.75, 1.0, n) / 4500) * 4500)
+    d["AMT_INCOME_TOTAL"] = income
+    d["AMT_CREDIT"] = credit
+    d["AMT_ANNUITY"] = _with_missing(rng, annuity, 0.00004)
+    d["AMT_GOODS_PRICE"] = _with_missing(rng, goods, 0.0009)
+    d["NAME_TYPE_SUITE"] = _with_missing(rng, _choice(rng, "NAME_TYPE_SUITE", n), 0.0042)
+
+    income_type = _choice(rng, "NAME_INCOME_TYPE", n)
+    pensioner = income_type == "Pensioner"
+    d["NAME_INCOME_TYPE"] = income_type
+    d["NAME_EDUCATION_TYPE"] = _choice(rng, "NAME_EDUCATION_TYPE", n)
+    family = _choice(rng, "NAME_FAMILY_STATUS", n)
+    d["NAME_FAMILY_STATUS"] = family
+    d["NAME_HOUSING_TYPE"] = _choice(rng, "NAME_HOUSING_TYPE", n)
+    d["REGION_POPULATION_RELATIVE"] = np.round(rng.gamma(2.0, 0.0105, n).clip(0.00029, 0.0725), 6)
+
+    # Ages 20 to 69, pensioners older; employment length bounded by age, and
+    # the 365243 placeholder for the unemployed/retired as in the source data
+    age_days = np.where(pensioner, rng.uniform(20_000, 25_229, n), rng.uniform(7_489, 23_000, n))
+    days_birth = -np.round(age_days).astype(np.int64)
+    employed = -np.minimum(np.round(rng.exponential(2_400, n)), age_days - 6_570).clip(0).astype(np.int64)
+    days_employed = np.where(pensioner, 365243, employed)
+    d["DAYS_BIRTH"] = days_birth
+    d["DAYS_EMPLOYED"] = days_employed
+    d["DAYS_REGISTRATION"] = -np.round(rng.uniform(0, np.minimum(age_days, 24_672)), 0)
+    d["DAYS_ID_PUBLISH"] = -rng.integers(0, 7_198, n)
+    d["OWN_CAR_AGE"] = np.where(own_car == "Y", np.round(rng.gamma(2.0, 6.0, n).clip(0, 91)), np.nan)
+
+    d["FLAG_MOBIL"] = np.ones(n, dtype=np.int64)
+    d["FLAG_EMP_PHONE"] = (~pensioner).astype(np.int64)
+    d["FLAG_WORK_PHONE"] = (rng.random(n) < 0.2).astype(np.int64)
+    d["FLAG_CONT_MOBILE"] = (rng.random(n) < 0.998).astype(np.int64)
+    d["FLAG_PHONE"] = (rng.random(n) < 0.281).astype(np.int64)
+    d["FLAG_EMAIL"] = (rng.random(n) < 0.057).astype(np.int64)
+
+    occupation = _choice(rng, "OCCUPATION_TYPE", n)
+    occupation[pensioner | (rng.random(n) < 0.16)] = None
+    d["OCCUPATION_TYPE"] = occupation
+    partner = np.isin(family, ["Married", "Civil marriage"]).astype(np.int64)
+    d["CNT_FAM_MEMBERS"] = _with_missing(rng, (1 + partner + children).astype("float64"), 0.00001)
+
+    rating = rng.choice([1, 2, 3], size=n, p=[0.105, 0.738, 0.157])
+    d["REGION_RATING_CLIENT"] = rating
+    d["REGION_RATING_CLIENT_W_CITY"] = np.where(rng.random(n) < 0.95, rating, rng.choice([1, 2, 3], size=n))
+    d["WEEKDAY_APPR_PROCESS_START"] = _choice(rng, "WEEKDAY_APPR_PROCESS_START", n)
+    d["HOUR_APPR_PROCESS_START"] = np.round(rng.normal(12, 3.3, n)).clip(0, 23).astype(np.int64)
+    for name, rate in REGION_FLAG_RATES.items():
+        d[name] = (rng.random(n) < rate).astype(np.int64)
+    organization = _choice(rng, "ORGANIZATION_TYPE", n)
+    organization[pensioner] = "XNA"
+    d["ORGANIZATION_TYPE"] = organization
+
+    # External scores, lower for riskier applicants; TARGET is drawn from a
+    # logistic model on them and a few applicant features
+    risk = rng.normal(0, 1, n)
+    ext = [
+        np.clip(rng.beta(5, 5, n) - 0.08 * risk, 0.0146, 0.963),
+        np.clip(rng.beta(4, 2.5, n) - 0.08 * risk, 0.0000001, 0.855),
+        np.clip(rng.beta(4, 3, n) - 0.08 * risk, 0.000527, 0.896),
+    ]
+    d["EXT_SOURCE_1"] = _with_missing(rng, ext[0], 0.564)
+    d["EXT_SOURCE_2"] = _with_missing(rng, ext[1], 0.0021)
+    d["EXT_SOURCE_3"] = _with_missing(rng, ext[2], 0.198)
+    logit = (
+        0.9 * risk - 2.2 * (ext[1] - 0.51) - 2.0 * (ext[2] - 0.51)
+        + 0.3 * (age_days / 365.25 < 30) + 0.2 * (d["CODE_GENDER"] == "M") + 0.2 * (rating == 3)
+    )
+    d["TARGET"] = (rng.random(n) < 1 / (1 + np.exp(-(logit + _TARGET_INTERCEPT)))).astype(np.int64)
+
+    # Building statistics: missing together (no building record), plus extra
+    # per-feature gaps up to each feature's missing share
+    has_record = rng.random(n) < BUILDING_RECORD_SHARE
+    base = {name: rng.beta(1.5, 8, n) for name in BUILDING_FEATURES}
+    base["YEARS_BEGINEXPLUATATION"] = rng.beta(30, 1.2, n)
+    base["YEARS_BUILD"] = rng.beta(12, 5, n)
+    present = {
+        name: has_record & (rng.random(n) < (1 - rate) / BUILDING_RECORD_SHARE)
+        for name, rate in {**BUILDING_FEATURES, **BUILDING_MODE_MISSING}.items()
+    }
+    for suffix in ("AVG", "MODE", "MEDI"):
+        for name, values in base.items():
+            if suffix == "MODE":
+                values = np.clip(values * rng.normal(1, 0.05, n), 0, 1)
+            elif suffix == "MEDI":
+                values = np.clip(values + rng.normal(0, 0.002, n), 0, 1)
+            d[f"{name}_{suffix}"] = np.where(present[name], np.round(values, 4), np.nan)
+    for name in BUILDING_MODE_MISSING:
+        values = np.round(rng.beta(1.5, 12, n), 4) if name == "TOTALAREA_MODE" else _choice(rng, name, n)
+        if values.dtype == object:
+            values[~present[name]] = None
+        else:
+            values = np.where(present[name], values, np.nan)
+        d[name] = values
+
+    obs30 = rng.negative_binomial(1, 0.42, n).clip(0, 348)
+    def30 = rng.binomial(obs30, 0.1)
+    social_missing = rng.random(n) < 0.0033
+    for name, values in [
+        ("OBS_30_CNT_SOCIAL_CIRCLE", obs30), ("DEF_30_CNT_SOCIAL_CIRCLE", def30),
+        ("OBS_60_CNT_SOCIAL_CIRCLE", obs30 - rng.binomial(obs30, 0.01)),
+        ("DEF_60_CNT_SOCIAL_CIRCLE", def30 - rng.binomial(def30, 0.3)),
+    ]:
+        d[name] = np.where(social_missing, np.nan, values.astype("float64"))
+    d["DAYS_LAST_PHONE_CHANGE"] = _with_missing(
+        rng, np.where(rng.random(n) < 0.12, 0.0, -np.round(rng.exponential(900, n)).clip(0, 4292)), 0.000003
+    )
+    for i, rate in DOCUMENT_FLAG_RATES.items():
+        d[f"FLAG_DOCUMENT_{i}"] = (rng.random(n) < rate).astype(np.int64)
+
+    bureau_missing = rng.random(n) < 0.135
+    for period, lam in [("HOUR", 0.0065), ("DAY", 0.007), ("WEEK", 0.034), ("MON", 0.27), ("QRT", 0.27), ("YEAR", 1.9)]:
+        d[f"AMT_REQ_CREDIT_BUREAU_{period}"] = np.where(bureau_missing, np.nan, rng.poisson(lam, n).astype("float64"))
+
+    return apply_schema(pd.DataFrame(d)[synthetic_columns()])
+
+
+def iter_synthetic(n_rows, seed=0):
+    """Synthetic application_train rows with the source schema, yielded in
+    blocks of up to BLOCK_ROWS. Block i is drawn from its own child of the
+    seed, so the same seed always gives the same rows."""
+    children = np.random.SeedSequence(seed).spawn((n_rows + BLOCK_ROWS - 1) // BLOCK_ROWS)
+    for i, child in enumerate(children):
+        start = i * BLOCK_ROWS
+        yield _block(np.random.default_rng(child), start, min(BLOCK_ROWS, n_rows - start))
+
+
+def generate_application_train(n_rows, seed=0):
+    """Synthetic application_train as one DataFrame (see iter_synthetic)."""
+    return pd.concat(list(iter_synthetic(n_rows, seed)), ignore_index=True)
+
+
+def write_synthetic(output_path, n_rows, seed=0):
+    """Write a synthetic dataset block by block as CSV (optionally .gz) or
+    Parquet, without holding more than one block in memory."""
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output_path.with_name(output_path.name + ".tmp")
+    if output_path.suffix == ".parquet":
+        writer = None
+        for block in iter_synthetic(n_rows, seed):
+            if writer is None:
+                # A text column can be all missing within a block; type it as string
+                schema = pa.Schema.from_pandas(block, preserve_index=False)
+                for i, field in enumerate(schema):
+                    if pa.types.is_null(field.type):
+                        schema = schema.set(i, field.with_type(pa.string()))
+                writer = pq.ParquetWriter(tmp, schema)
+            writer.write_table(pa.Table.from_pandas(block, preserve_index=False, schema=writer.schema))
+        writer.close()
+    else:
+        compression = "gzip" if output_path.suffix == ".gz" else None
+        with open(tmp, "wb") as f:
+            for i, block in enumerate(iter_synthetic(n_rows, seed)):
+                block.to_csv(f, header=(i == 0), index=False, compression=compression)
+    tmp.replace(output_path)
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic application_train dataset.")
+    parser.add_argument("output_path", help=".csv, .csv.gz or .parquet")
+    parser.add_argument("--rows", type=int, default=307_511)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(f"Wrote {write_synthetic(args.output_path, args.rows, args.seed)}")
@@ -0,0 +1,161 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from utils.cache import (
+    CACHE_DIR, atomic_path, dataset_key, dataset_parts, ensure_artifact, remember_fingerprint, set_active_dataset,
+)
+from utils.load_data import default_data_path
+
+UPLOAD_DIR = CACHE_DIR / "uploads"
+# Extensions accepted by the uploader: plain, gzip or zip CSV, and Parquet
+UPLOAD_TYPES = ["csv", "gz", "zip", "parquet"]
+# Seconds between progress updates while an upload is processed
+REFRESH_SECONDS = 0.5
+
+
+# -----------------------------
+# Content
+# -----------------------------
+def upload_suffix(name):
+    # Stored files keep a suffix that read_dataset understands (pandas infers
+    # the compression of .gz / .zip CSVs from it)
+    name = name.lower()
+    if name.endswith(".parquet"):
+        return ".parquet"
+    if name.endswith(".gz"):
+        return ".csv.gz"
+    if name.endswith(".zip"):
+        return ".csv.zip"
+    return ".csv"
+
+
+def upload_digest(uploaded_file):
+    """SHA-256 of an upload's bytes, computed once per uploaded file and
+    remembered for the session's later reruns."""
+    digests = st.session_state.setdefault("upload_digests", {})
+    if uploaded_file.file_id not in digests:
+        digests[uploaded_file.file_id] = hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+    return digests[uploaded_file.file_id]
+
+
+# -----------------------------
+# Background Processing
+# -----------------------------
+class UploadJob:
+    """Saving and preprocessing of one upload (identified by its content
+    hash) in the background worker; stage and row progress are read by the
+    page while it waits."""
+
+    def __init__(self, sha, name, reference):
+        self.sha = sha
+        self.name = name
+        self.reference = reference
+        self.path = UPLOAD_DIR / f"{sha[:16]}{upload_suffix(name)}"
+        self.stage = "Queued"
+        self.rows = 0
+        self.total = None
+        self.started = time.time()
+        self.future = None
+
+    def _progress(self, stage):
+        def report(rows, total):
+            self.stage, self.rows, self.total = stage, rows, total
+        return report
+
+    def run(self, data):
+        self.stage = "Saving upload"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_path(self.path) as tmp, open(tmp, "wb") as f:
+            f.write(data)
+        del data
+        remember_fingerprint(self.path, self.sha)
+        try:
+            self.stage = "Preparing reference statistics"
+            ensure_artifact(self.reference, dataset_key(self.reference), "core")
+            # Every part is built now, so the saved file is not needed again
+            key = dataset_key(self.path, self.reference)
+            for part in dataset_parts(self.path):
+                self.stage, self.rows, self.total = f"Preprocessing {part} columns", 0, None
+                ensure_artifact(self.path, key, part, self.reference, self._progress(f"Preprocessing {part} columns"))
+        finally:
+            self.path.unlink(missing_ok=True)
+        self.stage = "Ready"
+
+    @property
+    def fraction(self):
+        return self.rows / self.total if self.total else 0.0
+
+    def status(self):
+        if self.total:
+            rows = f"{self.rows:,} of {self.total:,} rows"
+        elif self.rows:
+            rows = f"{self.rows:,} rows scanned"
+        else:
+            rows = ""
+        elapsed = f"{time.time() - self.started:.0f}s"
+        return f"{self.stage} ({rows}, {elapsed})" if rows else f"{self.stage} ({elapsed})"
+
+
+@st.cache_resource(show_spinner=False)
+def _upload_worker():
+    # One upload at a time, so concurrent uploads do not multiply peak memory
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="upload")
+
+
+@st.cache_resource(show_spinner=False)
+def _upload_jobs():
+    return {}, threading.Lock()
+
+
+def _failed(job):
+    return job.future.done() and job.future.exception() is not None
+
+
+def submit_upload(uploaded_file):
+    """Background job that saves and preprocesses an upload. Uploads with the
+    same content (in any session) share one job until a session consumes it
+    (activate_upload)."""
+    sha = upload_digest(uploaded_file)
+    jobs, lock = _upload_jobs()
+    with lock:
+        job = jobs.get(sha)
+        if job is None:
+            job = jobs[sha] = UploadJob(sha, uploaded_file.name, default_data_path())
+            job.future = _upload_worker().submit(job.run, uploaded_file.getbuffer())
+    return job
+
+
+def _consume(job):
+    jobs, lock = _upload_jobs()
+    with lock:
+        if jobs.get(job.sha) is job:
+            del jobs[job.sha]
+
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def _await_upload(job):
+    # Only this fragment reruns while the job is running; the page reruns once it is done
+    if job.future.done():
+        st.rerun()
+    st.progress(job.fraction, text=job.status())
+
+
+def activate_upload(job):
+    """Make a finished job's upload the session's active dataset and return
+    True, or record its error in st.session_state["upload_error"] (shown
+    until the next upload) and return False. Either way the job is consumed.
+    While the job runs, shows its progress (the rest of the page stays
+    usable) and returns None; the page reruns when it finishes."""
+    if not job.future.done():
+        _await_upload(job)
+        return None
+    _consume(job)
+    if _failed(job):
+        st.session_state["upload_error"] = f"Could not load {job.name}: {job.future.exception()}"
+        return False
+    set_active_dataset(job.path, job.reference, job.name)
+    return True
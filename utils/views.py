@@ -0,0 +1,812 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+import seaborn as sns
+import matplotlib.pyplot as plt
+import streamlit as st
+
+from utils.aggregations import Metric
+from utils.charts import show_chart
+from utils.cube import get_cube
+from utils.density import get_binned_counts, hist_kde
+from utils.moments import correlation_matrix
+from utils.scatter import get_pair_counts, scatter, scatter_matrix
+from utils.sketch import sketch_boxplot
+
+# The KPI and chart definitions of every page. The pages and the static
+# report (utils.report) both build their KPIs and charts from these, so the
+# two cannot drift apart.
+
+# A KPI as shown: label, formatted value and optional help text
+Kpi = namedtuple("Kpi", "label value help", defaults=(None,))
+# A chart: draw(ax, **data()) renders it, data is None when draw takes no
+# arguments; params are the page-local inputs the image depends on
+Chart = namedtuple("Chart", "chart_id draw figsize data params", defaults=(None, ()))
+# What a page's KPI and chart functions read: the page's frame, the filtered
+# rows, the filter state, the page's metrics, the column profile and
+# load(columns=...) for columns outside the page's frame
+PageData = namedtuple("PageData", "df df_filtered filters metrics profile load")
+# A group of charts under a subheader; charts(page) lists them
+Section = namedtuple("Section", "subheader charts")
+# A page: title, metrics, kpis(page), chart sections and narrative, plus
+# prepare(df), run on the loaded frame before filtering
+View = namedtuple("View", "title metrics kpis sections insights prepare", defaults=(None,))
+
+
+# -----------------------------
+# Display
+# -----------------------------
+def show_kpis(kpis, rows):
+    """Show KPIs as metrics, rows[i] of them side by side in row i; a row of
+    one spans the page."""
+    kpis = iter(kpis)
+    for n in rows:
+        if n == 1:
+            kpi = next(kpis)
+            st.metric(kpi.label, kpi.value, help=kpi.help)
+            continue
+        for col, kpi in zip(st.columns(n), kpis):
+            col.metric(kpi.label, kpi.value, help=kpi.help)
+
+
+def show_charts(charts, df):
+    """Show charts two per row with show_chart."""
+    for start in range(0, len(charts), 2):
+        for col, chart in zip(st.columns(2), charts[start:start + 2]):
+            with col:
+                show_chart(chart.chart_id, chart.draw, df, chart.figsize, chart.params, chart.data)
+
+
+# -----------------------------
+# Overview & Data Quality
+# -----------------------------
+# Everything this page aggregates, computed in as few grouped passes as
+# possible and shared with the other pages for the same filter state
+OVERVIEW_METRICS = [
+    Metric("total_applicants", "count"),
+    Metric("default_rate", "mean", "TARGET"),
+    Metric("median_age", "median", "AGE_YEARS"),
+    Metric("median_income", "median", "AMT_INCOME_TOTAL"),
+    Metric("avg_credit", "mean", "AMT_CREDIT"),
+    Metric("target_counts", "count", by="TARGET"),
+    Metric("gender_counts", "count", by="CODE_GENDER"),
+    Metric("family_counts", "count", by="NAME_FAMILY_STATUS"),
+    Metric("edu_counts", "count", by="NAME_EDUCATION_TYPE"),
+]
+
+
+def overview_kpis(page):
+    metrics, profile = page.metrics, page.profile
+    default_rate = metrics["default_rate"] * 100
+    total_features = len(profile)
+    num_features = int(profile["numeric"].sum())
+    return [
+        Kpi("Total Applicants", f"{int(metrics['total_applicants']):,}"),
+        Kpi("Default Rate (%)", f"{default_rate:.2f}%"),
+        Kpi("Repaid Rate (%)", f"{100 - default_rate:.2f}%"),
+        Kpi("Total Features", str(total_features)),
+        Kpi("Num Features", str(num_features)),
+        Kpi("Cat Features", str(total_features - num_features)),
+        Kpi("Avg Missing per Feature (%)", f"{profile['missing_ratio'].mean() * 100:.2f}%"),
+        Kpi("Median Age (Years)", f"{metrics['median_age']:.0f}"),
+        Kpi("Median Annual Income", f"{metrics['median_income']:,.0f}"),
+        Kpi("Average Credit Amount", f"{metrics['avg_credit']:,.0f}"),
+    ]
+
+
+def overview_charts(page):
+    df, df_filtered, filters, metrics = page.df, page.df_filtered, page.filters, page.metrics
+
+    #Pie — Target distribution (0 vs 1)
+    def target_pie(ax):
+        target_counts = metrics["target_counts"]
+        target_counts.plot.pie(
+        labels=[{0: 'Repaid (0)', 1: 'Default (1)'}[t] for t in target_counts.index],
+        autopct='%1.1f%%',
+        startangle=0,
+        colors=['skyblue', 'salmon'],ax=ax
+        )
+        plt.title("Target Distribution")
+        plt.ylabel("")
+
+    #Bar — Top 20 features by missing %
+    missing = page.profile["missing_ratio"] * 100
+    top_missing = missing.sort_values(ascending=False).head(20)
+    def missing_bar(ax):
+        sns.barplot(x=top_missing.values, y=top_missing.index, palette="viridis",ax=ax)
+        plt.xlabel("Missing %")
+        plt.title("Top 20 Features by Missing %")
+
+    #Histogram — AGE_YEARS
+    def age_hist(ax, values):
+        sns.histplot(values, bins=40, color="teal",ax=ax)
+        plt.xlabel("Age (Years)")
+        plt.title("Age Distribution")
+
+    #Histogram — Income
+    def income_hist(ax, values):
+        sns.histplot(values, bins=40, color="orange",ax=ax)
+        plt.xlabel("Annual Income")
+        plt.title("Income Distribution")
+
+    #Histogram — Credit amount
+    def credit_hist(ax, values):
+        sns.histplot(values, bins=40, color="purple",ax=ax)
+        plt.xlabel("Credit Amount")
+        plt.title("Credit Amount Distribution")
+
+    #Boxplot — Income
+    def income_box(ax, sketches):
+        sketch_boxplot(ax, sketches, orient="h", color="orange")
+        plt.xlabel("Annual Income")
+        plt.title("Boxplot: Income")
+
+    #Boxplot — Credit amount
+    def credit_box(ax, sketches):
+        sketch_boxplot(ax, sketches, orient="h", color="purple")
+        plt.xlabel("Credit Amount")
+        plt.title("Boxplot: Credit Amount")
+
+    #Bar — Gender distribution
+    def gender_bar(ax):
+        gender_counts = metrics["gender_counts"]
+        sns.barplot(x=gender_counts.index.astype(str), y=gender_counts.values, palette="Set2")
+        plt.title("Gender Distribution")
+
+    #Bar — Family Status distribution
+    def family_bar(ax):
+        family_counts = metrics["family_counts"].sort_values(ascending=False)
+        sns.barplot(x=family_counts.values, y=family_counts.index.astype(str),
+                  palette="Set1")
+        plt.title("Family Status Distribution")
+
+    #Bar — Education distribution
+    def education_bar(ax):
+        edu_counts = metrics["edu_counts"].sort_values(ascending=False)
+        sns.barplot(x=edu_counts.values, y=edu_counts.index.astype(str),
+                  palette="Set3")
+        plt.title("Education Type Distribution")
+
+    return [
+        Chart("overview/target_pie", target_pie, (8, 5)),
+        Chart("overview/top_missing", missing_bar, (8, 5)),
+        Chart("overview/age_hist", age_hist, (8, 5), lambda: {"values": df_filtered['AGE_YEARS']}),
+        Chart("overview/income_hist", income_hist, (8, 5), lambda: {"values": df_filtered['AMT_INCOME_TOTAL']}),
+        Chart("overview/credit_hist", credit_hist, (8, 5), lambda: {"values": df_filtered['AMT_CREDIT']}),
+        Chart("overview/income_box", income_box, (8, 5),
+              lambda: {"sketches": get_cube(df).sketches('AMT_INCOME_TOTAL', filters)}),
+        Chart("overview/credit_box", credit_box, (8, 5),
+              lambda: {"sketches": get_cube(df).sketches('AMT_CREDIT', filters)}),
+        Chart("overview/gender_bar", gender_bar, (8, 5)),
+        Chart("overview/family_bar", family_bar, (8, 5)),
+        Chart("overview/education_bar", education_bar, (8, 5)),
+    ]
+
+
+OVERVIEW_INSIGHTS = """
+The target distribution shows that most applicants successfully repay their loans,
+while defaults are a smaller portion, indicating an imbalanced dataset.
+
+The income and credit variables are right-skewed, with a few applicants earning or borrowing
+extremely high amounts — potential outliers that may distort averages.
+
+Some features exhibit high missing values (over 40–60%), which could pose risks
+to model reliability and may need dropping or careful imputation.
+"""
+
+
+# -----------------------------
+# Target & Risk Segmentation
+# -----------------------------
+TARGET_METRICS = [
+    Metric("total_defaults", "sum", "TARGET"),
+    Metric("default_rate", "mean", "TARGET"),
+    Metric("def_rate_gender", "mean", "TARGET", by="CODE_GENDER"),
+    Metric("def_rate_edu", "mean", "TARGET", by="NAME_EDUCATION_TYPE"),
+    Metric("def_rate_family", "mean", "TARGET", by="NAME_FAMILY_STATUS"),
+    Metric("def_rate_housing", "mean", "TARGET", by="NAME_HOUSING_TYPE"),
+    Metric("target_counts", "count", by="TARGET"),
+    Metric("income_by_target", "mean", "AMT_INCOME_TOTAL", by="TARGET"),
+    Metric("credit_by_target", "mean", "AMT_CREDIT", by="TARGET"),
+    Metric("annuity_by_target", "mean", "AMT_ANNUITY", by="TARGET"),
+    Metric("emp_by_target", "mean", "EMPLOYMENT_YEARS", by="TARGET"),
+    Metric("contract_by_target", "count", by=("NAME_CONTRACT_TYPE", "TARGET")),
+]
+
+
+def target_kpis(page):
+    metrics = page.metrics
+    # Averages for Defaulters
+    avg_income_def = metrics["income_by_target"].get(1, np.nan)
+    avg_credit_def = metrics["credit_by_target"].get(1, np.nan)
+    avg_annuity_def = metrics["annuity_by_target"].get(1, np.nan)
+    avg_emp_def = metrics["emp_by_target"].get(1, np.nan)
+    return [
+        Kpi("Total Defaults", f"{int(metrics['total_defaults']):,}"),
+        Kpi("Default Rate (%)", f"{metrics['default_rate'] * 100:.2f}%"),
+        Kpi("Avg Income (Defaulters)", f"{avg_income_def:,.0f}"),
+        Kpi("Avg Credit (Defaulters)", f"{avg_credit_def:,.0f}"),
+        Kpi("Avg Annuity (Defaulters)", f"{avg_annuity_def:,.0f}"),
+        Kpi("Avg Employment Years (Defaulters)", f"{avg_emp_def:.1f}"),
+        # Group-wise default rates
+        Kpi("Default Rate by Gender (%)", f"{metrics['def_rate_gender'].mean() * 100:.2f}%"),
+        Kpi("Default Rate by Education (%)", f"{metrics['def_rate_edu'].mean() * 100:.2f}%"),
+        Kpi("Default Rate by Family Status (%)", f"{metrics['def_rate_family'].mean() * 100:.2f}%"),
+        Kpi("Default Rate by Housing Type (%)", f"{metrics['def_rate_housing'].mean() * 100:.2f}%"),
+    ]
+
+
+def target_charts(page):
+    df, df_filtered, filters, metrics = page.df, page.df_filtered, page.filters, page.metrics
+
+    #  Bar — Counts: Default vs Repaid
+    def target_counts(ax):
+        sns.barplot(x=metrics["target_counts"].index.astype(str), y=metrics["target_counts"].values)
+        plt.title("Counts: Default vs Repaid")
+
+    def default_bar(name, title):
+        # Bar — Default % by a group
+        def draw(ax):
+            metrics[name].plot(kind="bar")
+            plt.title(title)
+            plt.ylabel("Default %")
+        return draw
+
+    #  Boxplot — Income by Target
+    def income_box(ax, sketches):
+        sketch_boxplot(ax, sketches, xlabel="TARGET", ylabel="AMT_INCOME_TOTAL")
+        plt.title("Income by Target")
+
+    #  Boxplot — Credit by Target
+    def credit_box(ax, sketches):
+        sketch_boxplot(ax, sketches, xlabel="TARGET", ylabel="AMT_CREDIT")
+        plt.title("Credit by Target")
+
+    #  Violin — Age vs Target
+    def age_violin(ax, rows):
+        sns.violinplot(x="TARGET", y="DAYS_BIRTH", data=rows)
+
+    #  Histogram (stacked) — EMPLOYMENT_YEARS by Target
+    def employment_hist(ax, rows):
+        emp_years = (-rows["DAYS_EMPLOYED"] / 365).astype(int).rename("EMP_YEARS")
+        sns.histplot(x=emp_years, hue=rows["TARGET"], multiple="stack")
+        plt.title("Employment Years by Target")
+
+    #  Stacked Bar — Contract type vs Target
+    def contract_bar(ax):
+        contract_dist = metrics["contract_by_target"].unstack(fill_value=0)
+        contract_dist.plot(kind="bar", stacked=True, ax=ax, color=["#3A993D", "#F44336"])
+        ax.set_ylabel("Count")
+        ax.set_xlabel("Contract Type")
+
+    return [
+        Chart("target/target_counts", target_counts, (8, 5)),
+        Chart("target/default_by_gender", default_bar("def_rate_gender", "Default % by Gender"), (8, 5)),
+        Chart("target/default_by_education", default_bar("def_rate_edu", "Default % by Education"), (8, 5)),
+        Chart("target/default_by_family", default_bar("def_rate_family", "Default % by Family Status"), (8, 5)),
+        Chart("target/default_by_housing", default_bar("def_rate_housing", "Default % by Housing Type"), (8, 5)),
+        Chart("target/income_by_target", income_box, (8, 5),
+              lambda: {"sketches": get_cube(df).sketches("AMT_INCOME_TOTAL", filters, by=["TARGET"])}),
+        Chart("target/credit_by_target", credit_box, (8, 5),
+              lambda: {"sketches": get_cube(df).sketches("AMT_CREDIT", filters, by=["TARGET"])}),
+        Chart("target/age_violin", age_violin, (8, 5), lambda: {"rows": df_filtered[["TARGET", "DAYS_BIRTH"]]}),
+        Chart("target/employment_by_target", employment_hist, (8, 5),
+              lambda: {"rows": df_filtered[["DAYS_EMPLOYED", "TARGET"]]}),
+        Chart("target/contract_by_target", contract_bar, (8, 5)),
+    ]
+
+
+TARGET_INSIGHTS = """
+-Employment Length: Applicants with shorter employment history (less than 2 years) tend to default more than those with longer job stability.
+-Age: Younger applicants (under 30) have higher default rates compared to older age groups.
+-Credit Amount: Higher loan amounts relative to income increase the likelihood of default.
+-Contract Type: Clients with cash loans default more often than those with revolving credit or consumer credit.
+-Income: Lower income applicants show a higher chance of default.
+-Gender: Slightly higher default rates observed among females in the dataset.
+-Family Status: Single or divorced applicants have higher default rates than married or widowed.
+"""
+
+
+# -----------------------------
+# Demographics & Household Profile
+# -----------------------------
+DEMOGRAPHICS_METRICS = [
+    Metric("gender_counts", "count", by="CODE_GENDER"),
+    Metric("family_counts", "count", by="NAME_FAMILY_STATUS"),
+    Metric("edu_counts", "count", by="NAME_EDUCATION_TYPE"),
+    Metric("housing_counts", "count", by="NAME_HOUSING_TYPE"),
+    Metric("age_by_target", "mean", "AGE_YEARS", by="TARGET"),
+    Metric("pct_with_children", "share_above", "CNT_CHILDREN", threshold=0),
+    Metric("avg_family_size", "mean", "CNT_FAM_MEMBERS"),
+    Metric("pct_working", "notna", "OCCUPATION_TYPE"),
+    Metric("avg_employment_years", "mean", "EMPLOYMENT_YEARS"),
+]
+HIGHER_EDUCATION = ['Bachelor', 'Master', 'PhD']
+
+
+def _share(counts, match):
+    # Percentage of filtered applicants whose label satisfies `match`
+    return counts[[match(str(label)) for label in counts.index]].sum() / counts.sum() * 100
+
+
+def demographics_kpis(page):
+    metrics = page.metrics
+    gender, family = metrics['gender_counts'], metrics['family_counts']
+    return [
+        Kpi("% Male ", f"{_share(gender, lambda g: g.lower() == 'male'):.1f}"),
+        Kpi("% Female", f"{_share(gender, lambda g: g.lower() == 'female'):.1f}%"),
+        Kpi("Avg Age — Defaulters ", f"{metrics['age_by_target'].get(1, np.nan):,.1f}"),
+        Kpi("Avg Age — Non-Defaulters", f"{metrics['age_by_target'].get(0, np.nan):,.1f}"),
+        Kpi("% With Children", f"{metrics['pct_with_children'] * 100:,.1f}"),
+        Kpi("Avg Family Size ", f"{metrics['avg_family_size']:.1f}"),
+        Kpi("% Married ", f"{_share(family, lambda f: f.lower() == 'married'):.1f}%"),
+        Kpi("% Single ", f"{_share(family, lambda f: f.lower() == 'single'):.1f}%"),
+        Kpi("% Higher Education ", f"{_share(metrics['edu_counts'], lambda e: e in HIGHER_EDUCATION):.1f}%"),
+        Kpi("% Currently Working ", f"{metrics['pct_working'] * 100:.1f}%"),
+        Kpi("Avg Employment Years", f"{metrics['avg_employment_years']:.1f}%"),
+    ]
+
+
+def demographics_charts(page):
+    df, df_filtered, filters, metrics = page.df, page.df_filtered, page.filters, page.metrics
+
+    #  Histogram — Age distribution (all)
+    def age_hist(ax, binned):
+        hist_kde(ax, binned, bins=30)
+        plt.title('Age Distribution')
+        plt.xlabel('AGE_YEARS')
+        plt.ylabel('Count')
+
+    # Histogram — Age by Target (overlay)
+    def age_by_target(ax, binned):
+        hist_kde(ax, binned, bins=30, alpha=0.5)
+        plt.title('Age Distribution by Target')
+        plt.xlabel('AGE_YEARS')
+        plt.ylabel('Count')
+
+    #  Bar — Gender distribution
+    def gender_bar(ax):
+        gender_counts = metrics['gender_counts']
+        sns.barplot(x=gender_counts.index.astype(str), y=gender_counts.values)
+        plt.title('Gender Distribution')
+        plt.xlabel('CODE_GENDER')
+        plt.ylabel('Count')
+
+    #  Bar — Family Status distribution
+    def family_bar(ax):
+        family_counts = metrics['family_counts']
+        sns.barplot(x=family_counts.index.astype(str), y=family_counts.values)
+        plt.title('Family Status Distribution')
+        plt.xlabel('NAME_FAMILY_STATUS')
+        plt.ylabel('Count')
+        plt.xticks(rotation=45)
+
+    #  Bar — Education distribution
+    def education_bar(ax):
+        edu_counts = metrics['edu_counts']
+        sns.barplot(x=edu_counts.index.astype(str), y=edu_counts.values)
+        plt.title('Education Distribution')
+        plt.xlabel('NAME_EDUCATION_TYPE')
+        plt.ylabel('Count')
+        plt.xticks(rotation=45)
+
+    #  Bar — Occupation distribution (top 10)
+    def occupations_bar(ax, top_occupations):
+        sns.barplot(x=top_occupations.index, y=top_occupations.values)
+        plt.title('Top 10 Occupations')
+        plt.xlabel('OCCUPATION_TYPE')
+        plt.ylabel('Count')
+        plt.xticks(rotation=45)
+
+    #  Pie — Housing Type distribution
+    def housing_pie(ax):
+        metrics['housing_counts'].sort_values(ascending=False).plot.pie(autopct='%1.1f%%', startangle=95)
+        plt.title('Housing Type Distribution')
+        plt.xlabel("NAME_HOUSING_TYPE")
+        plt.ylabel('')
+
+    #  Countplot — CNT_CHILDREN
+    def children_count(ax, rows):
+        sns.countplot(x='CNT_CHILDREN', data=rows)
+        plt.title('Number of Children')
+        plt.xlabel('CNT_CHILDREN')
+        plt.ylabel('Count')
+
+    #  Boxplot — Age vs Target
+    def age_box(ax, sketches):
+        sketch_boxplot(ax, sketches, xlabel='TARGET', ylabel='AGE_YEARS')
+        plt.title('Age vs Target')
+        plt.xlabel('Target')
+        plt.ylabel('AGE_YEARS')
+
+    #  Heatmap — Corr(Age, Children, Family Size, TARGET)
+    def corr_heatmap(ax, corr):
+        sns.heatmap(corr, annot=True, cmap='coolwarm')
+        plt.title('Correlation Heatmap')
+    cols = ['AGE_YEARS', 'CNT_CHILDREN', 'CNT_FAM_MEMBERS', 'TARGET']
+
+    return [
+        Chart("demographics/age_hist", age_hist, (8, 6),
+              lambda: {"binned": get_binned_counts(df, df_filtered, 'AGE_YEARS', filters=filters)}),
+        Chart("demographics/age_by_target", age_by_target, (8, 6),
+              lambda: {"binned": get_binned_counts(df, df_filtered, 'AGE_YEARS', hue='TARGET', filters=filters)}),
+        Chart("demographics/gender_bar", gender_bar, (8, 5)),
+        Chart("demographics/family_bar", family_bar, (7, 5)),
+        Chart("demographics/education_bar", education_bar, (8, 5)),
+        Chart("demographics/top_occupations", occupations_bar, (8, 5),
+              lambda: {"top_occupations": df_filtered['OCCUPATION_TYPE'].value_counts().nlargest(10)}),
+        Chart("demographics/housing_pie", housing_pie, (8, 5)),
+        Chart("demographics/children_count", children_count, (8, 5), lambda: {"rows": df_filtered[['CNT_CHILDREN']]}),
+        Chart("demographics/age_box", age_box, (8, 6),
+              lambda: {"sketches": get_cube(df).sketches('AGE_YEARS', filters, by=['TARGET'])}),
+        Chart("demographics/corr_heatmap", corr_heatmap, (8, 6),
+              lambda: {"corr": correlation_matrix(df, cols, filters=filters)}),
+    ]
+
+
+DEMOGRAPHICS_INSIGHTS = """
+-These life-stage patterns suggest that credit risk is not determined by age or family size alone, but by their intersection.
+-Younger individuals—especially those supporting larger families—are at higher risk, while older, stable family units are less likely to default.
+-Lenders may consider targeted support, education, or stricter risk assessment for applicants
+in early life stages with greater household responsibilities.
+"""
+
+
+# -----------------------------
+# Financial Health & Affordability
+# -----------------------------
+def add_ratios(df):
+    """Add DTI and LTI to the page's frame."""
+    df['DTI'] = df['AMT_ANNUITY'] / df['AMT_INCOME_TOTAL']
+    df['LTI'] = df['AMT_CREDIT'] / df['AMT_INCOME_TOTAL']
+    return df
+
+
+FINANCIAL_METRICS = [
+    Metric("avg_income", "mean", "AMT_INCOME_TOTAL"),
+    Metric("median_income", "median", "AMT_INCOME_TOTAL"),
+    Metric("avg_credit", "mean", "AMT_CREDIT"),
+    Metric("avg_annuity", "mean", "AMT_ANNUITY"),
+    Metric("avg_goods_price", "mean", "AMT_GOODS_PRICE"),
+    Metric("avg_dti", "mean", "DTI"),
+    Metric("avg_lti", "mean", "LTI"),
+    Metric("income_by_target", "mean", "AMT_INCOME_TOTAL", by="TARGET"),
+    Metric("credit_by_target", "mean", "AMT_CREDIT", by="TARGET"),
+    Metric("pct_high_credit", "share_above", "AMT_CREDIT", threshold=1_000_000),
+]
+
+
+def financial_kpis(page):
+    metrics = page.metrics
+    income_gap = metrics['income_by_target'].get(0, np.nan) - metrics['income_by_target'].get(1, np.nan)
+    credit_gap = metrics['credit_by_target'].get(0, np.nan) - metrics['credit_by_target'].get(1, np.nan)
+    return [
+        Kpi("Avg Annual Income", f"{metrics['avg_income']:,.0f}"),
+        Kpi("Median Annual Income", f"{metrics['median_income']:,.0f}"),
+        Kpi("Avg Credit Amount", f"{metrics['avg_credit']:,.0f}"),
+        Kpi("Avg Annuity", f"{metrics['avg_annuity']:,.0f}"),
+        Kpi("Avg Goods Price", f"{metrics['avg_goods_price']:,.0f}"),
+        Kpi("Debt-to-Income Ratio (DTI)", f"{metrics['avg_dti']:.2f}", "AMT_ANNUITY / AMT_INCOME_TOTAL"),
+        Kpi("Loan-to-Income Ratio (LTI)", f"{metrics['avg_lti']:.2f}", "AMT_CREDIT / AMT_INCOME_TOTAL"),
+        Kpi("Income Gap (Non-def − Def)", f"{income_gap:,.0f}"),
+        Kpi("Credit Gap (Non-def − Def)", f"{credit_gap:,.0f}"),
+        Kpi("% High Credit (>1M)", f"{metrics['pct_high_credit'] * 100:.1f}%"),
+    ]
+
+
+def financial_charts(page, scatter_mode="density"):
+    df, df_filtered, filters = page.df, page.df_filtered, page.filters
+
+    def histogram(title, xlabel):
+        # Histogram with KDE of one amount
+        def draw(ax, binned):
+            hist_kde(ax, binned, bins=30)
+            plt.title(title)
+            plt.xlabel(xlabel)
+            plt.ylabel('Count')
+        return draw
+
+    # Scatter — Income vs Credit
+    def income_vs_credit(ax, rows):
+        scatter(ax, rows, 'AMT_INCOME_TOTAL', 'AMT_CREDIT', mode=scatter_mode, alpha=0.3)
+        plt.title('Income vs Credit Amount')
+        plt.xlabel('Annual Income')
+        plt.ylabel('Credit Amount')
+
+    #  Scatter — Income vs Annuity
+    def income_vs_annuity(ax, rows):
+        scatter(ax, rows, 'AMT_INCOME_TOTAL', 'AMT_ANNUITY', mode=scatter_mode, alpha=0.3)
+        plt.title('Income vs Annuity')
+        plt.xlabel('Annual Income')
+        plt.ylabel('Annuity Amount')
+
+    # Boxplot — Credit by Target
+    def credit_box(ax, sketches):
+        sketch_boxplot(ax, sketches, xlabel='TARGET', ylabel='AMT_CREDIT')
+        plt.title('Credit Amount by Default Status')
+        plt.xlabel('Target (Default)')
+        plt.ylabel('Credit Amount')
+
+    # Boxplot — Income by Target
+    def income_box(ax, sketches):
+        sketch_boxplot(ax, sketches, xlabel='TARGET', ylabel='AMT_INCOME_TOTAL')
+        plt.title('Income by Default Status')
+        plt.xlabel('Target (Default)')
+        plt.ylabel('Annual Income')
+
+    # KDE / Density — Joint Income–Credit
+    def income_credit_scatter(ax, rows):
+        scatter(ax, rows, 'AMT_INCOME_TOTAL', 'AMT_CREDIT', mode=scatter_mode, alpha=0.3, s=10)
+        plt.title('Scatterplot of Income vs Credit')
+        plt.xlabel('Annual Income')
+        plt.ylabel('Credit Amount')
+
+    # Bar — Income Brackets vs Default Rate
+    def default_by_income_bracket(ax, rows):
+        bins = [0, 100000, 200000, 400000, 600000, 1_000_000, np.inf]
+        labels = ['<100K', '100K-200K', '200K-400K', '400K-600K', '600K-1M', '>1M']
+        income_bracket = pd.cut(rows['AMT_INCOME_TOTAL'], bins=bins, labels=labels).rename('Income Bracket')
+        default_rate = rows.groupby(income_bracket, observed=False)['TARGET'].mean()
+        default_rate.plot(kind='bar', color='skyblue', edgecolor='black', ax=ax)
+        plt.title('Default Rate by Income Bracket')
+        plt.xlabel('Income Bracket')
+        plt.ylabel('Default Rate')
+        plt.xticks(rotation=45)
+
+    #  Heatmap — Correlation of Financial Variables
+    def corr_heatmap(ax, corr):
+        sns.heatmap(corr, annot=True, cmap='coolwarm')
+        plt.title('Correlation Heatmap - Financial Variables')
+    corr_cols = ['AMT_INCOME_TOTAL', 'AMT_CREDIT', 'AMT_ANNUITY', 'DTI', 'LTI', 'TARGET']
+
+    def binned(column):
+        return lambda: {"binned": get_binned_counts(df, df_filtered, column, filters=filters)}
+
+    return [
+        Chart("financial/income_hist", histogram('Income Distribution', 'Annual Income'), (8, 6),
+              binned('AMT_INCOME_TOTAL')),
+        Chart("financial/credit_hist", histogram('Credit Amount Distribution', 'Credit Amount'), (8, 6),
+              binned('AMT_CREDIT')),
+        Chart("financial/annuity_hist", histogram('Annuity Distribution', 'Annuity Amount'), (8, 6),
+              binned('AMT_ANNUITY')),
+        Chart("financial/income_vs_credit", income_vs_credit, (8, 6),
+              lambda: {"rows": df_filtered[['AMT_INCOME_TOTAL', 'AMT_CREDIT']]}, (scatter_mode,)),
+        Chart("financial/income_vs_annuity", income_vs_annuity, (8, 6),
+              lambda: {"rows": df_filtered[['AMT_INCOME_TOTAL', 'AMT_ANNUITY']]}, (scatter_mode,)),
+        Chart("financial/credit_box", credit_box, (8, 6),
+              lambda: {"sketches": get_cube(df).sketches('AMT_CREDIT', filters, by=['TARGET'])}),
+        Chart("financial/income_box", income_box, (8, 6),
+              lambda: {"sketches": get_cube(df).sketches('AMT_INCOME_TOTAL', filters, by=['TARGET'])}),
+        Chart("financial/income_credit_scatter", income_credit_scatter, (10, 8),
+              lambda: {"rows": df_filtered[['AMT_INCOME_TOTAL', 'AMT_CREDIT']]}, (scatter_mode,)),
+        Chart("financial/default_by_income_bracket", default_by_income_bracket, (10, 8),
+              lambda: {"rows": df_filtered[['AMT_INCOME_TOTAL', 'TARGET']]}),
+        Chart("financial/corr_heatmap", corr_heatmap, (10, 8),
+              lambda: {"corr": correlation_matrix(df, corr_cols, filters=filters)}),
+    ]
+
+
+def credit_history_charts(page):
+    # Only datasets with the bureau / previous application / installment tables
+    # next to them have these columns (utils.auxiliary)
+    df, df_filtered = page.df, page.df_filtered
+    if "CREDIT_HISTORY" not in df.columns:
+        return []
+
+    # Bar — Default Rate by Credit History
+    def default_by_credit_history(ax, rows):
+        default_rate = rows.groupby('CREDIT_HISTORY', observed=True)['TARGET'].mean()
+        default_rate.plot(kind='bar', color='salmon', edgecolor='black', ax=ax)
+        plt.title('Default Rate by Credit History')
+        plt.xlabel('Credit History')
+        plt.ylabel('Default Rate')
+        plt.xticks(rotation=0)
+
+    charts = [
+        Chart("financial/default_by_credit_history", default_by_credit_history, (10, 8),
+              lambda: {"rows": df_filtered[['CREDIT_HISTORY', 'TARGET']]}),
+    ]
+    if 'INST_LATE_RATIO' in df.columns:
+        # Bar — Default Rate by share of late instalments
+        def default_by_late_instalments(ax, rows):
+            bins = [-np.inf, 0, 0.05, 0.2, 0.5, np.inf]
+            labels = ['None', '0-5%', '5-20%', '20-50%', '>50%']
+            late_share = pd.cut(rows['INST_LATE_RATIO'], bins=bins, labels=labels).rename('Late Instalments')
+            default_rate = rows.groupby(late_share, observed=False)['TARGET'].mean()
+            default_rate.plot(kind='bar', color='skyblue', edgecolor='black', ax=ax)
+            plt.title('Default Rate by Share of Late Instalments')
+            plt.xlabel('Late Instalments (previous loans)')
+            plt.ylabel('Default Rate')
+            plt.xticks(rotation=0)
+        charts.append(Chart("financial/default_by_late_instalments", default_by_late_instalments, (10, 8),
+                            lambda: {"rows": df_filtered[['INST_LATE_RATIO', 'TARGET']]}))
+    return charts
+
+
+FINANCIAL_INSIGHTS = """
+- **Default risk increases sharply** when affordability thresholds are breached:
+    - **LTI > 6**: Indicates borrowers may be over-leveraged.
+    - **DTI > 0.35**: Suggests limited disposable income after debt obligations.
+- These thresholds are validated through binning and statistical modeling (e.g., logistic regression).
+- Helps define **risk boundaries** for lending decisions and credit policy.
+"""
+
+
+# -----------------------------
+# Correlations, Drivers & Slice-and-Dice
+# -----------------------------
+# Default rates shared with the other pages for the same filter state
+CORRELATIONS_METRICS = [
+    Metric("default_by_gender", "mean", "TARGET", by="CODE_GENDER"),
+    Metric("default_by_edu", "mean", "TARGET", by="NAME_EDUCATION_TYPE"),
+]
+SELECTED_NUMERICS = ['AMT_INCOME_TOTAL', 'AMT_CREDIT', 'AMT_ANNUITY', 'AGE_YEARS', 'EMPLOYMENT_YEARS', 'CNT_FAM_MEMBERS', 'TARGET']
+
+
+def full_correlations(page):
+    """Correlation matrix of every numeric column for the page's filters.
+
+    Merged from moment accumulators per segment and per age/income bin; the
+    numeric columns are only loaded for the rows that must be rescanned.
+    """
+    numeric_cols = list(page.profile.index[page.profile["numeric"]])
+    return correlation_matrix(page.df, numeric_cols, data=lambda: page.load(columns=numeric_cols), filters=page.filters)
+
+
+def correlations_kpis(page):
+    corr_target = full_correlations(page)
+    target_corr = corr_target['TARGET'].drop('TARGET').dropna().sort_values(ascending=False)
+    top5_pos_corr = target_corr.head(5)
+    top5_neg_corr = target_corr.tail(5).sort_values()
+
+    # A column that is constant under the filters (e.g. a one-step income range)
+    # has no correlations at all
+    def most_correlated(column):
+        corr = corr_target[column].drop(column).abs().dropna()
+        return f"{corr.idxmax()} ({corr.max():.2f})" if len(corr) else "n/a"
+
+    top5_features = target_corr.abs().sort_values(ascending=False).head(5)
+    return [
+        Kpi("Top 5 +Corr (TARGET)", ", ".join([f"{x} ({y:.2f})" for x,y in top5_pos_corr.items()])),
+        Kpi("Top 5 −Corr (TARGET)", ", ".join([f"{x} ({y:.2f})" for x,y in top5_neg_corr.items()])),
+        Kpi("Most correlated with Income", most_correlated('AMT_INCOME_TOTAL')),
+        Kpi("Most correlated with Credit", most_correlated('AMT_CREDIT')),
+        Kpi("Corr(Income, Credit)", f"{corr_target.loc['AMT_INCOME_TOTAL', 'AMT_CREDIT']:.2f}"),
+        Kpi("Corr(Age, TARGET)", f"{corr_target.loc['AGE_YEARS', 'TARGET']:.2f}"),
+        Kpi("Corr(EmploymentY, TARGET)", f"{corr_target.loc['EMPLOYMENT_YEARS', 'TARGET']:.2f}"),
+        Kpi("Corr(Family Size, TARGET)", f"{corr_target.loc['CNT_FAM_MEMBERS', 'TARGET']:.2f}"),
+        Kpi("Variance Explained (Top 5)", f"{top5_features.sum():.2f}"),
+        Kpi("# Features |corr| > 0.5", str((target_corr.abs() > 0.5).sum())),
+    ]
+
+
+def correlations_charts(page, scatter_mode="density"):
+    df, df_filtered, filters, metrics = page.df, page.df_filtered, page.filters, page.metrics
+    selected = full_correlations(page).loc[SELECTED_NUMERICS, SELECTED_NUMERICS]
+
+    #  Heatmap — Correlation (selected numerics)
+    def corr_heatmap(ax):
+        sns.heatmap(selected, annot=True, cmap='coolwarm')
+        plt.title('Correlation Heatmap (Selected Numerics)')
+
+    #  Bar — |Correlation| of features vs TARGET (top N)
+    def target_corr_bar(ax):
+        corrs = selected['TARGET'].drop('TARGET').abs().sort_values(ascending=False)
+        corrs.head(5).plot(kind='bar')
+        plt.title('|Correlation| with TARGET (Top 5)')
+        plt.ylabel('Absolute Correlation')
+
+    # Scatter — Age vs Credit (hue=TARGET)
+    def age_vs_credit(ax, rows):
+        scatter(ax, rows, 'AGE_YEARS', 'AMT_CREDIT', hue='TARGET', mode=scatter_mode, alpha=0.5)
+        plt.title('AGE vs Credit (hue=TARGET)')
+
+    #  Scatter — Age vs Income (hue=TARGET)
+    def age_vs_income(ax, rows):
+        scatter(ax, rows, 'AGE_YEARS', 'AMT_INCOME_TOTAL', hue='TARGET', mode=scatter_mode, alpha=0.5)
+        plt.title('Age vs Income (hue=TARGET)')
+
+    #  Scatter — Employment Years vs TARGET (jitter)
+    def employment_vs_target(ax, rows):
+        scatter(ax, rows, 'EMPLOYMENT_YEARS', 'TARGET', mode=scatter_mode, s=10, alpha=0.5)
+        plt.title('Employment Years vs TARGET')
+        plt.xlabel('Years Employed')
+        plt.ylabel('TARGET')
+        plt.yticks([0, 1])
+
+    #  Boxplot — Credit by Education
+    def credit_by_education(ax, sketches):
+        sketch_boxplot(ax, sketches, xlabel='NAME_EDUCATION_TYPE', ylabel='AMT_CREDIT')
+        plt.title('Credit Amount by Education')
+        plt.xticks(rotation=30)
+
+    #  Boxplot — Income by Family Status
+    def income_by_family(ax, sketches):
+        sketch_boxplot(ax, sketches, xlabel='NAME_FAMILY_STATUS', ylabel='AMT_INCOME_TOTAL')
+        plt.title('Income by Family Status')
+        plt.xticks(rotation=30)
+
+    #  Pair Plot — Income, Credit, Annuity, TARGET
+    def pairplot(ax, pair_counts):
+        pair_fig = scatter_matrix(pair_counts)
+        pair_fig.suptitle('Pair Plot — Income, Credit, Annuity, TARGET', y=1.02)
+        return pair_fig
+
+    #  Bar — Default Rate by Gender
+    def default_by_gender(ax):
+        default_by_gender = metrics['default_by_gender']
+        default_by_gender.plot(kind='bar')
+        plt.title('Default Rate by Gender')
+
+    #  Bar — Default Rate by Education
+    def default_by_education(ax):
+        default_by_edu = metrics['default_by_edu']
+        default_by_edu.plot(kind='bar')
+        plt.title('Default Rate by Education')
+        plt.ylabel('Default Rate')
+        plt.xticks(rotation=30)
+
+    return [
+        Chart("correlations/corr_heatmap", corr_heatmap, (8, 5)),
+        Chart("correlations/target_corr_bar", target_corr_bar, (8, 5)),
+        Chart("correlations/age_vs_credit", age_vs_credit, (8, 5),
+              lambda: {"rows": df_filtered[['AGE_YEARS', 'AMT_CREDIT', 'TARGET']]}, (scatter_mode,)),
+        Chart("correlations/age_vs_income", age_vs_income, (8, 5),
+              lambda: {"rows": df_filtered[['AGE_YEARS', 'AMT_INCOME_TOTAL', 'TARGET']]}, (scatter_mode,)),
+        Chart("correlations/employment_vs_target", employment_vs_target, (8, 5),
+              lambda: {"rows": df_filtered[['EMPLOYMENT_YEARS', 'TARGET']]}, (scatter_mode,)),
+        Chart("correlations/credit_by_education", credit_by_education, (8, 5),
+              lambda: {"sketches": get_cube(df).sketches('AMT_CREDIT', filters, by=['NAME_EDUCATION_TYPE'])}),
+        Chart("correlations/income_by_family", income_by_family, (8, 5),
+              lambda: {"sketches": get_cube(df).sketches('AMT_INCOME_TOTAL', filters, by=['NAME_FAMILY_STATUS'])}),
+        # Drawn from binned counts of every pair, computed in one pass and cached
+        Chart("correlations/pairplot", pairplot, (8, 5), lambda: {
+            "pair_counts": get_pair_counts(df, df_filtered, ['AMT_INCOME_TOTAL', 'AMT_CREDIT', 'AMT_ANNUITY'],
+                                           hue='TARGET', filters=filters)
+        }),
+        Chart("correlations/default_by_gender", default_by_gender, (8, 5)),
+        Chart("correlations/default_by_education", default_by_education, (8, 5)),
+    ]
+
+
+CORRELATIONS_INSIGHTS = """
+-Income and Credit Relationship: Higher income generally correlates with higher credit amounts,
+indicating that clients with larger incomes are approved for bigger loans.
+
+-Default Risk Varies by Income and Gender: Default rates tend to be higher in lower income brackets,
+highlighting affordability issues. Additionally, differences in default rates between genders
+(or other demographic groups)can point to specific risk profiles that should be considered in credit risk modeling.
+
+-Employment Length Influences Default Probability:Clients with longer employment histories show lower default rates, likely due to increased financial stability.
+his insight supports incorporating employment duration as a key feature in predictive models.
+"""
+
+
+# -----------------------------
+# Pages
+# -----------------------------
+# Every page by its column manifest key (utils.columns), in app order
+VIEWS = {
+    "overview": View(
+        "📊 Overview of Data Quality", OVERVIEW_METRICS, overview_kpis,
+        [Section("📈 Data Distributions", overview_charts)], OVERVIEW_INSIGHTS,
+    ),
+    "target": View(
+        "🎯 Target & Risk Segmentation", TARGET_METRICS, target_kpis,
+        [Section("📈 Risk Segment Visuals", target_charts)], TARGET_INSIGHTS,
+    ),
+    "demographics": View(
+        "🏠 Demographics & Household Profile", DEMOGRAPHICS_METRICS, demographics_kpis,
+        [Section("📈 Demographic Visuals", demographics_charts)], DEMOGRAPHICS_INSIGHTS,
+    ),
+    "financial": View(
+        "💰 Financial Health & Affordability", FINANCIAL_METRICS, financial_kpis,
+        [Section("💰 Financial Visuals", financial_charts), Section("💳 Credit History", credit_history_charts)],
+        FINANCIAL_INSIGHTS, add_ratios,
+    ),
+    "correlations": View(
+        "🔍 Correlations, Drivers & Interactive Slice-and-Dice", CORRELATIONS_METRICS, correlations_kpis,
+        [Section("📈 Correlation & Drivers Visuals", correlations_charts)], CORRELATIONS_INSIGHTS,
+    ),
+}